@@ -0,0 +1,159 @@
+# app/agents/checkpoint.py
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, Optional, TextIO
+
+# Records written between fsyncs of a journal, and the longest time a
+# record may stay unsynced; every record is flushed to the OS immediately
+JOURNAL_SYNC_RECORDS = int(os.getenv("CODEXAGENT_JOURNAL_SYNC_RECORDS", "32"))
+JOURNAL_SYNC_SECONDS = float(os.getenv("CODEXAGENT_JOURNAL_SYNC_SECONDS", "1.0"))
+JOURNAL_VERSION = 1
+
+
+def content_digest(data: bytes) -> str:
+    """Return the hex SHA-256 digest identifying a file's content."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_digest(path: str) -> Optional[str]:
+    """Return the content digest of a file, or None if it cannot be read."""
+    try:
+        with open(path, "rb") as f:
+            return content_digest(f.read())
+    except OSError:
+        return None
+
+
+class CheckpointJournal:
+    """Append-only JSON Lines journal of the units a directory run completed.
+
+    The first line records the journal version and the run options; each
+    further line records one completed unit with its key (a file path), the
+    digest of the content it was computed from and its result. A run that
+    dies loses at most the record being written: a torn last line is ignored
+    when the journal is loaded.
+
+    Records are flushed to the operating system as they are written, which
+    survives the process being killed, and fsynced in batches of
+    ``sync_records`` or every ``sync_seconds``, which bounds what a machine
+    crash can lose without an fsync per file.
+
+    Args:
+        path: Journal file
+        options: Run options the results depend on; a journal written with
+            other options is not resumed
+        resume: Load the completed units of an existing journal and append
+            to it; otherwise the journal is started afresh
+    """
+
+    def __init__(
+        self,
+        path: str,
+        options: Dict[str, Any],
+        resume: bool = False,
+        sync_records: int = JOURNAL_SYNC_RECORDS,
+        sync_seconds: float = JOURNAL_SYNC_SECONDS,
+    ) -> None:
+        self.path = path
+        self.options = options
+        self.sync_records = sync_records
+        self.sync_seconds = sync_seconds
+        # Units completed by the run being resumed
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.resumed = resume and self._load()
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file: TextIO = open(
+            path, "a" if self.resumed else "w", encoding="utf-8", newline="\n"
+        )
+        if not self.resumed:
+            self._write({"version": JOURNAL_VERSION, "options": options})
+        elif not self._ends_with_newline():
+            # Terminate a torn last record so the next one starts on its line
+            self._file.write("\n")
+        self.sync()
+
+    def _load(self) -> bool:
+        """Read the journal's records; return False if it cannot be resumed."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except (OSError, UnicodeDecodeError):
+            return False
+        try:
+            header = json.loads(lines[0]) if lines else {}
+        except ValueError:
+            return False
+        if (
+            header.get("version") != JOURNAL_VERSION
+            or header.get("options") != self.options
+        ):
+            return False
+        for line in lines[1:]:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            # Records without the expected fields are skipped like torn lines
+            if isinstance(record, dict) and {"key", "hash", "result"} <= set(record):
+                self.entries[record["key"]] = record
+        return True
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            if not f.tell():
+                return True
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def lookup(self, key: str, digest: Optional[str]) -> Optional[Any]:
+        """Return the recorded result of a unit whose content is unchanged."""
+        record = self.entries.get(key)
+        if record is not None and digest is not None and record["hash"] == digest:
+            return record["result"]
+        return None
+
+    def record(self, key: str, digest: Optional[str], result: Any) -> None:
+        """Append a completed unit, fsyncing once a batch is due.
+
+        The result is only written to the file: ``entries`` holds the units
+        loaded on resume, so memory does not grow with the run.
+        """
+        if digest is None:
+            return
+        self._write({"key": key, "hash": digest, "result": result})
+        self._unsynced += 1
+        if (
+            self._unsynced >= self.sync_records
+            or time.monotonic() - self._synced_at >= self.sync_seconds
+        ):
+            self.sync()
+
+    def sync(self) -> None:
+        """Force the records written so far to disk."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+    def close(self) -> None:
+        """Sync and close the journal."""
+        if self._file.closed:
+            return
+        self.sync()
+        self._file.close()
+
+    def __enter__(self) -> "CheckpointJournal":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
@@ -1,225 +1,588 @@
 # app/agents/docgen_agent.py
 import ast
+import asyncio
+import hashlib
 import os
-from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional
+import re
+from array import array
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from app.llm.gemini import (
+    GeminiClient,
+    GeminiStream,
+    metrics_stage,
+    prompt_budget,
+    route,
+    run_routed,
+    run_routed_async,
+    stream_gemini,
+)
+from app.llm.tokens import estimate_tokens, fit_text, split_text
+
+# Token budget for the code structure of one packed request (docgen dir --pack)
+PACK_TOKENS = int(os.getenv("CODEXAGENT_PACK_TOKENS", "4000"))
+
+# Modules whose code structure exceeds this many tokens are documented in
+# chunks (map) and then summarized (reduce); 0 disables chunking
+CHUNK_TOKENS = int(os.getenv("CODEXAGENT_CHUNK_TOKENS", "8000"))
+
+# Number of chunk documents combined by one reduce call; more chunks than this
+# are reduced in several rounds
+REDUCE_FANIN = int(os.getenv("CODEXAGENT_REDUCE_FANIN", "8"))
+
+
+class SourceBuffer:
+    """Source text of one module, shared by the records extracted from it.
+
+    Records keep line/column spans into the buffer and slice their source
+    on demand, so the text exists once and keeps its comments and formatting.
+    """
 
-import astor  # type: ignore[import-untyped]
+    __slots__ = ("text", "_line_starts")
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        # Offset of the first character of every line; ast counts "\r\n",
+        # "\r" and "\n" as line breaks, unlike str.splitlines
+        self._line_starts = array(
+            "q", [0] + [m.end() for m in _LINE_BREAK.finditer(text)]
+        )
+
+    def offset(self, lineno: int, col_offset: int) -> int:
+        """Convert an ast position (1-based line, UTF-8 byte column) to an index."""
+        start = self._line_starts[lineno - 1]
+        if col_offset:
+            line = self.text[start:start + col_offset * 4]
+            if not line.isascii():
+                prefix = line.encode("utf-8")[:col_offset]
+                col_offset = len(prefix.decode("utf-8", "ignore"))
+        return start + col_offset
+
+    def segment(self, node: ast.expr) -> str:
+        """Return the exact source of an expression node."""
+        start = self.offset(node.lineno, node.col_offset)
+        end = self.offset(node.end_lineno or node.lineno, node.end_col_offset or 0)
+        return self.text[start:end]
+
+    def block(self, lineno: int, end_lineno: int) -> str:
+        """Return lines ``lineno`` to ``end_lineno``, dedented.
+
+        Whole lines are returned, so trailing comments survive. The
+        indentation of the first line is removed from every line that starts
+        with it, which keeps multi-line strings intact.
+        """
+        start = self._line_starts[lineno - 1]
+        if end_lineno < len(self._line_starts):
+            end = self._line_starts[end_lineno]
+        else:
+            end = len(self.text)
+        text = self.text[start:end].rstrip("\r\n")
+        first = text.split("\n", 1)[0]
+        indent = first[: len(first) - len(first.lstrip())]
+        if not indent:
+            return text
+        return "".join(
+            line[len(indent):] if line.startswith(indent) else line
+            for line in text.splitlines(keepends=True)
+        )
+
+
+_LINE_BREAK = re.compile(r"\r\n|\r|\n")
+
+
+class _Symbol:
+    """Common part of :class:`FunctionInfo` and :class:`ClassInfo`.
+
+    ``source`` is sliced from ``buffer`` using the line span (first
+    decorator or ``def``/``class`` line to the end of the body) whenever it
+    is read, unless it was passed explicitly.
+    """
 
-from app.llm.gemini import run_gemini
+    __slots__ = (
+        "name",
+        "docstring",
+        "qualname",
+        "lineno",
+        "end_lineno",
+        "digest",
+        "buffer",
+        "_source",
+    )
 
+    def __init__(
+        self,
+        name: str,
+        docstring: str = "",
+        source: Optional[str] = None,
+        qualname: str = "",
+        buffer: Optional[SourceBuffer] = None,
+        span: Tuple[int, int] = (0, 0),
+    ) -> None:
+        self.name = name
+        self.docstring = docstring
+        self.qualname = qualname or name
+        self.lineno, self.end_lineno = span
+        # Hash of the normalized AST, set for module-level symbols on request
+        self.digest = ""
+        self.buffer = buffer
+        self._source = source
+
+    @property
+    def source(self) -> str:
+        """Source text of the symbol, including decorators."""
+        if self._source is None:
+            if self.buffer is None:
+                return ""
+            return self.buffer.block(self.lineno, self.end_lineno)
+        return self._source
+
+    def __repr__(self) -> str:
+        return (
+            f"{type(self).__name__}({self.qualname!r}, "
+            f"lines {self.lineno}-{self.end_lineno})"
+        )
+
+
+class FunctionInfo(_Symbol):
+    __slots__ = ("args", "returns", "is_async")
+
+    def __init__(
+        self,
+        name: str,
+        args: List[str],
+        returns: Optional[str],
+        docstring: str = "",
+        source: Optional[str] = None,
+        qualname: str = "",
+        is_async: bool = False,
+        buffer: Optional[SourceBuffer] = None,
+        span: Tuple[int, int] = (0, 0),
+    ) -> None:
+        super().__init__(name, docstring, source, qualname, buffer, span)
+        self.args = args
+        self.returns = returns
+        self.is_async = is_async
+
+
+class ClassInfo(_Symbol):
+    __slots__ = ("methods",)
+
+    def __init__(
+        self,
+        name: str,
+        methods: Optional[List["FunctionInfo"]] = None,
+        docstring: str = "",
+        source: Optional[str] = None,
+        qualname: str = "",
+        buffer: Optional[SourceBuffer] = None,
+        span: Tuple[int, int] = (0, 0),
+    ) -> None:
+        super().__init__(name, docstring, source, qualname, buffer, span)
+        self.methods = methods if methods is not None else []
+
+
+FunctionNode = Union[ast.FunctionDef, ast.AsyncFunctionDef]
+
+
+class SymbolExtractor(ast.NodeVisitor):
+    """Collect the documentable classes and functions of a module in one pass.
+
+    A stack of enclosing classes and functions gives every symbol its
+    qualified name and tells module-level functions apart from methods.
+    Classes nested in classes are collected with names like ``Outer.Inner``;
+    functions and classes local to a function body are skipped. Records
+    point into ``buffer`` instead of copying their source.
+    """
 
-@dataclass
-class FunctionInfo:
-    name: str
-    args: List[str]
-    returns: Optional[str]
-    docstring: str
-    source: str
+    def __init__(self, buffer: SourceBuffer, digests: bool = False) -> None:
+        self.buffer = buffer
+        self.digests = digests
+        self.functions: List[FunctionInfo] = []
+        self.classes: List[ClassInfo] = []
+        # Enclosing classes; function bodies are never entered
+        self._scopes: List[ClassInfo] = []
+
+    def _qualname(self, name: str) -> str:
+        if self._scopes:
+            return f"{self._scopes[-1].qualname}.{name}"
+        return name
+
+    @staticmethod
+    def _span(node: Union[ast.ClassDef, FunctionNode]) -> Tuple[int, int]:
+        """Return the first line, decorators included, and the last line."""
+        first = min([node.lineno] + [d.lineno for d in node.decorator_list])
+        return first, node.end_lineno or node.lineno
+
+    def _set_digest(self, info: Union[ClassInfo, FunctionInfo], node: ast.AST) -> None:
+        """Hash a module-level symbol's AST, ignoring positions and comments."""
+        if self.digests and not self._scopes:
+            info.digest = hashlib.sha256(ast.dump(node).encode("utf-8")).hexdigest()
+
+    def visit_ClassDef(self, node: ast.ClassDef) -> None:
+        info = ClassInfo(
+            name=node.name,
+            docstring=ast.get_docstring(node) or "",
+            qualname=self._qualname(node.name),
+            buffer=self.buffer,
+            span=self._span(node),
+        )
+        self._set_digest(info, node)
+        self.classes.append(info)
+        self._scopes.append(info)
+        self.generic_visit(node)
+        self._scopes.pop()
+
+    def _visit_function(self, node: FunctionNode) -> None:
+        args = [arg.arg for arg in node.args.args]
+        if self._scopes:
+            args = [arg for arg in args if arg != "self"]
+        info = FunctionInfo(
+            name=node.name,
+            args=args,
+            returns=self.buffer.segment(node.returns) if node.returns else None,
+            docstring=ast.get_docstring(node) or "",
+            qualname=self._qualname(node.name),
+            is_async=isinstance(node, ast.AsyncFunctionDef),
+            buffer=self.buffer,
+            span=self._span(node),
+        )
+        self._set_digest(info, node)
+        if self._scopes:
+            self._scopes[-1].methods.append(info)
+        else:
+            self.functions.append(info)
+        # Not visiting the body: nested definitions are local to the function
+
+    visit_FunctionDef = _visit_function
+    visit_AsyncFunctionDef = _visit_function
+
+
+def extract_functions_and_classes(code: str, digests: bool = False) -> Dict[str, Any]:
+    """Extract functions and classes from the given code.
 
+    Args:
+        code: Python source code
+        digests: Set ``digest`` on module-level functions and classes to a
+            hash of their normalized AST
 
-@dataclass
-class ClassInfo:
-    name: str
-    methods: List['FunctionInfo'] = field(default_factory=list)
-    docstring: str = ""
-    source: str = ""
+    Returns:
+        Dictionary with the module-level ``functions`` and all ``classes``
+        (including nested ones), each class holding its ``methods``
 
+    Raises:
+        SyntaxError: If the code cannot be parsed
+    """
+    extractor = SymbolExtractor(SourceBuffer(code), digests)
+    extractor.visit(ast.parse(code))
+    return {"functions": extractor.functions, "classes": extractor.classes}
 
-def analyze_code(code: str) -> Dict[str, Any]:
-    """Analyze Python code and extract information."""
-    tree = ast.parse(code)
 
-    functions = []
-    classes = []
+# Former duplicate of extract_functions_and_classes, kept for callers
+analyze_code = extract_functions_and_classes
 
-    for node in ast.walk(tree):
-        if isinstance(node, ast.FunctionDef):
-            # Skip methods (they'll be processed as part of their class)
-            if not any(isinstance(parent, ast.ClassDef) for parent in ast.walk(node)):
-                args = [arg.arg for arg in node.args.args]
-                returns = None
-                if node.returns:
-                    returns = ast.unparse(node.returns)
 
-                docstring = ast.get_docstring(node) or ""
-                source = ast.unparse(node)
+def format_code_structure(code_info: Dict[str, Any]) -> str:
+    """Describe the classes and functions of a file for a documentation prompt.
 
-                functions.append(
-                    FunctionInfo(
-                        name=node.name,
-                        args=args,
-                        returns=returns,
-                        docstring=docstring,
-                        source=source,
-                    )
-                )
+    Args:
+        code_info: Dictionary containing code structure information
 
-        elif isinstance(node, ast.ClassDef):
-            methods = []
-            for item in node.body:
-                if isinstance(item, ast.FunctionDef):
-                    args = [arg.arg for arg in item.args.args if arg.arg != "self"]
-                    returns = ast.unparse(item.returns) if item.returns else None
-                    docstring = ast.get_docstring(item) or ""
-                    source = ast.unparse(item)
-
-                    methods.append(
-                        FunctionInfo(
-                            name=item.name,
-                            args=args,
-                            returns=returns,
-                            docstring=docstring,
-                            source=source,
-                        )
-                    )
+    Returns:
+        str: One entry per class, method and function with docstring and source
+    """
+    structure = ""
+    for cls in code_info["classes"]:
+        structure += f"\nClass: {cls.qualname or cls.name}\n"
+        if cls.docstring:
+            structure += f"  Docstring: {cls.docstring}\n"
+
+        # Add methods
+        for method in cls.methods:
+            kind = "Async method" if method.is_async else "Method"
+            structure += f"\n  {kind}: {method.name}\n"
+            if method.docstring:
+                structure += f"    Docstring: {method.docstring}\n"
+            structure += f"    Source: {method.source}\n"
+
+    for func in code_info["functions"]:
+        kind = "Async function" if func.is_async else "Function"
+        structure += f"\n{kind}: {func.name}\n"
+        if func.docstring:
+            structure += f"  Docstring: {func.docstring}\n"
+        structure += f"  Source: {func.source}\n"
+    return structure
+
+
+def build_documentation_prompt(
+    code_info: Dict[str, Any], style: str = "numpy"
+) -> str:
+    """Build the documentation prompt for the given code information.
 
-            docstring = ast.get_docstring(node) or ""
-            source = ast.unparse(node)
+    Args:
+        code_info: Dictionary containing code structure information
+        style: Documentation style to use (default: "numpy")
 
-            classes.append(
-                ClassInfo(
-                    name=node.name, methods=methods, docstring=docstring, source=source
-                )
+    Returns:
+        str: Prompt to send to the model
+    """
+    header = (
+        "You are a technical documentation writer. Generate professional "
+        "documentation for the following code.\n\n"
+        "Code Structure:\n"
+    )
+    footer = (
+        f"\n\nPlease generate documentation in {style} style. "
+        "Include detailed descriptions, parameters, return values, "
+        "and examples where appropriate.\n"
+    )
+
+    # Trim the structure so the whole prompt fits the model's input budget
+    available = prompt_budget().input_tokens - estimate_tokens(header + footer)
+    return header + fit_text(format_code_structure(code_info), available) + footer
+
+
+def split_sections(
+    response: str, keys: List[str], pattern: "re.Pattern[str]"
+) -> Dict[str, str]:
+    """Split a response into numbered sections.
+
+    Args:
+        response: Model response with section headers
+        keys: Key of each section, in prompt order (header 1 is ``keys[0]``)
+        pattern: Header pattern whose first group is the section number
+
+    Returns:
+        Mapping of key to section text; missing or empty sections are left out
+    """
+    sections: Dict[str, str] = {}
+    matches = list(pattern.finditer(response))
+    for match, following in zip(matches, matches[1:] + [None]):
+        index = int(match.group(1))
+        if not 1 <= index <= len(keys) or keys[index - 1] in sections:
+            continue
+        end = following.start() if following is not None else len(response)
+        text = response[match.end():end].strip()
+        if text:
+            sections[keys[index - 1]] = text
+    return sections
+
+
+def is_valid_documentation(response: str) -> bool:
+    """Return True if a documentation response has any content."""
+    return bool(response.strip())
+
+
+def generate_documentation(
+    code_info: Dict[str, Any],
+    style: str = "numpy",
+    chunk_tokens: int = CHUNK_TOKENS,
+    reduce_fanin: int = REDUCE_FANIN,
+) -> str:
+    """Generate documentation for the given code information.
+
+    Modules whose code structure exceeds ``chunk_tokens`` are documented
+    with :func:`generate_documentation_chunked`.
+
+    Args:
+        code_info: Dictionary containing code structure information
+        style: Documentation style to use (default: "numpy")
+        chunk_tokens: Largest structure documented with one request; 0
+            always uses one request
+        reduce_fanin: Chunk documents combined per reduce call
+
+    Returns:
+        str: Generated documentation
+    """
+    structure = format_code_structure(code_info)
+    if 0 < chunk_tokens < estimate_tokens(structure):
+        return asyncio.run(
+            generate_documentation_chunked(
+                structure, GeminiClient(), style, chunk_tokens, reduce_fanin
             )
+        )
+    prompt = build_documentation_prompt(code_info, style)
+    return run_routed("docgen", prompt, validate=is_valid_documentation)[0]
+
+
+def build_chunk_prompt(
+    chunk: str, index: int, total: int, style: str = "numpy"
+) -> str:
+    """Build the prompt documenting one chunk of a module (map step)."""
+    return (
+        "You are a technical documentation writer. The following is part "
+        f"{index} of {total} of a Python module's code structure. Generate "
+        f"professional documentation in {style} style for every class, method "
+        "and function in it. Include detailed descriptions, parameters, "
+        "return values, and examples where appropriate. Do not write a module "
+        "overview.\n\n"
+        f"Code Structure:\n{chunk}"
+    )
 
-    return {"functions": functions, "classes": classes}
 
+def build_reduce_prompt(parts: List[str], final: bool = True) -> str:
+    """Build the prompt combining chunk documents (reduce step).
+
+    Args:
+        parts: Documentation of consecutive chunks, or summaries of them
+        final: Ask for the module overview rather than an intermediate summary
 
-def extract_functions_and_classes(code: str) -> Dict[str, Any]:
-    """Extract functions and classes from the given code."""
-    tree = ast.parse(code)
+    Returns:
+        str: Prompt to send to the model
+    """
+    available = prompt_budget().input_tokens // 2 // max(1, len(parts))
+    sections = "\n\n".join(
+        f"--- Part {index} ---\n{fit_text(part, available)}"
+        for index, part in enumerate(parts, 1)
+    )
+    if final:
+        task = (
+            "Write the module overview for this documentation: the module's "
+            "purpose, its main classes and functions and how they fit "
+            "together, and a short usage example. Do not repeat the "
+            "per-function details."
+        )
+    else:
+        task = (
+            "Summarize these parts in a few paragraphs, keeping the names and "
+            "purpose of every class and function, for a later module overview."
+        )
+    return (
+        "You are a technical documentation writer. Below is the documentation "
+        f"of consecutive parts of one Python module.\n\n{sections}\n\n{task}\n"
+    )
 
-    functions = []
-    classes = []
 
-    for node in ast.walk(tree):
-        if isinstance(node, ast.FunctionDef):
-            # Skip methods (they'll be processed as part of their class)
-            if not any(isinstance(parent, ast.ClassDef) for parent in ast.walk(node)):
-                args = [arg.arg for arg in node.args.args]
-                returns = None
-                if node.returns:
-                    returns = ast.unparse(node.returns)
+async def document_chunks(
+    structure: str,
+    client: GeminiClient,
+    style: str = "numpy",
+    chunk_tokens: int = CHUNK_TOKENS,
+) -> List[str]:
+    """Document a code structure in chunks (map step).
 
-                docstring = ast.get_docstring(node) or ""
-                source = ast.unparse(node)
+    The structure is split at class and function boundaries into chunks of
+    at most ``chunk_tokens`` tokens, which are documented concurrently and
+    labelled "map" in the metrics.
 
-                functions.append(
-                    FunctionInfo(
-                        name=node.name,
-                        args=args,
-                        returns=returns,
-                        docstring=docstring,
-                        source=source,
-                    )
+    Returns:
+        The documentation of each chunk, in order
+    """
+    chunks = split_text(structure, chunk_tokens)
+    with metrics_stage("map"):
+        parts = await asyncio.gather(
+            *(
+                run_routed_async(
+                    "docgen",
+                    build_chunk_prompt(chunk, index, len(chunks), style),
+                    client,
+                    validate=is_valid_documentation,
                 )
+                for index, chunk in enumerate(chunks, 1)
+            )
+        )
+    return [text for text, _ in parts]
 
-        elif isinstance(node, ast.ClassDef):
-            methods = []
-            for item in node.body:
-                if isinstance(item, ast.FunctionDef):
-                    args = [arg.arg for arg in item.args.args if arg.arg != "self"]
-                    returns = ast.unparse(item.returns) if item.returns else None
-                    docstring = ast.get_docstring(item) or ""
-                    source = ast.unparse(item)
-
-                    methods.append(
-                        FunctionInfo(
-                            name=item.name,
-                            args=args,
-                            returns=returns,
-                            docstring=docstring,
-                            source=source,
-                        )
-                    )
 
-            docstring = ast.get_docstring(node) or ""
-            source = ast.unparse(node)
+async def reduce_documents(
+    docs: List[str], client: GeminiClient, reduce_fanin: int = REDUCE_FANIN
+) -> str:
+    """Write a module overview from the documentation of its parts (reduce step).
 
-            classes.append(
-                ClassInfo(
-                    name=node.name, methods=methods, docstring=docstring, source=source
+    Documents are combined ``reduce_fanin`` at a time until one overview is
+    left; requests are routed as the cheap ``docgen_reduce`` task and
+    labelled "reduce" in the metrics.
+    """
+    fanin = max(2, reduce_fanin)
+    summaries = docs
+    with metrics_stage("reduce"):
+        while True:
+            final = len(summaries) <= fanin
+            groups = [
+                summaries[start:start + fanin]
+                for start in range(0, len(summaries), fanin)
+            ]
+            results = await asyncio.gather(
+                *(
+                    run_routed_async(
+                        "docgen_reduce", build_reduce_prompt(group, final), client
+                    )
+                    for group in groups
                 )
             )
+            summaries = [text for text, _ in results]
+            if final:
+                return summaries[0]
 
-    return {"functions": functions, "classes": classes}
 
+async def generate_documentation_chunked(
+    structure: str,
+    client: GeminiClient,
+    style: str = "numpy",
+    chunk_tokens: int = CHUNK_TOKENS,
+    reduce_fanin: int = REDUCE_FANIN,
+) -> str:
+    """Document an oversized module with map-reduce.
 
-def generate_documentation(code_info: Dict[str, Any], style: str = "numpy") -> str:
-    """Generate documentation for the given code information.
+    Chunks are documented with :func:`document_chunks` and their documents
+    combined into a module overview with :func:`reduce_documents`.
 
     Args:
-        code_info: Dictionary containing code structure information
+        structure: Output of :func:`format_code_structure`
+        client: Client bounding the number of concurrent requests
         style: Documentation style to use (default: "numpy")
+        chunk_tokens: Largest chunk of structure per map request
+        reduce_fanin: Chunk documents combined per reduce call
 
     Returns:
-        str: Generated documentation
+        str: The module overview followed by the documentation of each chunk
     """
-    prompt = (
-        "You are a technical documentation writer. Generate professional "
-        "documentation for the following code.\n\n"
-        "Code Structure:\n"
-    )
+    docs = await document_chunks(structure, client, style, chunk_tokens)
+    overview = await reduce_documents(docs, client, reduce_fanin)
+    return "\n\n".join([overview] + docs)
 
-    # Build the prompt with file structure
-    tree = ast.parse(code_info["functions"][0].source)
-    if isinstance(tree, ast.Module) and tree.body:
-        for item in tree.body:
-            if isinstance(item, ast.ClassDef):
-                prompt += f"\nClass: {item.name}\n"
-                if item.docstring:
-                    prompt += f"  Docstring: {item.docstring}\n"
-
-                # Add methods
-                for method in item.body:
-                    if not isinstance(method, ast.FunctionDef):
-                        continue
-                    prompt += f"\n  Method: {method.name}\n"
-                    if method.docstring:
-                        prompt += f"    Docstring: {method.docstring}\n"
-                    # Add source code
-                    source = astor.to_source(method).strip()
-                    prompt += f"    Source: {source}\n"
-            elif isinstance(item, ast.FunctionDef):
-                prompt += f"\nFunction: {item.name}\n"
-                if item.docstring:
-                    prompt += f"  Docstring: {item.docstring}\n"
-                # Add source code
-                source = astor.to_source(item).strip()
-                prompt += f"  Source: {source}\n"
-
-    # Add documentation style instructions
-    prompt += (
-        f"\n\nPlease generate documentation in {style} style. "
-        "Include detailed descriptions, parameters, return values, "
-        "and examples where appropriate.\n"
-    )
-
-    # Call the Gemini API with the prompt and return the result
-    return run_gemini(prompt)
 
-
-def document_file(file_path: str, style: str = "numpy") -> str:
+def document_file(
+    file_path: str,
+    style: str = "numpy",
+    chunk_tokens: int = CHUNK_TOKENS,
+    reduce_fanin: int = REDUCE_FANIN,
+) -> str:
     """Generate documentation for a single file."""
     try:
         with open(file_path, "r", encoding="utf-8") as f:
             code = f.read()
 
         code_info = extract_functions_and_classes(code)
-        return generate_documentation(code_info, style)
+        return generate_documentation(code_info, style, chunk_tokens, reduce_fanin)
     except Exception as e:
         return f"Error processing {file_path}: {str(e)}"
 
 
-def document_directory(directory: str, style: str = "numpy") -> Dict[str, str]:
-    """Generate documentation for all Python files in a directory."""
-    docs = {}
+def document_file_stream(file_path: str, style: str = "numpy") -> GeminiStream:
+    """Generate documentation for a single file, streaming the response.
 
+    Unlike :func:`document_file`, errors are raised rather than returned.
+    """
+    with open(file_path, "r", encoding="utf-8") as f:
+        code = f.read()
+
+    code_info = extract_functions_and_classes(code)
+    prompt = build_documentation_prompt(code_info, style)
+    return stream_gemini(prompt, route("docgen", prompt).model)
+
+
+def find_python_files(directory: str) -> List[str]:
+    """Return all Python files below a directory in ``os.walk`` order."""
+    python_files = []
     for root, _, files in os.walk(directory):
         for file in files:
             if file.endswith(".py"):
-                file_path = os.path.join(root, file)
-                docs[file_path] = document_file(file_path, style)
-
-    return docs
+                python_files.append(os.path.join(root, file))
+    return python_files
@@ -0,0 +1,377 @@
+# app/agents/docgen_apply.py
+import ast
+import inspect
+import os
+import re
+from typing import Any, Dict, Iterator, List, Tuple, Union
+
+from app.agents.docgen_agent import SourceBuffer, find_python_files
+from app.agents.docgen_manifest import SYMBOL_DELIMITER, split_symbol_sections
+from app.llm.gemini import (
+    GeminiClient,
+    as_completed_bounded,
+    iterate_blocking,
+    prompt_budget,
+    run_routed,
+    run_routed_async,
+)
+from app.llm.tokens import estimate_tokens, fit_text
+
+# Response tokens reserved per requested docstring when sizing a request
+DOCSTRING_TOKENS = 300
+
+_FENCE = re.compile(r"^```[\w-]*[ \t]*\n(.*?)\n?```$", re.DOTALL)
+_QUOTES = re.compile(r'^[rRuU]?("""|\'\'\')(.*)\1$', re.DOTALL)
+_LINE_BREAK = re.compile(r"\r\n|\r|\n")
+
+_DefNode = Union[ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef]
+
+
+class MissingDocstring:
+    """A function, method or class without a docstring.
+
+    The docstring goes before line ``insert_line`` (1-based), the first line
+    of the body, indented with ``indent``.
+    """
+
+    __slots__ = ("qualname", "kind", "insert_line", "indent", "source")
+
+    def __init__(
+        self, qualname: str, kind: str, insert_line: int, indent: str, source: str
+    ) -> None:
+        self.qualname = qualname
+        self.kind = kind
+        self.insert_line = insert_line
+        self.indent = indent
+        self.source = source
+
+    def __repr__(self) -> str:
+        return f"MissingDocstring({self.qualname!r}, line {self.insert_line})"
+
+
+class MissingDocstringFinder(ast.NodeVisitor):
+    """Collect every definition without a docstring, nested ones included.
+
+    Definitions whose body starts on the ``def``/``class`` line (e.g.
+    ``def f(): pass``) are listed in ``skipped``, since adding a docstring
+    would mean reformatting them.
+    """
+
+    def __init__(self, buffer: SourceBuffer) -> None:
+        self.buffer = buffer
+        self.missing: List[MissingDocstring] = []
+        self.skipped: List[str] = []
+        self._scope: List[Tuple[str, bool]] = []
+
+    def _visit_def(self, node: _DefNode, kind: str) -> None:
+        qualname = ".".join([name for name, _ in self._scope] + [node.name])
+        if ast.get_docstring(node, clean=False) is None:
+            first = node.body[0]
+            # A decorated nested definition starts at its first decorator
+            line = min(
+                [first.lineno]
+                + [d.lineno for d in getattr(first, "decorator_list", [])]
+            )
+            start = self.buffer.offset(line, 0)
+            indent = self.buffer.text[start:self.buffer.offset(line, first.col_offset)]
+            if indent.strip():
+                self.skipped.append(qualname)
+            else:
+                decorators = [d.lineno for d in node.decorator_list]
+                start_line = min([node.lineno] + decorators)
+                source = self.buffer.block(start_line, node.end_lineno or node.lineno)
+                self.missing.append(
+                    MissingDocstring(qualname, kind, line, indent, source)
+                )
+        self._scope.append((node.name, isinstance(node, ast.ClassDef)))
+        self.generic_visit(node)
+        self._scope.pop()
+
+    def _function_kind(self) -> str:
+        return "method" if self._scope and self._scope[-1][1] else "function"
+
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> None:
+        self._visit_def(node, self._function_kind())
+
+    def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef) -> None:
+        self._visit_def(node, self._function_kind())
+
+    def visit_ClassDef(self, node: ast.ClassDef) -> None:
+        self._visit_def(node, "class")
+
+
+def find_missing_docstrings(code: str) -> Tuple[List[MissingDocstring], List[str]]:
+    """Find the functions, methods and classes of a module without docstrings.
+
+    Args:
+        code: Python source code
+
+    Returns:
+        Tuple of the definitions to document, in source order, and the
+        qualified names of those that cannot be documented in place
+    """
+    finder = MissingDocstringFinder(SourceBuffer(code))
+    finder.visit(ast.parse(code))
+    return finder.missing, finder.skipped
+
+
+def plan_requests(symbols: List[MissingDocstring]) -> List[List[MissingDocstring]]:
+    """Group a file's symbols into as few requests as the token budgets allow.
+
+    Normally a file needs a single request; very large files are split so
+    that both the sources and the expected docstrings fit.
+    """
+    budget = prompt_budget()
+    max_input = budget.input_tokens // 2
+    max_symbols = max(1, budget.output_tokens // DOCSTRING_TOKENS)
+    requests: List[List[MissingDocstring]] = []
+    current: List[MissingDocstring] = []
+    used = 0
+    for symbol in symbols:
+        cost = min(estimate_tokens(symbol.source), max_input // 4) + 16
+        if current and (used + cost > max_input or len(current) >= max_symbols):
+            requests.append(current)
+            current, used = [], 0
+        current.append(symbol)
+        used += cost
+    if current:
+        requests.append(current)
+    return requests
+
+
+def build_docstring_prompt(
+    file_path: str, symbols: List[MissingDocstring], style: str = "numpy"
+) -> str:
+    """Build one prompt asking for the docstrings of several symbols of a file.
+
+    Args:
+        file_path: Path of the file, for context
+        symbols: Definitions to document
+        style: Docstring style to use (default: "numpy")
+
+    Returns:
+        str: Prompt asking for one delimited docstring per symbol
+    """
+    max_tokens = prompt_budget().input_tokens // 8
+    prompt = (
+        "You are a Python developer writing docstrings. Write a docstring in "
+        f"{style} style for each of the following {len(symbols)} definitions "
+        f"from {file_path}.\n"
+    )
+    for index, symbol in enumerate(symbols, 1):
+        header = SYMBOL_DELIMITER.format(
+            index=index, name=f"{symbol.kind} {symbol.qualname}"
+        )
+        prompt += f"\n{header}\n{fit_text(symbol.source, max_tokens)}\n"
+    prompt += (
+        "\nAnswer with each definition's header line exactly as given above, "
+        f"e.g. {SYMBOL_DELIMITER.format(index=1, name='...')}, followed by the "
+        "docstring text only: no quotes, no code fences, no code. Write "
+        "nothing before the first header.\n"
+    )
+    return prompt
+
+
+def clean_docstring(text: str) -> str:
+    """Strip code fences, quotes and indentation a model put around a docstring."""
+    text = text.strip()
+    match = _FENCE.match(text)
+    if match:
+        text = match.group(1).strip()
+    match = _QUOTES.match(text)
+    if match:
+        text = match.group(2)
+    return inspect.cleandoc(text)
+
+
+def format_docstring(text: str, indent: str, newline: str = "\n") -> str:
+    """Render docstring text as source lines at ``indent``.
+
+    Backslashes and triple quotes are escaped so the text is kept verbatim,
+    as is a final quote, which would otherwise run into the closing quotes.
+    """
+    quoted = text.endswith('"')
+    if quoted:
+        text = text[:-1]
+    text = text.replace("\\", "\\\\").replace('"""', '\\"\\"\\"')
+    if quoted:
+        text += '\\"'
+    lines = text.split("\n")
+    if len(lines) == 1:
+        return f'{indent}"""{lines[0]}"""{newline}'
+    body = [f'{indent}"""{lines[0]}']
+    body += [f"{indent}{line}" if line.strip() else "" for line in lines[1:]]
+    body.append(f'{indent}"""')
+    return newline.join(body) + newline
+
+
+def insert_docstrings(
+    code: str, symbols: List[MissingDocstring], docstrings: Dict[str, str]
+) -> str:
+    """Insert docstrings into ``code`` without touching any other line.
+
+    Args:
+        code: Source the symbols were found in
+        symbols: Definitions from :func:`find_missing_docstrings`
+        docstrings: Docstring text by qualified name; symbols without an
+            entry are left alone
+
+    Returns:
+        str: The updated source
+    """
+    match = _LINE_BREAK.search(code)
+    newline = match.group() if match else "\n"
+    buffer = SourceBuffer(code)
+    pieces: List[str] = []
+    end = len(code)
+    # From the bottom up, so earlier offsets stay valid
+    for symbol in sorted(symbols, key=lambda s: s.insert_line, reverse=True):
+        text = docstrings.get(symbol.qualname)
+        if not text:
+            continue
+        offset = buffer.offset(symbol.insert_line, 0)
+        pieces.append(code[offset:end])
+        pieces.append(format_docstring(text, symbol.indent, newline))
+        end = offset
+    pieces.append(code[:end])
+    return "".join(reversed(pieces))
+
+
+def _parse_docstrings(
+    response: str, symbols: List[MissingDocstring]
+) -> Dict[str, str]:
+    keys = [symbol.qualname for symbol in symbols]
+    sections = split_symbol_sections(response, keys)
+    docstrings = {key: clean_docstring(text) for key, text in sections.items()}
+    return {key: text for key, text in docstrings.items() if text}
+
+
+def request_docstrings(
+    file_path: str, symbols: List[MissingDocstring], style: str = "numpy"
+) -> Dict[str, str]:
+    """Request the docstrings of a file's symbols, one request per group.
+
+    Returns:
+        Docstring text by qualified name; symbols the response left out are
+        missing from the mapping
+    """
+    docstrings: Dict[str, str] = {}
+    for group in plan_requests(symbols):
+        response, _ = run_routed(
+            "docgen", build_docstring_prompt(file_path, group, style)
+        )
+        docstrings.update(_parse_docstrings(response, group))
+    return docstrings
+
+
+async def request_docstrings_async(
+    file_path: str,
+    symbols: List[MissingDocstring],
+    client: GeminiClient,
+    style: str = "numpy",
+) -> Dict[str, str]:
+    """Asynchronous variant of :func:`request_docstrings`."""
+    docstrings: Dict[str, str] = {}
+    for group in plan_requests(symbols):
+        response, _ = await run_routed_async(
+            "docgen", build_docstring_prompt(file_path, group, style), client
+        )
+        docstrings.update(_parse_docstrings(response, group))
+    return docstrings
+
+
+def _read_missing(file_path: str) -> Tuple[str, List[MissingDocstring], List[str]]:
+    with open(file_path, "r", encoding="utf-8", newline="") as f:
+        code = f.read()
+    missing, skipped = find_missing_docstrings(code)
+    return code, missing, skipped
+
+
+def _result(
+    file_path: str,
+    code: str,
+    missing: List[MissingDocstring],
+    skipped: List[str],
+    docstrings: Dict[str, str],
+) -> Dict[str, Any]:
+    """Insert the docstrings and check that the file still parses."""
+    new_code = insert_docstrings(code, missing, docstrings)
+    ast.parse(new_code)
+    inserted = [s.qualname for s in missing if docstrings.get(s.qualname)]
+    return {
+        "file": file_path,
+        "original_code": code,
+        "code": new_code,
+        "inserted": inserted,
+        "unanswered": [s.qualname for s in missing if s.qualname not in inserted],
+        "skipped": skipped,
+    }
+
+
+def _error(file_path: str, error: Exception) -> Dict[str, Any]:
+    return {"file": file_path, "error": f"Error processing {file_path}: {error}"}
+
+
+def apply_docstrings_file(file_path: str, style: str = "numpy") -> Dict[str, Any]:
+    """Generate the missing docstrings of one file.
+
+    The file itself is not modified; the result holds the updated source.
+
+    Args:
+        file_path: Path to the Python file
+        style: Docstring style to use (default: "numpy")
+
+    Returns:
+        Dictionary with the original and updated ``code``, the qualified
+        names ``inserted``, ``unanswered`` by the model and ``skipped``, or
+        an ``error``
+    """
+    try:
+        code, missing, skipped = _read_missing(file_path)
+        docstrings = request_docstrings(file_path, missing, style) if missing else {}
+        return _result(file_path, code, missing, skipped, docstrings)
+    except Exception as e:
+        return _error(file_path, e)
+
+
+async def apply_docstrings_file_async(
+    file_path: str, client: GeminiClient, style: str = "numpy"
+) -> Dict[str, Any]:
+    """Asynchronous variant of :func:`apply_docstrings_file`."""
+    try:
+        code, missing, skipped = _read_missing(file_path)
+        docstrings = (
+            await request_docstrings_async(file_path, missing, client, style)
+            if missing
+            else {}
+        )
+        return _result(file_path, code, missing, skipped, docstrings)
+    except Exception as e:
+        return _error(file_path, e)
+
+
+def apply_docstrings(
+    path: str, style: str = "numpy", jobs: int = 1
+) -> Iterator[Dict[str, Any]]:
+    """Generate the missing docstrings of a file or of every file in a directory.
+
+    Args:
+        path: Python file or directory
+        style: Docstring style to use (default: "numpy")
+        jobs: Number of files processed concurrently
+
+    Yields:
+        One result per file, as from :func:`apply_docstrings_file`, in
+        completion order
+    """
+    files = [path] if os.path.isfile(path) else find_python_files(path)
+    if jobs > 1 and len(files) > 1:
+        client = GeminiClient(max_concurrency=jobs)
+        yield from iterate_blocking(
+            as_completed_bounded(
+                (apply_docstrings_file_async(f, client, style) for f in files), jobs
+            )
+        )
+        return
+    for file_path in files:
+        yield apply_docstrings_file(file_path, style)
@@ -0,0 +1,457 @@
+# app/agents/docgen_manifest.py
+import asyncio
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Dict, Iterator, List, Optional, Tuple, Union
+
+from app.agents.checkpoint import CheckpointJournal, content_digest
+from app.agents.docgen_agent import (
+    CHUNK_TOKENS,
+    PACK_TOKENS,
+    REDUCE_FANIN,
+    ClassInfo,
+    FunctionInfo,
+    document_chunks,
+    find_python_files,
+    format_code_structure,
+    extract_functions_and_classes,
+    is_valid_documentation,
+    reduce_documents,
+    split_sections,
+)
+from app.llm.gemini import (
+    GeminiClient,
+    as_completed_bounded,
+    iterate_blocking,
+    prompt_budget,
+    run_routed_async,
+)
+from app.llm.tokens import estimate_tokens
+
+# Manifest file written next to the generated documentation
+MANIFEST_NAME = ".codexagent-manifest.json"
+MANIFEST_VERSION = 1
+# Manifest name of a chunked module's overview, which no symbol can have
+OVERVIEW_NAME = "<module>"
+# Checkpoint journal of completed files, written next to the manifest
+JOURNAL_NAME = ".codexagent-docgen.journal"
+
+# Header starting each symbol's section of a prompt and response
+SYMBOL_DELIMITER = "=== SYMBOL {index}: {name} ==="
+_SYMBOL_HEADER_PATTERN = re.compile(
+    r"^[ \t>#*`]*=== SYMBOL (\d+):[^\n]*?===[ \t*`]*$", re.MULTILINE
+)
+
+# A documentation unit: file path relative to the documented directory,
+# qualified symbol name and code structure sent to the model
+Unit = Tuple[str, str, str]
+
+
+class DocManifest:
+    """Per-file, per-symbol record of generated documentation.
+
+    Every module-level function and class is stored with the hash of its
+    normalized AST and the documentation generated for it, so later runs
+    only send new or changed symbols to the model. Entries are only reused
+    for the same documentation style.
+    """
+
+    def __init__(self, path: str, style: str) -> None:
+        self.path = path
+        self.style = style
+        self.files: Dict[str, Dict[str, Dict[str, str]]] = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == MANIFEST_VERSION and data.get("style") == style:
+            self.files = data.get("files", {})
+
+    def lookup(self, rel_path: str, name: str, digest: str) -> Optional[str]:
+        """Return the stored documentation of an unchanged symbol."""
+        entry = self.files.get(rel_path, {}).get(name)
+        if entry is not None and entry["hash"] == digest:
+            return entry["doc"]
+        return None
+
+    def save(self) -> None:
+        """Write the manifest atomically."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": MANIFEST_VERSION, "style": self.style, "files": self.files},
+                f,
+                indent=1,
+                sort_keys=True,
+            )
+        os.replace(tmp_path, self.path)
+
+
+def module_symbols(code_info: Dict[str, Any]) -> List[Tuple[Any, str]]:
+    """Return the module-level symbols of a file in source order.
+
+    Returns:
+        Pairs of symbol record and its code structure; a class's structure
+        covers its methods and nested classes
+    """
+    symbols: List[Tuple[Any, str]] = []
+    classes: List[ClassInfo] = code_info["classes"]
+    for cls in classes:
+        if "." in cls.qualname:
+            continue
+        nested = [c for c in classes if c.qualname.startswith(cls.qualname + ".")]
+        structure = format_code_structure(
+            {"functions": [], "classes": [cls] + nested}
+        )
+        symbols.append((cls, structure))
+    functions: List[FunctionInfo] = code_info["functions"]
+    for func in functions:
+        symbols.append(
+            (func, format_code_structure({"functions": [func], "classes": []}))
+        )
+    symbols.sort(key=lambda pair: pair[0].lineno)
+    return symbols
+
+
+def build_symbols_prompt(batch: List[Unit], style: str = "numpy") -> str:
+    """Build one documentation prompt covering several symbols.
+
+    Args:
+        batch: Units to document
+        style: Documentation style to use (default: "numpy")
+
+    Returns:
+        str: Prompt asking for one delimited section per symbol
+    """
+    prompt = (
+        "You are a technical documentation writer. Generate professional "
+        f"documentation for each of the following {len(batch)} code symbols.\n"
+    )
+    for index, (rel_path, name, structure) in enumerate(batch, 1):
+        header = SYMBOL_DELIMITER.format(index=index, name=f"{rel_path}::{name}")
+        prompt += f"\n{header}\nCode Structure:\n{structure}"
+    prompt += (
+        f"\n\nPlease generate documentation in {style} style for every symbol. "
+        "Include detailed descriptions, parameters, return values, "
+        "and examples where appropriate.\n"
+        "Start each symbol's documentation with its header line exactly as "
+        "given above, e.g. "
+        f"{SYMBOL_DELIMITER.format(index=1, name=f'{batch[0][0]}::{batch[0][1]}')}, "
+        "and write nothing before the first header.\n"
+    )
+    return prompt
+
+
+class BatchPlanner:
+    """Group documentation units into requests as they are found.
+
+    Without ``pack`` a request never spans files; with it, symbols of
+    several files share a request up to ``PACK_TOKENS`` tokens of structure.
+    Batches are handed out as soon as they are full, so planning needs no
+    more memory than the open batch.
+    """
+
+    def __init__(self, pack: bool = False) -> None:
+        budget = prompt_budget().input_tokens // 2
+        self.pack = pack
+        self.max_tokens = min(PACK_TOKENS, budget) if pack else budget
+        self._current: List[Unit] = []
+        self._used = 0
+
+    def add(self, unit: Unit) -> Iterator[List[Unit]]:
+        """Add a unit, yielding the batch it closes, if any."""
+        cost = estimate_tokens(unit[2]) + 16
+        new_file = (
+            bool(self._current) and not self.pack and self._current[-1][0] != unit[0]
+        )
+        if self._current and (new_file or self._used + cost > self.max_tokens):
+            yield from self.flush()
+        self._current.append(unit)
+        self._used += cost
+
+    def flush(self) -> Iterator[List[Unit]]:
+        """Yield the open batch, if it holds any units."""
+        if self._current:
+            batch, self._current, self._used = self._current, [], 0
+            yield batch
+
+
+def split_symbol_sections(response: str, keys: List[str]) -> Dict[str, str]:
+    """Split a response to a ``SYMBOL_DELIMITER`` prompt into sections by key."""
+    return split_sections(response, keys, _SYMBOL_HEADER_PATTERN)
+
+
+def _keys(batch: List[Unit]) -> List[str]:
+    return [f"{rel_path}::{name}" for rel_path, name, _ in batch]
+
+
+async def document_units_async(
+    batch: List[Unit], client: GeminiClient, style: str = "numpy"
+) -> Dict[str, str]:
+    """Document a batch of symbols with one request.
+
+    Symbols missing from the response are documented one by one; if a
+    single-symbol response has no header either, the whole response is used.
+
+    Returns:
+        Mapping of ``path::name`` to documentation
+    """
+    keys = _keys(batch)
+    try:
+        response, _ = await run_routed_async(
+            "docgen", build_symbols_prompt(batch, style), client
+        )
+        docs = split_symbol_sections(response, keys)
+    except Exception:
+        if len(batch) == 1:
+            raise
+        docs = {}
+    if len(batch) == 1 and keys[0] not in docs:
+        docs[keys[0]] = response.strip()
+    missing = [unit for key, unit in zip(keys, batch) if key not in docs]
+    for found in await asyncio.gather(
+        *(document_units_async([unit], client, style) for unit in missing)
+    ):
+        docs.update(found)
+    return docs
+
+
+def assemble_document(sections: List[Tuple[str, str]]) -> str:
+    """Join per-symbol documentation, in source order, into a file's document."""
+    return "\n\n".join(f"## {name}\n\n{doc}" for name, doc in sections)
+
+
+@dataclass
+class _PendingFile:
+    """A file whose symbols are being documented."""
+
+    path: str
+    digest: str
+    symbols: List[Tuple[str, str]]
+    tokens: int
+    remaining: int = 0
+    docs: Dict[str, str] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+
+
+# A finished file: its path, its documentation (None for files without
+# module-level symbols or that failed) and the error, if it failed
+DocResult = Tuple[str, Optional[str], Optional[str]]
+
+# Files finished by one unit of work
+Finished = List[DocResult]
+
+
+def document_directory_incremental(
+    directory: str,
+    manifest_path: str,
+    style: str = "numpy",
+    jobs: int = 1,
+    pack: bool = False,
+    full: bool = False,
+    journal_path: Optional[str] = None,
+    resume: bool = False,
+    chunk_tokens: int = CHUNK_TOKENS,
+    reduce_fanin: int = REDUCE_FANIN,
+    python_files: Optional[List[str]] = None,
+) -> Iterator[DocResult]:
+    """Generate documentation for a directory, reusing unchanged symbols.
+
+    Module-level functions and classes whose normalized AST matches the
+    manifest are spliced back from it; only new or changed symbols are sent
+    to the model. Files are scanned lazily: their symbols are grouped into
+    batches that are submitted as soon as they are full and a request slot
+    is free, so memory is bounded by the files in flight rather than by the
+    size of the tree. Each file is yielded as soon as all of its symbols are
+    documented, and the manifest is saved when the iteration ends, also
+    when it is interrupted, so finished files are not regenerated.
+
+    A symbol whose structure exceeds ``chunk_tokens`` is documented in
+    chunks, and a file whose structure exceeds it gets a module overview
+    reduced from its symbols' documentation, as for ``docgen file``.
+
+    With a journal, every completed file is also appended to it with the
+    hash of its content as it completes, so a run that is killed before the
+    manifest is saved can be resumed: files whose content is unchanged are
+    replayed from the journal, manifest entries included.
+
+    Args:
+        directory: Directory to search for Python files
+        manifest_path: Manifest file, usually next to the output
+        style: Documentation style to use (default: "numpy")
+        jobs: Number of concurrent requests
+        pack: Document symbols of several files per request
+        full: Regenerate every symbol, ignoring the manifest
+        journal_path: Checkpoint journal file; None disables the journal
+        resume: Replay the files completed in an existing journal
+        chunk_tokens: Largest structure documented with one request; 0
+            disables chunking and overviews
+        reduce_fanin: Documents combined per overview (reduce) request
+        python_files: Files to document, if already listed; defaults to
+            every Python file below ``directory``
+
+    Yields:
+        Triples of file path, generated documentation and error, in
+        completion order; files without module-level functions or classes
+        yield no documentation and no error, failed files no documentation
+    """
+    manifest = DocManifest(manifest_path, style)
+    journal = (
+        CheckpointJournal(journal_path, {"style": style}, resume)
+        if journal_path
+        else None
+    )
+    if python_files is None:
+        python_files = find_python_files(directory)
+    rel_paths = {path: os.path.relpath(path, directory) for path in python_files}
+    # Deleted files are dropped; unfinished ones keep their previous entries
+    manifest.files = {
+        rel_path: manifest.files[rel_path]
+        for rel_path in rel_paths.values()
+        if rel_path in manifest.files and not full
+    }
+    client = GeminiClient(max_concurrency=max(1, jobs))
+    pending: Dict[str, _PendingFile] = {}
+
+    def scan(file_path: str) -> Union[DocResult, List[Unit]]:
+        """Read a file; return its result if it is done, else its units."""
+        rel_path = rel_paths[file_path]
+        with open(file_path, "r", encoding="utf-8") as f:
+            code = f.read()
+        digest = content_digest(code.encode("utf-8"))
+        completed = journal.lookup(rel_path, digest) if journal else None
+        if completed is not None:
+            manifest.files[rel_path] = completed["entries"]
+            return file_path, completed["doc"], None
+        symbols = module_symbols(extract_functions_and_classes(code, digests=True))
+        if not symbols:
+            manifest.files[rel_path] = {}
+            return file_path, None, None
+
+        state = _PendingFile(
+            file_path,
+            digest,
+            [(symbol.qualname, symbol.digest) for symbol, _ in symbols],
+            sum(estimate_tokens(structure) for _, structure in symbols),
+        )
+        pending[rel_path] = state
+        units: List[Unit] = []
+        for symbol, structure in symbols:
+            stored = manifest.lookup(rel_path, symbol.qualname, symbol.digest)
+            if stored is not None:
+                state.docs[symbol.qualname] = stored
+            else:
+                units.append((rel_path, symbol.qualname, structure))
+        state.remaining = len(units)
+        return units
+
+    async def finish(rel_path: str) -> DocResult:
+        """Assemble a file whose symbols are all documented."""
+        state = pending.pop(rel_path)
+        entries = {
+            name: {"hash": digest, "doc": state.docs[name]}
+            for name, digest in state.symbols
+            if name in state.docs
+        }
+        errors = [f"{name}: {reason}" for name, reason in state.errors.items()]
+        sections = [
+            (name, state.docs[name]) for name, _ in state.symbols if name in state.docs
+        ]
+        overview = None
+        if not errors and 0 < chunk_tokens < state.tokens:
+            overview_hash = content_digest(
+                "".join(digest for _, digest in state.symbols).encode("utf-8")
+            )
+            overview = manifest.lookup(rel_path, OVERVIEW_NAME, overview_hash)
+            if overview is None:
+                try:
+                    overview = await reduce_documents(
+                        [doc for _, doc in sections], client, reduce_fanin
+                    )
+                except Exception as e:
+                    errors.append(f"module overview: {e}")
+                else:
+                    entries[OVERVIEW_NAME] = {"hash": overview_hash, "doc": overview}
+            else:
+                entries[OVERVIEW_NAME] = {"hash": overview_hash, "doc": overview}
+        manifest.files[rel_path] = entries
+        if errors:
+            return state.path, None, "; ".join(errors)
+        doc = assemble_document(sections)
+        if overview is not None:
+            doc = f"{overview}\n\n{doc}"
+        if journal is not None:
+            journal.record(rel_path, state.digest, {"doc": doc, "entries": entries})
+        return state.path, doc, None
+
+    async def ready(result: DocResult) -> Finished:
+        return [result]
+
+    async def finish_cached(rel_path: str) -> Finished:
+        return [await finish(rel_path)]
+
+    async def document(batch: List[Unit]) -> Finished:
+        keys = _keys(batch)
+        error = "no documentation returned"
+        try:
+            structure = batch[0][2]
+            if len(batch) == 1 and 0 < chunk_tokens < estimate_tokens(structure):
+                chunks = await document_chunks(structure, client, style, chunk_tokens)
+                docs = {keys[0]: "\n\n".join(chunks)}
+            else:
+                docs = await document_units_async(batch, client, style)
+        except Exception as e:
+            docs, error = {}, str(e)
+        finished: Finished = []
+        for key, (rel_path, name, _) in zip(keys, batch):
+            state = pending[rel_path]
+            doc = docs.get(key)
+            if doc is not None and is_valid_documentation(doc):
+                state.docs[name] = doc
+            else:
+                state.errors[name] = error
+            state.remaining -= 1
+            if not state.remaining:
+                finished.append(await finish(rel_path))
+        return finished
+
+    def work() -> Iterator[Awaitable[Finished]]:
+        # Pulled by as_completed_bounded only when a request slot is free
+        planner = BatchPlanner(pack)
+        for file_path in python_files:
+            try:
+                scanned = scan(file_path)
+            except Exception as e:
+                yield ready((file_path, None, str(e)))
+                continue
+            if isinstance(scanned, tuple):
+                yield ready(scanned)
+                continue
+            if not scanned:
+                yield finish_cached(rel_paths[file_path])
+                continue
+            for unit in scanned:
+                if 0 < chunk_tokens < estimate_tokens(unit[2]):
+                    yield document([unit])
+                    continue
+                for batch in planner.add(unit):
+                    yield document(batch)
+            if not pack:
+                for batch in planner.flush():
+                    yield document(batch)
+        for batch in planner.flush():
+            yield document(batch)
+
+    try:
+        for finished in iterate_blocking(
+            as_completed_bounded(work(), max(1, jobs))
+        ):
+            yield from finished
+    finally:
+        manifest.save()
+        if journal is not None:
+            journal.close()
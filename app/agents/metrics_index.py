@@ -0,0 +1,528 @@
+# app/agents/metrics_index.py
+import ast
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.agents.quality_rules import (
+    CodeIssue,
+    FunctionNode,
+    QualityThresholds,
+    RuleEngine,
+    argument_count,
+    function_stats,
+)
+from app.agents.refactor_scope import scoped_functions
+
+# Database shared by every indexed repository
+INDEX_PATH = os.getenv(
+    "CODEXAGENT_INDEX_DB",
+    os.path.join(os.path.expanduser("~"), ".cache", "codexagent", "index.sqlite"),
+)
+SCHEMA_VERSION = 1
+
+# Per-function metrics, as columns of the functions table
+FUNCTION_METRICS = (
+    "length",
+    "arguments",
+    "complexity",
+    "nesting",
+    "returns",
+    "branches",
+    "issues",
+)
+
+# Directories never indexed, besides hidden ones
+SKIP_DIRS = {"__pycache__", "node_modules", "site-packages", "venv"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    repo TEXT NOT NULL,
+    path TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    lines INTEGER NOT NULL,
+    functions INTEGER NOT NULL,
+    issues INTEGER NOT NULL,
+    error TEXT,
+    changed_at REAL NOT NULL,
+    indexed_at REAL NOT NULL,
+    UNIQUE (repo, path)
+);
+CREATE TABLE IF NOT EXISTS functions (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files (id) ON DELETE CASCADE,
+    qualname TEXT NOT NULL,
+    lineno INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    arguments INTEGER NOT NULL,
+    complexity INTEGER NOT NULL,
+    nesting INTEGER NOT NULL,
+    returns INTEGER NOT NULL,
+    branches INTEGER NOT NULL,
+    issues INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    changed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS issues (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files (id) ON DELETE CASCADE,
+    qualname TEXT,
+    line INTEGER NOT NULL,
+    col INTEGER NOT NULL,
+    severity TEXT NOT NULL,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS functions_file ON functions (file_id);
+CREATE INDEX IF NOT EXISTS functions_complexity ON functions (complexity);
+CREATE INDEX IF NOT EXISTS functions_changed ON functions (changed_at);
+CREATE INDEX IF NOT EXISTS issues_file ON issues (file_id);
+"""
+
+
+@dataclass
+class IndexStats:
+    """What one :func:`index_tree` run did."""
+
+    repo: str
+    files: int = 0
+    analyzed: int = 0
+    unchanged: int = 0
+    removed: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+
+
+def open_index(path: str = INDEX_PATH) -> sqlite3.Connection:
+    """Open (creating if needed) the metrics database.
+
+    Raises:
+        ValueError: If the database was written by an incompatible version
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version not in (0, SCHEMA_VERSION):
+        conn.close()
+        raise ValueError(
+            f"{path} has index schema version {version}, expected "
+            f"{SCHEMA_VERSION}; delete it to rebuild the index"
+        )
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.executescript(SCHEMA)
+    conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+    return conn
+
+
+def iter_python_files(root: str) -> Iterator[str]:
+    """Yield the Python files below ``root``, skipping hidden and tool dirs."""
+    for directory, dirs, files in os.walk(root):
+        dirs[:] = sorted(
+            d for d in dirs if not d.startswith(".") and d not in SKIP_DIRS
+        )
+        for file in sorted(files):
+            if file.endswith(".py"):
+                yield os.path.join(directory, file)
+
+
+def _issue_owner(
+    functions: List[Tuple[str, FunctionNode]], issue: CodeIssue
+) -> Optional[str]:
+    """Return the innermost function holding an issue's line."""
+    owners = [
+        (node.lineno, qualname)
+        for qualname, node in functions
+        if node.lineno <= issue.line <= (node.end_lineno or node.lineno)
+    ]
+    return max(owners)[1] if owners else None
+
+
+def analyze_source(
+    code: str, thresholds: QualityThresholds
+) -> Tuple[List[Dict[str, Any]], List[Tuple[Optional[str], CodeIssue]]]:
+    """Measure every function of a module and run the quality rules.
+
+    Raises:
+        SyntaxError: If the module does not parse
+
+    Returns:
+        Tuple of one metrics record per function (with an AST hash, so
+        unchanged functions are recognized after edits elsewhere in the
+        file) and the issues paired with the function they lie in
+    """
+    tree = ast.parse(code)
+    issues = RuleEngine(thresholds=thresholds).run(tree)
+    functions = [(qualname, node) for qualname, node, _ in scoped_functions(tree)]
+    owners = [(_issue_owner(functions, issue), issue) for issue in issues]
+    records = []
+    for qualname, node in functions:
+        stats = function_stats(node)
+        records.append(
+            {
+                "qualname": qualname,
+                "lineno": node.lineno,
+                "length": (node.end_lineno or node.lineno) - node.lineno + 1,
+                "arguments": argument_count(node),
+                "complexity": stats.complexity,
+                "nesting": stats.nesting,
+                "returns": stats.returns,
+                "branches": stats.branches,
+                "issues": sum(1 for owner, _ in owners if owner == qualname),
+                "hash": hashlib.sha256(ast.dump(node).encode("utf-8")).hexdigest(),
+            }
+        )
+    return records, owners
+
+
+def _store_file(
+    conn: sqlite3.Connection,
+    repo: str,
+    rel_path: str,
+    stat: os.stat_result,
+    data: bytes,
+    digest: str,
+    thresholds: QualityThresholds,
+) -> bool:
+    """Analyze one file and replace its rows; return False on errors."""
+    row = conn.execute(
+        "SELECT id, hash, changed_at FROM files WHERE repo = ? AND path = ?",
+        (repo, rel_path),
+    ).fetchone()
+    previous: Dict[str, Tuple[str, float]] = {}
+    changed_at = stat.st_mtime
+    if row is not None:
+        previous = {
+            r["qualname"]: (r["hash"], r["changed_at"])
+            for r in conn.execute(
+                "SELECT qualname, hash, changed_at FROM functions WHERE file_id = ?",
+                (row["id"],),
+            )
+        }
+        if row["hash"] == digest:
+            changed_at = row["changed_at"]
+        conn.execute("DELETE FROM files WHERE id = ?", (row["id"],))
+
+    error = None
+    records: List[Dict[str, Any]] = []
+    issues: List[Tuple[Optional[str], CodeIssue]] = []
+    try:
+        code = data.decode("utf-8")
+        records, issues = analyze_source(code, thresholds)
+    except SyntaxError as e:
+        error = f"Syntax error: {e.msg}"
+        issues = [(None, CodeIssue(e.lineno or 0, e.offset or 0, error, "error"))]
+    except UnicodeDecodeError as e:
+        error = str(e)
+
+    file_id = conn.execute(
+        "INSERT INTO files (repo, path, mtime, size, hash, lines, functions, "
+        "issues, error, changed_at, indexed_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            repo,
+            rel_path,
+            stat.st_mtime,
+            stat.st_size,
+            digest,
+            data.count(b"\n") + (not data.endswith(b"\n") and bool(data)),
+            len(records),
+            len(issues),
+            error,
+            changed_at,
+            time.time(),
+        ),
+    ).lastrowid
+    conn.executemany(
+        "INSERT INTO functions (file_id, qualname, lineno, length, arguments, "
+        "complexity, nesting, returns, branches, issues, hash, changed_at) "
+        "VALUES (:file_id, :qualname, :lineno, :length, :arguments, :complexity, "
+        ":nesting, :returns, :branches, :issues, :hash, :changed_at)",
+        [
+            dict(
+                record,
+                file_id=file_id,
+                changed_at=(
+                    previous[record["qualname"]][1]
+                    if previous.get(record["qualname"], ("",))[0] == record["hash"]
+                    else stat.st_mtime
+                ),
+            )
+            for record in records
+        ],
+    )
+    conn.executemany(
+        "INSERT INTO issues (file_id, qualname, line, col, severity, message) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            (file_id, owner, issue.line, issue.col, issue.severity, issue.message)
+            for owner, issue in issues
+        ],
+    )
+    return error is None
+
+
+def index_tree(
+    conn: sqlite3.Connection,
+    root: str,
+    full: bool = False,
+    thresholds: Optional[QualityThresholds] = None,
+) -> IndexStats:
+    """Bring the index of one repository up to date.
+
+    Files whose modification time and size match the index are skipped
+    without being read; files that were touched but whose content hash is
+    unchanged only get their modification time updated. Everything is
+    re-analyzed when the quality thresholds differ from the last run over
+    the same repository.
+
+    Args:
+        conn: Connection from :func:`open_index`
+        root: Repository root; it is stored by absolute path
+        full: Re-analyze every file
+        thresholds: Rule limits; defaults to ``QualityThresholds.from_env()``
+
+    Returns:
+        Counts of the files seen, analyzed, unchanged and removed
+    """
+    started = time.perf_counter()
+    repo = os.path.realpath(root)
+    thresholds = thresholds or QualityThresholds.from_env()
+    stats = IndexStats(repo)
+
+    settings = json.dumps(asdict(thresholds), sort_keys=True)
+    known = {
+        row["path"]: row
+        for row in conn.execute(
+            "SELECT id, path, mtime, size, hash FROM files WHERE repo = ?", (repo,)
+        )
+    }
+    # Indexes written before thresholds were stored per repository have one
+    # global row, which still applies to the repositories indexed then
+    keys = [f"thresholds:{repo}"] + (["thresholds"] if known else [])
+    stored = next(
+        (
+            row["value"]
+            for key in keys
+            for row in conn.execute("SELECT value FROM meta WHERE key = ?", (key,))
+        ),
+        None,
+    )
+    full = full or (stored is not None and stored != settings)
+    with conn:
+        for file_path in iter_python_files(repo):
+            rel_path = os.path.relpath(file_path, repo)
+            stats.files += 1
+            try:
+                stat = os.stat(file_path)
+                row = known.pop(rel_path, None)
+                if (
+                    not full
+                    and row is not None
+                    and row["mtime"] == stat.st_mtime
+                    and row["size"] == stat.st_size
+                ):
+                    stats.unchanged += 1
+                    continue
+                with open(file_path, "rb") as f:
+                    data = f.read()
+            except OSError:
+                stats.errors += 1
+                continue
+            digest = hashlib.sha256(data).hexdigest()
+            if not full and row is not None and row["hash"] == digest:
+                conn.execute(
+                    "UPDATE files SET mtime = ?, size = ? WHERE id = ?",
+                    (stat.st_mtime, stat.st_size, row["id"]),
+                )
+                stats.unchanged += 1
+                continue
+            if not _store_file(conn, repo, rel_path, stat, data, digest, thresholds):
+                stats.errors += 1
+            stats.analyzed += 1
+
+        conn.executemany(
+            "DELETE FROM files WHERE id = ?", [(row["id"],) for row in known.values()]
+        )
+        stats.removed = len(known)
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            (f"thresholds:{repo}", settings),
+        )
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def parse_since(value: str) -> float:
+    """Parse a ``--since`` value: a number of days (``30d``) or an ISO date.
+
+    Returns:
+        The matching Unix timestamp
+
+    Raises:
+        ValueError: If the value is neither
+    """
+    match = re.fullmatch(r"(\d+)d", value.strip())
+    if match:
+        return time.time() - int(match.group(1)) * 86400
+    return datetime.fromisoformat(value.strip()).timestamp()
+
+
+def _filters(
+    repo: Optional[str], since: Optional[float], table: str = "functions"
+) -> Tuple[str, List[Any]]:
+    """Build the WHERE clause selecting a repository and recent changes."""
+    clauses = []
+    params: List[Any] = []
+    if repo:
+        clauses.append("files.repo = ?")
+        params.append(os.path.realpath(repo))
+    if since is not None:
+        clauses.append(f"{table}.changed_at >= ?")
+        params.append(since)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+def query_functions(
+    conn: sqlite3.Connection,
+    order_by: str = "complexity",
+    limit: int = 50,
+    repo: Optional[str] = None,
+    since: Optional[float] = None,
+) -> List[sqlite3.Row]:
+    """Return the functions with the highest value of a metric.
+
+    Args:
+        conn: Connection from :func:`open_index`
+        order_by: One of ``FUNCTION_METRICS``
+        limit: Maximum number of functions
+        repo: Only functions of this repository root
+        since: Only functions whose code changed at or after this timestamp
+
+    Raises:
+        ValueError: If ``order_by`` is not a known metric
+    """
+    if order_by not in FUNCTION_METRICS:
+        raise ValueError(
+            f"Unknown metric '{order_by}'; choose from {', '.join(FUNCTION_METRICS)}"
+        )
+    where, params = _filters(repo, since)
+    return conn.execute(
+        "SELECT files.repo, files.path, functions.qualname, functions.lineno, "
+        f"{', '.join('functions.' + m for m in FUNCTION_METRICS)}, "
+        "functions.changed_at FROM functions JOIN files ON files.id = "
+        f"functions.file_id{where} ORDER BY functions.{order_by} DESC, "
+        "files.path, functions.lineno LIMIT ?",
+        params + [limit],
+    ).fetchall()
+
+
+def run_sql(path: str, sql: str) -> Tuple[List[str], List[Tuple[Any, ...]]]:
+    """Run an ad hoc query on a read-only connection to the index.
+
+    Returns:
+        Tuple of the column names and the rows
+    """
+    conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+    try:
+        cursor = conn.execute(sql)
+        columns = [column[0] for column in cursor.description or ()]
+        return columns, cursor.fetchall()
+    finally:
+        conn.close()
+
+
+def health_report(
+    conn: sqlite3.Connection,
+    repo: Optional[str] = None,
+    since: Optional[float] = None,
+    outliers: int = 10,
+) -> Dict[str, Any]:
+    """Compute distribution statistics of the function metrics with NumPy.
+
+    For every metric the report holds the mean, standard deviation,
+    percentiles and the upper Tukey fence (third quartile plus 1.5 times the
+    interquartile range); functions above the fence are outliers, and the
+    largest ones are listed.
+
+    Args:
+        conn: Connection from :func:`open_index`
+        repo: Only functions of this repository root
+        since: Only functions whose code changed at or after this timestamp
+        outliers: Number of outliers listed per metric
+
+    Returns:
+        Report with ``"totals"``, per-metric ``"metrics"`` statistics and
+        ``"outliers"``
+    """
+    import numpy as np
+
+    where, params = _filters(repo, since)
+    rows = conn.execute(
+        "SELECT files.repo, files.path, functions.qualname, functions.lineno, "
+        f"{', '.join('functions.' + m for m in FUNCTION_METRICS)} FROM functions "
+        f"JOIN files ON files.id = functions.file_id{where}",
+        params,
+    ).fetchall()
+    file_where, file_params = _filters(repo, since, "files")
+    files, lines, file_issues = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(lines), 0), COALESCE(SUM(issues), 0) "
+        f"FROM files{file_where}",
+        file_params,
+    ).fetchone()
+    report: Dict[str, Any] = {
+        "totals": {
+            "files": files,
+            "lines": lines,
+            "functions": len(rows),
+            "issues": file_issues,
+            "issues_per_kloc": round(file_issues * 1000 / lines, 2) if lines else 0.0,
+        },
+        "metrics": {},
+        "outliers": {},
+    }
+    if not rows:
+        return report
+
+    values = np.array([tuple(row)[4:] for row in rows], dtype=float)
+    quantiles = np.percentile(values, [25, 50, 75, 90, 95, 99], axis=0)
+    fences = quantiles[2] + 1.5 * (quantiles[2] - quantiles[0])
+    for index, metric in enumerate(FUNCTION_METRICS):
+        column = values[:, index]
+        above = np.flatnonzero(column > fences[index])
+        report["metrics"][metric] = {
+            "mean": round(float(column.mean()), 2),
+            "std": round(float(column.std()), 2),
+            **{
+                f"p{q}": float(value)
+                for q, value in zip((25, 50, 75, 90, 95, 99), quantiles[:, index])
+            },
+            "max": float(column.max()),
+            "fence": float(fences[index]),
+            "outliers": int(above.size),
+        }
+        top = above[np.argsort(-column[above], kind="stable")][:outliers]
+        report["outliers"][metric] = [
+            {
+                "repo": rows[i]["repo"],
+                "path": rows[i]["path"],
+                "qualname": rows[i]["qualname"],
+                "lineno": rows[i]["lineno"],
+                "value": int(column[i]),
+            }
+            for i in top
+        ]
+    return report
@@ -0,0 +1,363 @@
+# app/agents/quality_rules.py
+import ast
+import os
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple, Type, Union, cast
+
+FunctionNode = Union[ast.FunctionDef, ast.AsyncFunctionDef]
+# Nodes whose bodies belong to another scope
+_SCOPE_NODES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)
+# Statements that open a nested block
+_BLOCK_NODES: Tuple[Type[ast.AST], ...] = (
+    ast.If,
+    ast.For,
+    ast.AsyncFor,
+    ast.While,
+    ast.Try,
+    ast.With,
+    ast.AsyncWith,
+) + ((ast.Match,) if hasattr(ast, "Match") else ())
+if hasattr(ast, "TryStar"):
+    _BLOCK_NODES += (ast.TryStar,)
+# Nodes counted as a branch and a decision point
+_BRANCH_NODES: Tuple[Type[ast.AST], ...] = (
+    ast.If,
+    ast.For,
+    ast.AsyncFor,
+    ast.While,
+    ast.ExceptHandler,
+) + ((ast.match_case,) if hasattr(ast, "match_case") else ())
+
+
+@dataclass
+class CodeIssue:
+    line: int = 0
+    col: int = 0
+    message: str = ""
+    severity: str = "info"  # 'info', 'warning', 'error'
+    suggestion: Optional[str] = None
+
+
+@dataclass
+class QualityThresholds:
+    """Limits above which the built-in rules report an issue."""
+
+    max_arguments: int = 5
+    max_function_lines: int = 50
+    max_complexity: int = 10
+    max_nesting: int = 4
+    max_returns: int = 6
+    max_branches: int = 12
+
+    @classmethod
+    def from_env(cls) -> "QualityThresholds":
+        """Build thresholds from ``CODEXAGENT_QUALITY_*`` environment variables.
+
+        Each field reads the upper-cased variable of the same name, e.g.
+        ``CODEXAGENT_QUALITY_MAX_COMPLEXITY``.
+        """
+        defaults = cls()
+        return cls(
+            **{
+                name: int(os.getenv(f"CODEXAGENT_QUALITY_{name.upper()}", value))
+                for name, value in vars(defaults).items()
+            }
+        )
+
+
+@dataclass
+class FunctionStats:
+    """Control-flow counts of one function's own scope."""
+
+    complexity: int = 1
+    nesting: int = 0
+    returns: int = 0
+    branches: int = 0
+
+
+def function_stats(node: FunctionNode) -> FunctionStats:
+    """Measure a function in one walk over its own scope.
+
+    Nested functions, classes and lambdas are not entered, so their
+    statements are not counted against the enclosing function.
+
+    ``complexity`` is McCabe's: one plus every conditional, loop, exception
+    handler, match case, comprehension (and filter) and extra boolean
+    operand. ``branches`` counts every ``if``/``elif``, loop, exception
+    handler and match case. ``nesting`` is the deepest block nesting, with
+    ``elif`` at the level of its ``if``.
+    """
+    stats = FunctionStats()
+    stack: List[Tuple[ast.AST, int]] = [(node, 0)]
+    while stack:
+        current, depth = stack.pop()
+        for child in ast.iter_child_nodes(current):
+            if isinstance(child, _SCOPE_NODES):
+                continue
+            if isinstance(child, _BRANCH_NODES):
+                stats.branches += 1
+                stats.complexity += 1
+            elif isinstance(child, ast.IfExp):
+                stats.complexity += 1
+            elif isinstance(child, ast.BoolOp):
+                stats.complexity += len(child.values) - 1
+            elif isinstance(child, ast.comprehension):
+                stats.complexity += 1 + len(child.ifs)
+            elif isinstance(child, ast.Return):
+                stats.returns += 1
+
+            child_depth = depth
+            is_elif = isinstance(current, ast.If) and current.orelse == [child]
+            if isinstance(child, _BLOCK_NODES) and not is_elif:
+                child_depth += 1
+                stats.nesting = max(stats.nesting, child_depth)
+            stack.append((child, child_depth))
+    return stats
+
+
+def argument_count(node: FunctionNode) -> int:
+    """Count positional arguments plus ``*args`` and ``**kwargs``."""
+    count = len(node.args.args)
+    if node.args.vararg:
+        count += 1
+    if node.args.kwarg:
+        count += 1
+    return count
+
+
+class RuleContext:
+    """State shared by the rules during one analysis."""
+
+    def __init__(self, thresholds: QualityThresholds) -> None:
+        self.thresholds = thresholds
+        self._stats: Dict[int, FunctionStats] = {}
+
+    def function_stats(self, node: FunctionNode) -> FunctionStats:
+        """Return :func:`function_stats` of ``node``, measured once per run."""
+        stats = self._stats.get(id(node))
+        if stats is None:
+            stats = self._stats[id(node)] = function_stats(node)
+        return stats
+
+
+class Rule(ABC):
+    """A code quality check run by :class:`RuleEngine`.
+
+    Subclasses list the node types they inspect in ``node_types`` and
+    implement :meth:`check`, which is called once for every such node.
+    """
+
+    name = "rule"
+    node_types: Tuple[Type[ast.AST], ...] = ()
+
+    @abstractmethod
+    def check(self, node: ast.AST, context: RuleContext) -> Iterator[CodeIssue]:
+        """Yield the issues found at ``node``."""
+
+
+class FunctionRule(Rule):
+    """A rule inspecting every function and method, sync or async."""
+
+    node_types = (ast.FunctionDef, ast.AsyncFunctionDef)
+
+    def check(self, node: ast.AST, context: RuleContext) -> Iterator[CodeIssue]:
+        return self.check_function(cast(FunctionNode, node), context)
+
+    @abstractmethod
+    def check_function(
+        self, node: FunctionNode, context: RuleContext
+    ) -> Iterator[CodeIssue]:
+        """Yield the issues found in function ``node``."""
+
+
+# Rules run by analyze_code_quality, in reporting order
+RULES: List[Rule] = []
+
+
+def register_rule(rule_class: Type[Rule]) -> Type[Rule]:
+    """Class decorator adding an instance of a rule to :data:`RULES`."""
+    RULES.append(rule_class())
+    return rule_class
+
+
+@register_rule
+class TooManyArguments(FunctionRule):
+    """Functions taking more than ``max_arguments`` arguments."""
+
+    name = "too-many-arguments"
+
+    def check_function(
+        self, node: FunctionNode, context: RuleContext
+    ) -> Iterator[CodeIssue]:
+        arg_count = argument_count(node)
+        if arg_count > context.thresholds.max_arguments:
+            yield CodeIssue(
+                line=node.lineno,
+                col=node.col_offset,
+                message=(
+                    f"Function '{node.name}' has {arg_count} arguments, "
+                    "which is too many. Consider refactoring."
+                ),
+                severity="warning",
+                suggestion=(
+                    "Split into smaller functions or use a data class/"
+                    "dictionary to group related arguments."
+                ),
+            )
+
+
+@register_rule
+class FunctionLength(FunctionRule):
+    """Functions longer than ``max_function_lines`` source lines."""
+
+    name = "function-length"
+
+    def check_function(
+        self, node: FunctionNode, context: RuleContext
+    ) -> Iterator[CodeIssue]:
+        func_length = (node.end_lineno or node.lineno) - node.lineno + 1
+        if func_length > context.thresholds.max_function_lines:
+            yield CodeIssue(
+                line=node.lineno,
+                col=node.col_offset,
+                message=(
+                    f"Function '{node.name}' is {func_length} lines long. "
+                    "Consider refactoring into smaller functions."
+                ),
+                severity="info",
+                suggestion=(
+                    "Split this function into smaller, "
+                    "single-responsibility functions."
+                ),
+            )
+
+
+@register_rule
+class CyclomaticComplexity(FunctionRule):
+    """Functions whose McCabe complexity exceeds ``max_complexity``."""
+
+    name = "cyclomatic-complexity"
+
+    def check_function(
+        self, node: FunctionNode, context: RuleContext
+    ) -> Iterator[CodeIssue]:
+        complexity = context.function_stats(node).complexity
+        if complexity > context.thresholds.max_complexity:
+            yield CodeIssue(
+                line=node.lineno,
+                col=node.col_offset,
+                message=(
+                    f"Function '{node.name}' has a cyclomatic complexity of "
+                    f"{complexity}. Consider simplifying its control flow."
+                ),
+                severity="warning",
+                suggestion=(
+                    "Extract conditions and branches into helper functions, "
+                    "or replace conditionals with lookup tables."
+                ),
+            )
+
+
+@register_rule
+class NestingDepth(FunctionRule):
+    """Functions with blocks nested deeper than ``max_nesting``."""
+
+    name = "nesting-depth"
+
+    def check_function(
+        self, node: FunctionNode, context: RuleContext
+    ) -> Iterator[CodeIssue]:
+        depth = context.function_stats(node).nesting
+        if depth > context.thresholds.max_nesting:
+            yield CodeIssue(
+                line=node.lineno,
+                col=node.col_offset,
+                message=(
+                    f"Function '{node.name}' nests blocks {depth} levels deep. "
+                    "Consider flattening it."
+                ),
+                severity="info",
+                suggestion=(
+                    "Use early returns or guard clauses, or move inner blocks "
+                    "into separate functions."
+                ),
+            )
+
+
+@register_rule
+class TooManyReturns(FunctionRule):
+    """Functions with more than ``max_returns`` return statements."""
+
+    name = "too-many-returns"
+
+    def check_function(
+        self, node: FunctionNode, context: RuleContext
+    ) -> Iterator[CodeIssue]:
+        returns = context.function_stats(node).returns
+        if returns > context.thresholds.max_returns:
+            yield CodeIssue(
+                line=node.lineno,
+                col=node.col_offset,
+                message=(
+                    f"Function '{node.name}' has {returns} return statements. "
+                    "Consider a single exit point or smaller functions."
+                ),
+                severity="info",
+                suggestion="Collect the result in a variable or split the function.",
+            )
+
+
+@register_rule
+class TooManyBranches(FunctionRule):
+    """Functions with more than ``max_branches`` branches."""
+
+    name = "too-many-branches"
+
+    def check_function(
+        self, node: FunctionNode, context: RuleContext
+    ) -> Iterator[CodeIssue]:
+        branches = context.function_stats(node).branches
+        if branches > context.thresholds.max_branches:
+            yield CodeIssue(
+                line=node.lineno,
+                col=node.col_offset,
+                message=(
+                    f"Function '{node.name}' has {branches} branches. "
+                    "Consider splitting it."
+                ),
+                severity="info",
+                suggestion=(
+                    "Move each group of related branches into its own function."
+                ),
+            )
+
+
+class RuleEngine:
+    """Run a set of rules over a module in a single traversal.
+
+    Rules are indexed by the node types they declare, so each node is only
+    offered to the rules that inspect it.
+    """
+
+    def __init__(
+        self,
+        rules: Optional[List[Rule]] = None,
+        thresholds: Optional[QualityThresholds] = None,
+    ) -> None:
+        self.rules = RULES if rules is None else rules
+        self.thresholds = thresholds or QualityThresholds.from_env()
+        self._dispatch: Dict[Type[ast.AST], List[Rule]] = {}
+        for rule in self.rules:
+            for node_type in rule.node_types:
+                self._dispatch.setdefault(node_type, []).append(rule)
+
+    def run(self, tree: ast.AST) -> List[CodeIssue]:
+        """Return the issues of every rule, ordered by position."""
+        context = RuleContext(self.thresholds)
+        issues: List[CodeIssue] = []
+        for node in ast.walk(tree):
+            for rule in self._dispatch.get(type(node), ()):
+                issues.extend(rule.check(node, context))
+        issues.sort(key=lambda issue: (issue.line, issue.col))
+        return issues
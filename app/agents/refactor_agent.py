@@ -1,27 +1,67 @@
 # app/agents/refactor_agent.py
 import ast
 import os
-from dataclasses import dataclass
-from typing import Dict, List, Optional
+import textwrap
+import time
+from dataclasses import asdict, dataclass, replace
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Collection,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
 
-import astor  # type: ignore[import-untyped]
+from app.agents.quality_rules import CodeIssue, QualityThresholds, RuleEngine
+from app.agents.refactor_patch import (
+    DIVIDER_MARKER,
+    REPLACE_MARKER,
+    SEARCH_MARKER,
+    PatchError,
+    apply_edits,
+    parse_edits,
+)
+from app.agents.refactor_scope import (
+    FunctionTarget,
+    find_function_targets,
+    replaces_target,
+    splice_functions,
+)
+from app.llm.gemini import (
+    GeminiClient,
+    as_completed_bounded,
+    escalate,
+    iterate_blocking,
+    prompt_budget,
+    route,
+    run_gemini,
+    run_routed,
+    run_routed_async,
+    stream_gemini,
+)
+from app.llm.tokens import estimate_tokens, split_text
 
-from app.llm.gemini import run_gemini
 
+def analyze_code_quality(
+    code: str, thresholds: Optional[QualityThresholds] = None
+) -> List[CodeIssue]:
+    """Analyze Python code for potential refactoring opportunities.
 
-@dataclass
-class CodeIssue:
-    line: int = 0
-    col: int = 0
-    message: str = ""
-    severity: str = "info"  # 'info', 'warning', 'error'
-    suggestion: Optional[str] = None
-
+    Every rule registered in :mod:`app.agents.quality_rules` runs during a
+    single traversal of the syntax tree.
 
-def analyze_code_quality(code: str) -> List[CodeIssue]:
-    """Analyze Python code for potential refactoring opportunities."""
-    issues: List[CodeIssue] = []
+    Args:
+        code: Python source code
+        thresholds: Rule limits; defaults to ``QualityThresholds.from_env()``
 
+    Returns:
+        The issues found, ordered by position
+    """
     try:
         tree = ast.parse(code)
     except SyntaxError as e:
@@ -35,86 +75,308 @@ def analyze_code_quality(code: str) -> List[CodeIssue]:
             )
         ]
 
-    # Check for common issues
-    for node in ast.walk(tree):
-        # Check for functions with too many arguments
-        if isinstance(node, ast.FunctionDef):
-            # Count non-self arguments
-            arg_count = len(node.args.args)
-            if node.args.vararg:
-                arg_count += 1
-            if node.args.kwarg:
-                arg_count += 1
-
-            if arg_count > 5:  # Arbitrary threshold
-                issues.append(
-                    CodeIssue(
-                        line=node.lineno,
-                        col=node.col_offset,
-                        message=(
-                            f"Function '{node.name}' has {arg_count} arguments, "
-                            "which is too many. Consider refactoring."
-                        ),
-                        severity="warning",
-                        suggestion=(
-                            "Split into smaller functions or use a data class/"
-                            "dictionary to group related arguments."
-                        ),
-                    )
-                )
+    return RuleEngine(thresholds=thresholds).run(tree)
 
-            # Check for long functions
-            func_length = len(astor.to_source(node).split("\n"))
-            if func_length > 50:  # Arbitrary threshold
-                issues.append(
-                    CodeIssue(
-                        line=node.lineno,
-                        col=node.col_offset,
-                        message=(
-                            f"Function '{node.name}' is {func_length} lines long. "
-                            "Consider refactoring into smaller functions."
-                        ),
-                        severity="info",
-                        suggestion=(
-                            "Split this function into smaller, "
-                            "single-responsibility functions."
-                        ),
-                    )
-                )
 
-    return issues
+NO_ISSUES_MESSAGE = "No significant issues found. The code looks good!"
 
 
-def get_refactoring_suggestions(code: str, issues: List[CodeIssue]) -> str:
-    """Get refactoring suggestions for the given code and issues."""
-    if not issues:
-        return "No significant issues found. The code looks good!"
+# Refactoring modes: suggestions and code in one request per piece of code,
+# or suggestions first and then the code in a second request
+SINGLE_PASS = "single"
+TWO_PASS = "two-pass"
+REFACTOR_MODE = os.getenv("CODEXAGENT_REFACTOR_MODE", SINGLE_PASS)
 
-    # Format issues for the prompt
+# Refactoring scopes: only the flagged functions, spliced back by line range,
+# or the whole file
+FUNCTION_SCOPE = "function"
+FILE_SCOPE = "file"
+REFACTOR_SCOPE = os.getenv("CODEXAGENT_REFACTOR_SCOPE", FUNCTION_SCOPE)
+
+# Refactored code output of whole-file single-pass requests: the full code,
+# or search/replace edits applied locally
+FULL_OUTPUT = "full"
+PATCH_OUTPUT = "patch"
+REFACTOR_OUTPUT = os.getenv("CODEXAGENT_REFACTOR_OUTPUT", FULL_OUTPUT)
+
+# Headers separating the parts of a single-pass response
+SUGGESTIONS_HEADER = "=== SUGGESTIONS ==="
+CODE_HEADER = "=== REFACTORED CODE ==="
+EDITS_HEADER = "=== EDITS ==="
+
+
+def _describe_issues(issues: List[CodeIssue]) -> str:
+    """Format issues as a numbered list for a prompt."""
     issue_descriptions = []
     for i, issue in enumerate(issues, 1):
         desc = f"{i}. Line {issue.line}, Col {issue.col}: {issue.message}"
         if issue.suggestion:
             desc += f"\n   Suggestion: {issue.suggestion}"
         issue_descriptions.append(desc)
+    return "\n".join(issue_descriptions)
+
 
-    prompt = (
+def build_suggestions_prompt(code: str, issues: List[CodeIssue]) -> str:
+    """Build the prompt asking for refactoring suggestions."""
+    return (
         "You are an expert Python developer. Please provide refactoring suggestions "
         "for the following code based on the issues found. Focus on making the code "
         "more readable, maintainable, and Pythonic.\n\n"
         f"Code:\n```python\n{code}\n```\n\n"
-        f"Issues found:\n" + "\n".join(issue_descriptions) + "\n\n"
+        f"Issues found:\n{_describe_issues(issues)}\n\n"
         "Please provide your refactoring suggestions, including code snippets "
         "if applicable. Focus on the most important improvements first."
     )
 
-    # Add type ignore since we can't modify the gemini module right now
-    return run_gemini(prompt)  # type: ignore[no-any-return]
 
+def build_combined_prompt(code: str, issues: List[CodeIssue]) -> str:
+    """Build the single-pass prompt asking for suggestions and code at once."""
+    return (
+        "You are an expert Python developer. Please refactor the following code "
+        "based on the issues found. Focus on making the code more readable, "
+        "maintainable, and Pythonic.\n\n"
+        f"Code:\n```python\n{code}\n```\n\n"
+        f"Issues found:\n{_describe_issues(issues)}\n\n"
+        "Answer in exactly two parts. Start with a line containing "
+        f"{SUGGESTIONS_HEADER} followed by your refactoring suggestions, most "
+        f"important first. Then write a line containing {CODE_HEADER} followed "
+        "by the complete refactored code in a single ```python block, without "
+        "any further explanation."
+    )
+
+
+def build_patch_prompt(code: str, issues: List[CodeIssue]) -> str:
+    """Build the single-pass prompt asking for suggestions and edits at once."""
+    return (
+        "You are an expert Python developer. Please refactor the following code "
+        "based on the issues found. Focus on making the code more readable, "
+        "maintainable, and Pythonic.\n\n"
+        f"Code:\n```python\n{code}\n```\n\n"
+        f"Issues found:\n{_describe_issues(issues)}\n\n"
+        "Answer in exactly two parts. Start with a line containing "
+        f"{SUGGESTIONS_HEADER} followed by your refactoring suggestions, most "
+        f"important first. Then write a line containing {EDITS_HEADER} followed "
+        "by the changes as search/replace blocks, in file order, each made of "
+        f"a line {SEARCH_MARKER}, the exact lines of the original code to "
+        "change (with enough unchanged lines to make them unique), a line "
+        f"{DIVIDER_MARKER}, the lines replacing them and a line "
+        f"{REPLACE_MARKER}. Do not repeat code that does not change."
+    )
+
+
+def build_function_prompt(target: FunctionTarget) -> str:
+    """Build the single-pass prompt refactoring one flagged function."""
+    context = (
+        f"Context from the same module (bodies elided):\n```python\n"
+        f"{target.context}\n```\n\n"
+        if target.context
+        else ""
+    )
+    # The replacement is spliced where the function was, so a method's
+    # helpers end up in its class and must be called as methods
+    helpers = (
+        "any new helpers it needs as private methods of the same class, "
+        "called through `self` (or the class for static methods)"
+        if target.indent
+        else "any new helper functions it needs"
+    )
+    kind = "method" if target.indent else "function"
+    return (
+        "You are an expert Python developer. Please refactor the following "
+        f"{kind} `{target.qualname}` based on the issues found. Focus on "
+        "making the code more readable, maintainable, and Pythonic.\n\n"
+        f"{context}"
+        f"Function:\n```python\n{textwrap.dedent(target.source)}```\n\n"
+        f"Issues found:\n{_describe_issues(target.issues)}\n\n"
+        "Answer in exactly two parts. Start with a line containing "
+        f"{SUGGESTIONS_HEADER} followed by your refactoring suggestions, most "
+        f"important first. Then write a line containing {CODE_HEADER} followed "
+        f"by a single ```python block that replaces the {kind}: the refactored "
+        f"{kind}, keeping its name so callers still work, and {helpers}. Do not "
+        "repeat the context or other code."
+    )
+
+
+def split_combined_response(response: str) -> Tuple[str, str]:
+    """Split a single-pass response into suggestions and the code part.
+
+    Without the code header, everything before the first code fence is taken
+    as the suggestions.
+    """
+    text = response.replace(SUGGESTIONS_HEADER, "", 1)
+    if CODE_HEADER in text:
+        suggestions, code = text.split(CODE_HEADER, 1)
+    elif "```" in text:
+        index = text.index("```")
+        suggestions, code = text[:index], text[index:]
+    else:
+        suggestions, code = "", text
+    return suggestions.strip(), code.strip()
+
+
+def is_valid_combined(response: str) -> bool:
+    """Return True if the code part of a single-pass response parses."""
+    return is_valid_refactoring(split_combined_response(response)[1])
+
+
+def patch_piece(piece: str, response: str) -> Optional[Tuple[str, str]]:
+    """Apply the edits of a patch response to the code it was asked about.
+
+    Returns:
+        Tuple of the suggestions and the patched code, or None if the
+        response has no edits, an edit cannot be located or the patched
+        code does not parse
+    """
+    text = response.replace(SUGGESTIONS_HEADER, "", 1)
+    if EDITS_HEADER in text:
+        suggestions, edits_text = text.split(EDITS_HEADER, 1)
+    else:
+        suggestions, edits_text = "", text
+    edits = parse_edits(edits_text)
+    if not edits:
+        return None
+    try:
+        patched = apply_edits(piece, edits)
+        ast.parse(patched)
+    except (PatchError, SyntaxError, ValueError):
+        return None
+    return suggestions.strip(), patched
+
+
+def patch_validator(piece: str) -> Callable[[str], bool]:
+    """Return a check that a patch response applies cleanly to ``piece``."""
+    return lambda response: patch_piece(piece, response) is not None
+
+
+def extract_function_code(response: str) -> str:
+    """Extract the replacement code of a function prompt's response.
+
+    Unlike :func:`extract_code_block`, the indentation of the first line is
+    kept so the block can be re-indented as a whole.
+    """
+    code = split_combined_response(response)[1]
+    for fence in ("```python", "```"):
+        if fence in code:
+            code = code.split(fence, 1)[1].split("```")[0]
+            break
+    return code.strip("\r\n")
+
+
+def function_validator(target: FunctionTarget) -> Callable[[str], bool]:
+    """Return a check that a response's code parses and still defines ``target``.
+
+    A replacement without the function would silently drop it from the module.
+    """
+    return lambda response: replaces_target(extract_function_code(response), target)
+
+
+def code_budget() -> int:
+    """Return how many tokens of source code fit in one refactoring request.
+
+    The refactored code comes back in full, so a piece must fit the output
+    budget as well as the input budget next to the suggestions.
+    """
+    budget = prompt_budget()
+    overhead = estimate_tokens(build_refactoring_prompt("", ""))
+    return max(
+        1,
+        min(
+            budget.output_tokens * 3 // 4,
+            budget.input_tokens - overhead - budget.output_tokens,
+        ),
+    )
+
+
+def split_for_prompt(
+    code: str, issues: List[CodeIssue]
+) -> List[Tuple[str, List[CodeIssue]]]:
+    """Split code into pieces that each fit one refactoring request.
+
+    Pieces end before top-level statements where possible. Each piece comes
+    with the issues located in it, renumbered relative to the piece.
+
+    Returns:
+        Pairs of code piece and its issues, in source order
+    """
+    pieces = []
+    start = 1
+    for piece in split_text(code, code_budget()):
+        end = start + len(piece.splitlines())
+        piece_issues = [
+            replace(issue, line=max(issue.line, 1) - start + 1)
+            for issue in issues
+            if start <= max(issue.line, 1) < end
+        ]
+        pieces.append((piece, piece_issues))
+        start = end
+    return pieces
+
+
+def suggestion_prompts(code: str, issues: List[CodeIssue]) -> List[str]:
+    """Build one suggestions prompt per piece of code that has issues."""
+    return [
+        build_suggestions_prompt(piece, piece_issues)
+        for piece, piece_issues in split_for_prompt(code, issues)
+        if piece_issues
+    ]
+
+
+@dataclass
+class RefactorCost:
+    """Model requests, estimated tokens and latency spent on one file."""
+
+    mode: str
+    requests: int = 0
+    prompt_tokens: int = 0
+    response_tokens: int = 0
+    latency_seconds: float = 0.0
+
+    def add(self, prompt: str, response: str, started: float, calls: int = 1) -> None:
+        """Record ``calls`` requests for ``prompt`` that began at ``started``."""
+        self.requests += calls
+        self.prompt_tokens += estimate_tokens(prompt) * calls
+        self.response_tokens += estimate_tokens(response)
+        self.latency_seconds += time.perf_counter() - started
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return the cost for reports, with latency rounded to milliseconds."""
+        cost = asdict(self)
+        cost["latency_seconds"] = round(self.latency_seconds, 3)
+        return cost
+
+
+def get_refactoring_suggestions(
+    code: str,
+    issues: List[CodeIssue],
+    routing: Optional[List[Dict]] = None,
+    cost: Optional[RefactorCost] = None,
+) -> str:
+    """Get refactoring suggestions for the given code and issues.
+
+    Args:
+        code: Source code to refactor
+        issues: Issues found by :func:`analyze_code_quality`
+        routing: If given, the model routing decisions are appended to it
+        cost: If given, the requests are added to it
+    """
+    if not issues:
+        return NO_ISSUES_MESSAGE
 
-def apply_refactoring(code: str, suggestions: str) -> str:
-    """Apply refactoring suggestions to the code."""
-    prompt = (
+    responses = []
+    for prompt in suggestion_prompts(code, issues):
+        started = time.perf_counter()
+        response, decisions = run_routed("suggestions", prompt, complexity=len(issues))
+        responses.append(response)
+        if cost is not None:
+            cost.add(prompt, response, started, len(decisions))
+        if routing is not None:
+            routing.extend(decision.as_dict() for decision in decisions)
+    return "\n\n".join(responses)
+
+
+def build_refactoring_prompt(code: str, suggestions: str) -> str:
+    """Build the prompt asking for the refactored code."""
+    return (
         "You are an expert Python developer. Please refactor the following code "
         "based on the suggestions provided. Only return the refactored code, "
         "without any additional explanation.\n\n"
@@ -123,60 +385,814 @@ def apply_refactoring(code: str, suggestions: str) -> str:
         "Please provide the refactored code that implements these suggestions:"
     )
 
-    # Add type ignore since we can't modify the gemini module right now
-    refactored_code = run_gemini(prompt)  # type: ignore[no-any-return]
 
-    # Clean up the response to extract just the code block
-    if "```python" in refactored_code:
-        refactored_code = refactored_code.split("```python")[1].split("```")[0].strip()
-    elif "```" in refactored_code:
-        refactored_code = refactored_code.split("```")[1].split("```")[0].strip()
+def extract_code_block(response: str) -> str:
+    """Clean up a model response to extract just the code block."""
+    if "```python" in response:
+        return response.split("```python")[1].split("```")[0].strip()
+    elif "```" in response:
+        return response.split("```")[1].split("```")[0].strip()
+    return response
+
+
+def refactoring_prompts(code: str, suggestions: str) -> List[str]:
+    """Build one refactoring prompt per piece of code that fits the budget."""
+    return [
+        build_refactoring_prompt(piece, suggestions)
+        for piece in split_text(code, code_budget())
+    ]
+
+
+def is_valid_refactoring(response: str) -> bool:
+    """Return True if the code block of a refactoring response parses."""
+    try:
+        ast.parse(extract_code_block(response))
+    except (SyntaxError, ValueError):
+        return False
+    return True
+
+
+def join_refactored(responses: List[str]) -> str:
+    """Extract the code from each piece's response and join the pieces."""
+    return "\n\n\n".join(extract_code_block(response) for response in responses)
+
+
+def apply_refactoring(
+    code: str,
+    suggestions: str,
+    routing: Optional[List[Dict]] = None,
+    cost: Optional[RefactorCost] = None,
+) -> str:
+    """Apply refactoring suggestions to the code.
+
+    Responses whose code does not parse are regenerated by the large model.
+
+    Args:
+        code: Source code to refactor
+        suggestions: Suggestions from :func:`get_refactoring_suggestions`
+        routing: If given, the model routing decisions are appended to it
+        cost: If given, the requests are added to it
+    """
+    responses = []
+    for prompt in refactoring_prompts(code, suggestions):
+        started = time.perf_counter()
+        response, decisions = run_routed(
+            "refactoring", prompt, validate=is_valid_refactoring
+        )
+        responses.append(response)
+        if cost is not None:
+            cost.add(prompt, response, started, len(decisions))
+        if routing is not None:
+            routing.extend(decision.as_dict() for decision in decisions)
+
+    return join_refactored(responses), "Refactoring applied successfully"
+
+
+def combined_prompts(
+    code: str, issues: List[CodeIssue]
+) -> List[Tuple[str, Optional[str], int]]:
+    """Build one single-pass prompt per piece of code that has issues.
+
+    Returns:
+        Triples of code piece, its prompt (None for pieces without issues,
+        which are kept as they are) and its number of issues
+    """
+    return [
+        (
+            piece,
+            build_combined_prompt(piece, piece_issues) if piece_issues else None,
+            len(piece_issues),
+        )
+        for piece, piece_issues in split_for_prompt(code, issues)
+    ]
+
+
+def join_combined(parts: List[Tuple[str, Optional[str]]]) -> Tuple[str, str]:
+    """Join single-pass results into suggestions and refactored code.
+
+    Args:
+        parts: Pairs of code piece and its single-pass response, or None for
+            pieces kept unchanged
+
+    Returns:
+        Tuple of the suggestions and the refactored code
+    """
+    suggestions = []
+    code = []
+    for piece, response in parts:
+        if response is None:
+            code.append(piece.strip("\n"))
+            continue
+        piece_suggestions, piece_code = split_combined_response(response)
+        suggestions.append(piece_suggestions)
+        code.append(extract_code_block(piece_code))
+    return "\n\n".join(suggestions), "\n\n\n".join(code)
+
+
+def join_functions(
+    code: str, targets: List[FunctionTarget], responses: List[str]
+) -> Optional[Tuple[str, str]]:
+    """Splice function responses back into the module.
+
+    Returns:
+        Tuple of the suggestions, headed by function name, and the spliced
+        code; None if a replacement lost its function or the spliced module
+        does not parse
+    """
+    codes = [extract_function_code(response) for response in responses]
+    if not all(map(replaces_target, codes, targets)):
+        return None
+    suggestions = "\n\n".join(
+        f"{target.qualname}:\n{split_combined_response(response)[0]}"
+        for target, response in zip(targets, responses)
+    )
+    refactored_code = splice_functions(code, list(zip(targets, codes)))
+    try:
+        ast.parse(refactored_code)
+    except SyntaxError:
+        return None
+    return suggestions, refactored_code
+
+
+async def refactor_functions_async(
+    code: str,
+    targets: List[FunctionTarget],
+    client: GeminiClient,
+    routing: List[Dict],
+    cost: RefactorCost,
+) -> Optional[Tuple[str, str]]:
+    """Refactor flagged functions concurrently and splice them back.
+
+    Each function is sent with its minimal context in its own single-pass
+    request; responses whose code does not parse are regenerated by the
+    large model.
+
+    Args:
+        code: Module source the targets were found in
+        targets: Targets from :func:`find_function_targets`
+        client: Client bounding the number of concurrent requests
+        routing: The model routing decisions are appended to it
+        cost: The requests are added to it
+
+    Returns:
+        Tuple of the suggestions and the refactored module, or None if the
+        spliced module does not parse
+    """
+    import asyncio
+
+    responses = await asyncio.gather(
+        *(
+            _run_async(
+                "refactoring",
+                build_function_prompt(target),
+                client,
+                routing,
+                cost,
+                function_validator(target),
+                len(target.issues),
+            )
+            for target in targets
+        )
+    )
+    return join_functions(code, targets, list(responses))
+
+
+async def refactor_patched_async(
+    code: str,
+    issues: List[CodeIssue],
+    client: GeminiClient,
+    routing: List[Dict],
+    cost: RefactorCost,
+) -> Tuple[str, str, Dict[str, Any]]:
+    """Refactor a whole file in single-pass mode with edits instead of code.
+
+    Each piece of code with issues is sent concurrently with a prompt asking
+    for search/replace edits, which are applied locally with fuzzy matching.
+    Responses whose edits do not apply are regenerated by the large model;
+    if they still do not apply, the piece is refactored again asking for the
+    full code.
 
-    return refactored_code, "Refactoring applied successfully"
+    Args:
+        code: Source code to refactor
+        issues: Issues found by :func:`analyze_code_quality`
+        client: Client bounding the number of concurrent requests
+        routing: The model routing decisions are appended to it
+        cost: The requests are added to it
 
+    Returns:
+        Tuple of the suggestions, the refactored code and the output
+        statistics: the pieces that ``"fell_back"`` to full output, the
+        ``"response_tokens"`` spent, the estimated ``"full_response_tokens"``
+        of full output and the output tokens ``"saved"``
+    """
+    import asyncio
 
-def refactor_file(file_path: str, output_path: Optional[str] = None) -> Dict[str, str]:
-    """Refactor a single Python file."""
-    result: Dict[str, str] = {
-        "original_file": file_path,
-        "refactored_file": "",
-        "report": "",
+    spent = cost.response_tokens
+    fell_back = 0
+    full_tokens = 0
+
+    async def one(piece: str, piece_issues: List[CodeIssue]) -> Tuple[str, str]:
+        nonlocal fell_back, full_tokens
+        response = await _run_async(
+            "refactoring",
+            build_patch_prompt(piece, piece_issues),
+            client,
+            routing,
+            cost,
+            patch_validator(piece),
+            len(piece_issues),
+        )
+        patched = patch_piece(piece, response)
+        if patched is None:
+            fell_back += 1
+            response = await _run_async(
+                "refactoring",
+                build_combined_prompt(piece, piece_issues),
+                client,
+                routing,
+                cost,
+                is_valid_combined,
+                len(piece_issues),
+            )
+            suggestions, piece_code = split_combined_response(response)
+            patched = suggestions, extract_code_block(piece_code)
+        full_tokens += estimate_tokens(
+            f"{SUGGESTIONS_HEADER}\n{patched[0]}\n{CODE_HEADER}\n"
+            f"```python\n{patched[1]}\n```"
+        )
+        return patched
+
+    pieces = split_for_prompt(code, issues)
+    results = await asyncio.gather(
+        *(one(piece, piece_issues) for piece, piece_issues in pieces if piece_issues)
+    )
+    suggestions = []
+    parts = []
+    patched_pieces = iter(results)
+    for piece, piece_issues in pieces:
+        if not piece_issues:
+            parts.append(piece.strip("\n"))
+            continue
+        piece_suggestions, piece_code = next(patched_pieces)
+        suggestions.append(piece_suggestions)
+        parts.append(piece_code.strip("\n"))
+    response_tokens = cost.response_tokens - spent
+    output = {
+        "format": PATCH_OUTPUT,
+        "fell_back": fell_back,
+        "response_tokens": response_tokens,
+        "full_response_tokens": full_tokens,
+        "saved": full_tokens - response_tokens,
+    }
+    return "\n\n".join(suggestions), "\n\n\n".join(parts), output
+
+
+def two_pass_savings(
+    code: str, issues: List[CodeIssue], suggestions: str, cost: RefactorCost
+) -> Dict[str, Any]:
+    """Estimate what a single-pass file saved over the two-pass mode.
+
+    The two-pass prompts are rebuilt locally with the suggestions the model
+    returned; the latency saved assumes the requests that were not needed
+    would have taken as long as the average request of this file.
+
+    Returns:
+        Requests, prompt tokens and (estimated) seconds saved
+    """
+    prompts = suggestion_prompts(code, issues) + refactoring_prompts(
+        code, suggestions
+    )
+    requests = len(prompts) - cost.requests
+    per_request = cost.latency_seconds / cost.requests if cost.requests else 0.0
+    return {
+        "requests": requests,
+        "prompt_tokens": sum(estimate_tokens(p) for p in prompts) - cost.prompt_tokens,
+        "latency_seconds": round(max(requests, 0) * per_request, 3),
+    }
+
+
+def _format_issues(issues: List[CodeIssue]) -> str:
+    """Render issues one per line for the result dictionary."""
+    return "\n".join(
+        f"{issue.line}:{issue.col} [{issue.severity}] {issue.message}"
+        for issue in issues
+    )
+
+
+def _write_refactored(output_path: str, refactored_code: str) -> None:
+    """Write refactored code, creating the parent directory if needed."""
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(output_dir, exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write(refactored_code)
+
+
+def _error_result(file_path: str, error: Exception) -> Dict[str, Any]:
+    """Build the result dictionary for a file that could not be processed."""
+    return {
+        "file": file_path,
+        "issues": "",
+        "issue_records": [],
+        "suggestions": "",
+        "refactored_code": None,
+        "error": str(error),
+    }
+
+
+def _stream_prompt(
+    prompt: str,
+    stage: str,
+    on_chunk: Callable[[str, str], None],
+    timings: Dict[str, Dict[str, Optional[float]]],
+    routing: List[Dict],
+    complexity: int = 0,
+    cost: Optional[RefactorCost] = None,
+    validate: Optional[Callable[[str], bool]] = None,
+) -> str:
+    """Stream a prompt, passing chunks to ``on_chunk`` and recording latency.
+
+    The prompt is routed as the ``"suggestions"`` task for that stage and as
+    ``"refactoring"`` otherwise. Output failing ``validate`` is regenerated
+    by the large model without streaming.
+    """
+    started = time.perf_counter()
+    task = "suggestions" if stage == "suggestions" else "refactoring"
+    decision = route(task, prompt, complexity)
+    routing.append(decision.as_dict())
+    stream = stream_gemini(prompt, decision.model)
+    for chunk in stream:
+        on_chunk(stage, chunk)
+    timings[stage] = {
+        "time_to_first_token": stream.time_to_first_token,
+        "total_time": stream.total_time,
+    }
+    text = stream.text
+    calls = 1
+    if validate is not None and not validate(text):
+        escalation = escalate(decision)
+        if escalation is not None:
+            routing.append(escalation.as_dict())
+            text = run_gemini(prompt, escalation.model)
+            calls += 1
+    if cost is not None:
+        cost.add(prompt, text, started, calls)
+    return text
+
+
+def target_tokens(target: FunctionTarget) -> int:
+    """Estimate the prompt and response tokens of refactoring one function."""
+    return estimate_tokens(build_function_prompt(target)) + estimate_tokens(
+        target.source
+    )
+
+
+def function_targets(
+    code: str,
+    issues: List[CodeIssue],
+    mode: str,
+    scope: str,
+    only: Optional[Collection[str]] = None,
+) -> Optional[List[FunctionTarget]]:
+    """Return the functions to refactor on their own, if function scope applies.
+
+    Function scope is used in single-pass mode when every issue lies inside
+    a function and the function prompts and replacements are estimated to
+    take fewer tokens than refactoring the whole file, which is returned in
+    full; otherwise the whole file is refactored.
+
+    Args:
+        only: If given, only functions with these qualified names are
+            returned, whatever the whole file would take; the issues of the
+            others are left alone
+    """
+    if not issues or mode != SINGLE_PASS or scope != FUNCTION_SCOPE:
+        return None
+    targets = find_function_targets(code, issues)
+    if targets and only is not None:
+        targets = [target for target in targets if target.qualname in only]
+    if not targets:
+        return None
+    if only is not None:
+        return targets
+    scoped_tokens = sum(target_tokens(target) for target in targets)
+    file_tokens = estimate_tokens(code) + sum(
+        estimate_tokens(prompt)
+        for _, prompt, _ in combined_prompts(code, issues)
+        if prompt is not None
+    )
+    return targets if scoped_tokens < file_tokens else None
+
+
+def estimate_refactoring(
+    code: str,
+    issues: List[CodeIssue],
+    mode: str = REFACTOR_MODE,
+    scope: str = REFACTOR_SCOPE,
+) -> Tuple[Optional[List[FunctionTarget]], int, int]:
+    """Estimate the model requests and tokens refactoring a file will take.
+
+    Tokens are prompt plus response tokens. In two-pass mode the refactoring
+    prompts carry suggestions that are not known yet, so they are assumed to
+    be as large as the code.
+
+    Returns:
+        Tuple of the function targets (None when the whole file would be
+        sent), the number of requests and the number of tokens
+    """
+    if not issues:
+        return None, 0, 0
+    targets = function_targets(code, issues, mode, scope)
+    if targets:
+        return targets, len(targets), sum(target_tokens(target) for target in targets)
+    if mode == SINGLE_PASS:
+        prompts = [
+            prompt
+            for _, prompt, _ in combined_prompts(code, issues)
+            if prompt is not None
+        ]
+        code_tokens = estimate_tokens(code)
+    else:
+        prompts = suggestion_prompts(code, issues)
+        pieces = split_text(code, code_budget())
+        prompts += [build_refactoring_prompt("", "")] * len(pieces)
+        code_tokens = 3 * estimate_tokens(code)
+    return None, len(prompts), code_tokens + sum(map(estimate_tokens, prompts))
+
+
+def _set_scope(
+    result: Dict[str, Any], targets: Optional[List[FunctionTarget]]
+) -> None:
+    """Record the scope a result was refactored in."""
+    result["scope"] = FUNCTION_SCOPE if targets else FILE_SCOPE
+    if targets:
+        result["functions"] = [target.qualname for target in targets]
+
+
+def _scope_failed(result: Dict[str, Any], only: Collection[str]) -> None:
+    """Report a selection of functions that could not be spliced back.
+
+    Falling back to the whole file would refactor functions that were left
+    out of the selection, and spend more than was planned for it.
+    """
+    result["suggestions"] = ""
+    result["error"] = (
+        f"Refactored functions {', '.join(sorted(only))} could not be spliced "
+        "back into the module; the file was left unchanged"
+    )
+
+
+def _new_result(
+    file_path: str, issues: List[CodeIssue], routing: List[Dict]
+) -> Dict[str, Any]:
+    """Build the result dictionary of a file before it is refactored."""
+    return {
+        "file": file_path,
+        "issues": _format_issues(issues),
+        "issue_records": [asdict(issue) for issue in issues],
+        "suggestions": NO_ISSUES_MESSAGE,
+        "refactored_code": None,
+        "error": None,
+        "routing": routing,
     }
-    """Refactor a single Python file."""
+
+
+def _finish_result(
+    result: Dict[str, Any],
+    code: str,
+    issues: List[CodeIssue],
+    cost: RefactorCost,
+    output_path: Optional[str],
+) -> Dict[str, Any]:
+    """Add the cost (and single-pass savings) to a result, and save the code."""
+    result["cost"] = cost.as_dict()
+    if issues and cost.mode == SINGLE_PASS:
+        result["savings"] = two_pass_savings(code, issues, result["suggestions"], cost)
+    if output_path and result["refactored_code"] is not None:
+        _write_refactored(output_path, result["refactored_code"])
+    return result
+
+
+def refactor_file(
+    file_path: str,
+    output_path: Optional[str] = None,
+    on_chunk: Optional[Callable[[str, str], None]] = None,
+    mode: str = REFACTOR_MODE,
+    scope: str = REFACTOR_SCOPE,
+    only: Optional[Collection[str]] = None,
+    output: str = REFACTOR_OUTPUT,
+) -> Dict[str, Any]:
+    """Refactor a single Python file.
+
+    Unless streaming, this runs :func:`refactor_file_async` in a new event
+    loop; code already running in one should await that instead.
+
+    Args:
+        file_path: Path of the file to refactor
+        output_path: Where to write the refactored code, if anywhere
+        on_chunk: If given, responses are streamed and each chunk is passed
+            to it together with its stage (``"suggestions"`` and
+            ``"refactoring"``, or ``"combined"`` in single-pass mode);
+            per-stage latencies are added to the result under ``"timings"``
+        mode: ``SINGLE_PASS`` to get suggestions and code from one request
+            per piece of code, or ``TWO_PASS`` for separate requests
+        scope: ``FUNCTION_SCOPE`` to send only the flagged functions (in
+            single-pass mode, when every issue lies in a function) and
+            splice the replacements back, or ``FILE_SCOPE``
+        only: In function scope, refactor only the functions with these
+            qualified names; if their replacements cannot be spliced back,
+            the result reports an error instead of refactoring the whole file
+        output: ``PATCH_OUTPUT`` to get search/replace edits instead of the
+            full code from whole-file single-pass requests (not streamed),
+            falling back to the full code where edits do not apply, or
+            ``FULL_OUTPUT``
+
+    Returns:
+        Result dictionary with the issues (formatted, and as
+        ``"issue_records"`` dictionaries), suggestions, refactored code, the
+        model routing decisions, the ``"scope"`` used (with the refactored
+        ``"functions"`` in function scope) and the ``"cost"`` of the file;
+        single-pass results also hold the estimated ``"savings"`` over two
+        passes, and patch output results the ``"output"`` statistics of
+        :func:`refactor_patched_async`
+    """
+    if on_chunk is None:
+        import asyncio
+
+        return asyncio.run(
+            refactor_file_async(
+                file_path, GeminiClient(), output_path, mode, scope, only, output
+            )
+        )
     try:
         with open(file_path, "r", encoding="utf-8") as f:
             code = f.read()
 
         issues = analyze_code_quality(code)
-        suggestions = get_refactoring_suggestions(code, issues)
-
-        result = {
-            "file": file_path,
-            "issues": "\n".join(
-                f"{issue.line}:{issue.col} [{issue.severity}] {issue.message}"
-                for issue in issues
-            ),
-            "suggestions": suggestions,
-            "refactored_code": None,
-            "error": None,
-        }
-
-        if issues:
-            refactored_code, _ = apply_refactoring(code, suggestions)
-            result["refactored_code"] = refactored_code
-
-            if output_path:
-                output_dir = os.path.dirname(os.path.abspath(output_path))
-                os.makedirs(output_dir, exist_ok=True)
-                with open(output_path, "w", encoding="utf-8") as f:
-                    f.write(refactored_code)
-
-        return result
+        timings: Dict[str, Dict[str, Optional[float]]] = {}
+        routing: List[Dict] = []
+        cost = RefactorCost(mode)
+        result = _new_result(file_path, issues, routing)
+        result["timings"] = timings
+
+        scoped = None
+        targets = function_targets(code, issues, mode, scope, only)
+        if targets:
+            responses = [
+                _stream_prompt(
+                    build_function_prompt(target),
+                    "combined",
+                    on_chunk,
+                    timings,
+                    routing,
+                    len(target.issues),
+                    cost,
+                    function_validator(target),
+                )
+                for target in targets
+            ]
+            scoped = join_functions(code, targets, responses)
+        _set_scope(result, targets if scoped else None)
+
+        if scoped:
+            result["suggestions"], result["refactored_code"] = scoped
+        elif targets and only is not None:
+            _scope_failed(result, only)
+        elif issues and mode == SINGLE_PASS:
+            parts = [
+                (
+                    piece,
+                    None
+                    if prompt is None
+                    else _stream_prompt(
+                        prompt,
+                        "combined",
+                        on_chunk,
+                        timings,
+                        routing,
+                        complexity,
+                        cost,
+                        is_valid_combined,
+                    ),
+                )
+                for piece, prompt, complexity in combined_prompts(code, issues)
+            ]
+            result["suggestions"], result["refactored_code"] = join_combined(parts)
+        elif issues:
+            suggestions = "\n\n".join(
+                _stream_prompt(
+                    prompt,
+                    "suggestions",
+                    on_chunk,
+                    timings,
+                    routing,
+                    len(issues),
+                    cost,
+                )
+                for prompt in suggestion_prompts(code, issues)
+            )
+            result["suggestions"] = suggestions
+            result["refactored_code"] = join_refactored(
+                [
+                    _stream_prompt(
+                        prompt,
+                        "refactoring",
+                        on_chunk,
+                        timings,
+                        routing,
+                        cost=cost,
+                        validate=is_valid_refactoring,
+                    )
+                    for prompt in refactoring_prompts(code, suggestions)
+                ]
+            )
+
+        return _finish_result(result, code, issues, cost, output_path)
     except Exception as e:
-        return {
-            "file": file_path,
-            "issues": "",
-            "suggestions": "",
-            "refactored_code": None,
-            "error": str(e),
-        }
+        return _error_result(file_path, e)
+
+
+async def _run_async(
+    task: str,
+    prompt: str,
+    client: GeminiClient,
+    routing: List[Dict],
+    cost: RefactorCost,
+    validate: Optional[Callable[[str], bool]] = None,
+    complexity: int = 0,
+) -> str:
+    """Run one routed request through ``client``, recording routing and cost."""
+    started = time.perf_counter()
+    response, decisions = await run_routed_async(
+        task, prompt, client, validate=validate, complexity=complexity
+    )
+    cost.add(prompt, response, started, len(decisions))
+    routing.extend(decision.as_dict() for decision in decisions)
+    return response
+
+
+async def refactor_file_async(
+    file_path: str,
+    client: GeminiClient,
+    output_path: Optional[str] = None,
+    mode: str = REFACTOR_MODE,
+    scope: str = REFACTOR_SCOPE,
+    only: Optional[Collection[str]] = None,
+    output: str = REFACTOR_OUTPUT,
+) -> Dict[str, Any]:
+    """Refactor a single Python file through an async client.
+
+    The pieces of a file are requested concurrently, within the limit of
+    ``client``. Arguments and result are those of :func:`refactor_file`,
+    which runs this in its own event loop unless streaming.
+    """
+    import asyncio
+
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            code = f.read()
+
+        issues = analyze_code_quality(code)
+        routing: List[Dict] = []
+        cost = RefactorCost(mode)
+        result = _new_result(file_path, issues, routing)
+
+        scoped = None
+        targets = function_targets(code, issues, mode, scope, only)
+        if targets:
+            scoped = await refactor_functions_async(
+                code, targets, client, routing, cost
+            )
+        _set_scope(result, targets if scoped else None)
+
+        if scoped:
+            result["suggestions"], result["refactored_code"] = scoped
+        elif targets and only is not None:
+            _scope_failed(result, only)
+        elif issues and mode == SINGLE_PASS and output == PATCH_OUTPUT:
+            (
+                result["suggestions"],
+                result["refactored_code"],
+                result["output"],
+            ) = await refactor_patched_async(code, issues, client, routing, cost)
+        elif issues and mode == SINGLE_PASS:
+            prompts = combined_prompts(code, issues)
+            responses = await asyncio.gather(
+                *(
+                    _run_async(
+                        "refactoring",
+                        prompt,
+                        client,
+                        routing,
+                        cost,
+                        is_valid_combined,
+                        complexity,
+                    )
+                    for _, prompt, complexity in prompts
+                    if prompt is not None
+                )
+            )
+            answers = iter(responses)
+            parts = [
+                (piece, None if prompt is None else next(answers))
+                for piece, prompt, _ in prompts
+            ]
+            result["suggestions"], result["refactored_code"] = join_combined(parts)
+        elif issues:
+            responses = await asyncio.gather(
+                *(
+                    _run_async(
+                        "suggestions",
+                        prompt,
+                        client,
+                        routing,
+                        cost,
+                        complexity=len(issues),
+                    )
+                    for prompt in suggestion_prompts(code, issues)
+                )
+            )
+            suggestions = "\n\n".join(responses)
+            responses = await asyncio.gather(
+                *(
+                    _run_async(
+                        "refactoring",
+                        prompt,
+                        client,
+                        routing,
+                        cost,
+                        is_valid_refactoring,
+                    )
+                    for prompt in refactoring_prompts(code, suggestions)
+                )
+            )
+            result["suggestions"] = suggestions
+            result["refactored_code"] = join_refactored(list(responses))
+
+        return _finish_result(result, code, issues, cost, output_path)
+    except Exception as e:
+        return _error_result(file_path, e)
+
+
+async def refactor_files_async(
+    targets: Iterable[Tuple[str, Optional[str]]],
+    jobs: int,
+    mode: str = REFACTOR_MODE,
+    scope: str = REFACTOR_SCOPE,
+    output: str = REFACTOR_OUTPUT,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Refactor several files with at most ``jobs`` concurrent requests.
+
+    At most ``jobs`` files are in progress at a time and targets are taken
+    lazily, so memory stays flat however many files there are.
+
+    Args:
+        targets: Pairs of input file path and optional output path
+        jobs: Maximum number of concurrent model requests
+        mode: ``SINGLE_PASS`` or ``TWO_PASS``, as for :func:`refactor_file`
+        scope: ``FUNCTION_SCOPE`` or ``FILE_SCOPE``, as for :func:`refactor_file`
+        output: ``PATCH_OUTPUT`` or ``FULL_OUTPUT``, as for :func:`refactor_file`
+
+    Yields:
+        One result dictionary per target, in completion order
+    """
+    client = GeminiClient(max_concurrency=jobs)
+    async for result in as_completed_bounded(
+        (
+            refactor_file_async(
+                file_path, client, output_path, mode, scope, output=output
+            )
+            for file_path, output_path in targets
+        ),
+        jobs,
+    ):
+        yield result
+
+
+def refactor_files(
+    targets: Iterable[Tuple[str, Optional[str]]],
+    jobs: int = 1,
+    mode: str = REFACTOR_MODE,
+    scope: str = REFACTOR_SCOPE,
+    output: str = REFACTOR_OUTPUT,
+) -> Iterator[Dict[str, Any]]:
+    """Refactor several files, yielding each result as soon as it is ready.
+
+    Args:
+        targets: Pairs of input file path and optional output path
+        jobs: Number of concurrent requests; 1 processes files sequentially
+        mode: ``SINGLE_PASS`` or ``TWO_PASS``, as for :func:`refactor_file`
+        scope: ``FUNCTION_SCOPE`` or ``FILE_SCOPE``, as for :func:`refactor_file`
+        output: ``PATCH_OUTPUT`` or ``FULL_OUTPUT``, as for :func:`refactor_file`
+
+    Yields:
+        One result dictionary per target, in completion order
+    """
+    if jobs > 1:
+        yield from iterate_blocking(
+            refactor_files_async(targets, jobs, mode, scope, output)
+        )
+        return
+    for file_path, output_path in targets:
+        yield refactor_file(
+            file_path, output_path, mode=mode, scope=scope, output=output
+        )
@@ -0,0 +1,280 @@
+# app/agents/refactor_budget.py
+import heapq
+import math
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.agents.checkpoint import content_digest
+from app.agents.quality_rules import CodeIssue
+from app.agents.refactor_agent import (
+    REFACTOR_MODE,
+    REFACTOR_OUTPUT,
+    REFACTOR_SCOPE,
+    analyze_code_quality,
+    estimate_refactoring,
+    refactor_file_async,
+    target_tokens,
+)
+from app.llm.gemini import GeminiClient, as_completed_bounded, iterate_blocking
+
+# Value of fixing one issue, by severity; scaled by the size of the code
+SEVERITY_WEIGHTS = {"error": 5.0, "warning": 3.0, "info": 1.0}
+
+
+def issue_score(issue: CodeIssue, lines: int) -> float:
+    """Score one issue by its severity and the size of the code it is in.
+
+    Size grows the score logarithmically, so a long function ranks above a
+    short one with the same issue without dwarfing more severe issues.
+    """
+    return SEVERITY_WEIGHTS.get(issue.severity, 1.0) * math.log2(2 + lines)
+
+
+@dataclass
+class FunctionPlan:
+    """A function of a file, with its score and estimated tokens."""
+
+    qualname: str
+    score: float
+    tokens: int
+
+
+@dataclass
+class WorkItem:
+    """The plan of a file: its score, estimated cost and issues."""
+
+    file_path: str
+    output_path: Optional[str]
+    digest: Optional[str]
+    score: float
+    requests: int
+    tokens: int
+    issues: List[Dict[str, Any]]
+    functions: List[FunctionPlan] = field(default_factory=list)
+
+
+# Queue entry of a file: negated score (so the best value pops first), path,
+# output path and content digest. Plans are rebuilt when files are popped,
+# so the queue does not hold the issues of the whole tree.
+QueueEntry = Tuple[float, str, Optional[str], Optional[str]]
+
+
+@dataclass
+class RefactorBudget:
+    """Limits of a refactoring run; None means unlimited.
+
+    Requests and tokens are reserved with the estimate of each file when it
+    starts and settled with its actual cost when it finishes, so concurrent
+    files cannot overshoot the limits by more than estimation errors.
+    """
+
+    max_calls: Optional[int] = None
+    max_tokens: Optional[int] = None
+    time_budget: Optional[float] = None
+    calls: int = 0
+    tokens: int = 0
+    started: float = field(default_factory=time.perf_counter)
+
+    def remaining(self) -> Tuple[float, float]:
+        """Return the requests and tokens still available."""
+        calls = math.inf if self.max_calls is None else self.max_calls - self.calls
+        tokens = math.inf if self.max_tokens is None else self.max_tokens - self.tokens
+        return calls, tokens
+
+    def expired(self) -> bool:
+        """Return True once the time budget is used up."""
+        return (
+            self.time_budget is not None
+            and time.perf_counter() - self.started >= self.time_budget
+        )
+
+    def reserve(self, requests: int, tokens: int) -> None:
+        """Set aside the estimated cost of a file about to start."""
+        self.calls += requests
+        self.tokens += tokens
+
+    def settle(self, requests: int, tokens: int, cost: Optional[Dict]) -> None:
+        """Replace a file's reservation with the cost it actually had."""
+        cost = cost or {}
+        self.calls += cost.get("requests", 0) - requests
+        self.tokens += (
+            cost.get("prompt_tokens", 0) + cost.get("response_tokens", 0) - tokens
+        )
+
+
+def plan_file(
+    file_path: str,
+    output_path: Optional[str],
+    mode: str = REFACTOR_MODE,
+    scope: str = REFACTOR_SCOPE,
+) -> WorkItem:
+    """Analyze a file locally and estimate the value and cost of refactoring it.
+
+    In function scope each flagged function is scored by its own issues and
+    length; otherwise every issue is scored with the length of the file.
+    Files that cannot be read get a zero score and are left to
+    :func:`refactor_file_async` to report.
+    """
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            code = f.read()
+    except (OSError, UnicodeDecodeError):
+        return WorkItem(file_path, output_path, None, 0.0, 0, 0, [])
+
+    issues = analyze_code_quality(code)
+    targets, requests, tokens = estimate_refactoring(code, issues, mode, scope)
+    functions = [
+        FunctionPlan(
+            target.qualname,
+            sum(
+                issue_score(issue, target.end - target.start + 1)
+                for issue in target.issues
+            ),
+            target_tokens(target),
+        )
+        for target in targets or []
+    ]
+    functions.sort(key=lambda plan: -plan.score)
+    if functions:
+        score = sum(plan.score for plan in functions)
+    else:
+        lines = code.count("\n") + 1
+        score = sum(issue_score(issue, lines) for issue in issues)
+    return WorkItem(
+        file_path,
+        output_path,
+        content_digest(code.encode("utf-8")),
+        score,
+        requests,
+        tokens,
+        [asdict(issue) for issue in issues],
+        functions,
+    )
+
+
+def plan_refactoring(
+    targets: Iterable[Tuple[str, Optional[str]]],
+    mode: str = REFACTOR_MODE,
+    scope: str = REFACTOR_SCOPE,
+) -> List[QueueEntry]:
+    """Build the priority queue of a run, a heap of :data:`QueueEntry`."""
+    heap = []
+    for file_path, output_path in targets:
+        item = plan_file(file_path, output_path, mode, scope)
+        heap.append((-item.score, file_path, output_path, item.digest))
+    heapq.heapify(heap)
+    return heap
+
+
+def select_work(
+    item: WorkItem, budget: RefactorBudget
+) -> Tuple[Optional[List[str]], Optional[str]]:
+    """Decide how much of a file the remaining budget allows.
+
+    A file that does not fit as a whole can still have its highest-scoring
+    functions refactored, as many as fit.
+
+    Returns:
+        Tuple of the functions to refactor (None for the whole file) and,
+        if the file has to be skipped, the reason
+    """
+    if not item.requests:
+        return None, None
+    if budget.expired():
+        return None, "time budget exhausted"
+    calls, tokens = budget.remaining()
+    if item.requests <= calls and item.tokens <= tokens:
+        return None, None
+    chosen: List[str] = []
+    for plan in item.functions:
+        if len(chosen) + 1 <= calls and plan.tokens <= tokens:
+            chosen.append(plan.qualname)
+            tokens -= plan.tokens
+    if chosen:
+        return chosen, None
+    if item.requests > calls:
+        return None, "call budget exhausted"
+    return None, "token budget exhausted"
+
+
+def refactor_prioritized(
+    targets: Iterable[Tuple[str, Optional[str]]],
+    jobs: int = 1,
+    mode: str = REFACTOR_MODE,
+    scope: str = REFACTOR_SCOPE,
+    budget: Optional[RefactorBudget] = None,
+    output: str = REFACTOR_OUTPUT,
+) -> Iterator[Dict[str, Any]]:
+    """Refactor files highest-value first within a budget.
+
+    Every file is analyzed locally and queued by score; files are taken from
+    the queue as request slots free up, planned again and checked against
+    what is left of the budget. A file that changed since it was queued goes
+    back into the queue with its new score. Files that do not fit are
+    skipped and reported, and in function scope a file may be refactored
+    partially.
+
+    Args:
+        targets: Pairs of input file path and optional output path
+        jobs: Maximum number of concurrent model requests
+        mode: ``SINGLE_PASS`` or ``TWO_PASS``, as for ``refactor_file``
+        scope: ``FUNCTION_SCOPE`` or ``FILE_SCOPE``, as for ``refactor_file``
+        budget: Limits of the run; unlimited by default
+        output: ``PATCH_OUTPUT`` or ``FULL_OUTPUT``, as for ``refactor_file``
+
+    Yields:
+        Result dictionaries, with their ``"priority"`` score and any
+        ``"skipped_functions"``, in completion order; skipped files yield
+        ``{"file", "skipped", "priority", "estimate", "issue_records"}``
+    """
+    budget = budget or RefactorBudget()
+    heap = plan_refactoring(targets, mode, scope)
+    client = GeminiClient(max_concurrency=jobs)
+
+    async def run(
+        item: WorkItem, only: Optional[List[str]], requests: int, tokens: int
+    ) -> Dict[str, Any]:
+        result = await refactor_file_async(
+            item.file_path, client, item.output_path, mode, scope, only, output
+        )
+        budget.settle(requests, tokens, result.get("cost"))
+        result["priority"] = round(item.score, 2)
+        if only is not None:
+            result["skipped_functions"] = [
+                plan.qualname for plan in item.functions if plan.qualname not in only
+            ]
+        return result
+
+    async def skip(item: WorkItem, reason: str) -> Dict[str, Any]:
+        return {
+            "file": item.file_path,
+            "skipped": reason,
+            "priority": round(item.score, 2),
+            "estimate": {"requests": item.requests, "tokens": item.tokens},
+            "issue_records": item.issues,
+        }
+
+    def work() -> Iterator[Any]:
+        # Runs as slots free up, so each file sees the budget left by the
+        # files started (reserved) and finished (settled) before it
+        while heap:
+            _, file_path, output_path, digest = heapq.heappop(heap)
+            item = plan_file(file_path, output_path, mode, scope)
+            if item.digest != digest:
+                heapq.heappush(
+                    heap, (-item.score, file_path, output_path, item.digest)
+                )
+                continue
+            only, reason = select_work(item, budget)
+            if reason:
+                yield skip(item, reason)
+                continue
+            requests, tokens = item.requests, item.tokens
+            if only is not None:
+                chosen = [plan for plan in item.functions if plan.qualname in only]
+                requests, tokens = len(chosen), sum(plan.tokens for plan in chosen)
+            budget.reserve(requests, tokens)
+            yield run(item, only, requests, tokens)
+
+    yield from iterate_blocking(as_completed_bounded(work(), max(1, jobs)))
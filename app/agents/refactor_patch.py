@@ -0,0 +1,200 @@
+# app/agents/refactor_patch.py
+import difflib
+import os
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+# Markers of a search/replace block in a model response
+SEARCH_MARKER = "<<<<<<< SEARCH"
+DIVIDER_MARKER = "======="
+REPLACE_MARKER = ">>>>>>> REPLACE"
+
+# Least similarity (0 to 1) of fuzzily matched lines to a block's search text
+PATCH_FUZZ = float(os.getenv("CODEXAGENT_PATCH_FUZZ", "0.9"))
+
+
+class PatchError(ValueError):
+    """An edit that cannot be located in the code it is applied to."""
+
+
+@dataclass
+class Edit:
+    """Lines to find in the code and the lines to put in their place."""
+
+    search: List[str] = field(default_factory=list)
+    replace: List[str] = field(default_factory=list)
+
+
+def parse_search_replace(text: str) -> List[Edit]:
+    """Parse ``SEARCH``/``REPLACE`` blocks; text outside blocks is ignored."""
+    edits: List[Edit] = []
+    current: Optional[Edit] = None
+    target: List[str] = []
+    for line in text.splitlines():
+        marker = line.strip()
+        if marker.startswith(SEARCH_MARKER[:7]) and "SEARCH" in marker:
+            current = Edit()
+            target = current.search
+        elif current is not None and marker == DIVIDER_MARKER:
+            target = current.replace
+        elif current is not None and marker.startswith(REPLACE_MARKER[:7]):
+            edits.append(current)
+            current = None
+        elif current is not None:
+            target.append(line)
+    return edits
+
+
+def parse_unified_diff(text: str) -> List[Edit]:
+    """Parse the hunks of a unified diff into edits.
+
+    Context and removed lines make up the search text, context and added
+    lines the replacement; line numbers in hunk headers are ignored, since
+    hunks are located by their content.
+    """
+    edits: List[Edit] = []
+    current: Optional[Edit] = None
+    for line in text.splitlines():
+        if line.startswith("@@"):
+            current = Edit()
+            edits.append(current)
+        elif current is None or line.startswith(("---", "+++", "\\")):
+            continue
+        elif line.startswith("```"):
+            current = None
+        elif line.startswith("-"):
+            current.search.append(line[1:])
+        elif line.startswith("+"):
+            current.replace.append(line[1:])
+        else:
+            # Context lines; editors often strip the space of blank ones
+            context = line[1:] if line.startswith(" ") else line
+            current.search.append(context)
+            current.replace.append(context)
+    return [edit for edit in edits if edit.search or edit.replace]
+
+
+def parse_edits(text: str) -> List[Edit]:
+    """Parse search/replace blocks, or unified diff hunks if there are none."""
+    if SEARCH_MARKER[:7] in text:
+        return parse_search_replace(text)
+    return parse_unified_diff(text)
+
+
+def _normalize(line: str) -> str:
+    return "".join(line.split())
+
+
+def _indent(lines: List[str]) -> str:
+    first = next((line for line in lines if line.strip()), "")
+    return first[: len(first) - len(first.lstrip())]
+
+
+def _locate_exact(lines: List[str], search: List[str], start: int) -> Optional[int]:
+    size = len(search)
+    for begin in list(range(start, len(lines))) + list(range(0, start)):
+        if lines[begin : begin + size] == search:
+            return begin
+    return None
+
+
+def _locate_normalized(
+    lines: List[str], search: List[str], start: int
+) -> Optional[Tuple[int, int]]:
+    """Match ignoring whitespace within lines and blank lines."""
+    wanted = [_normalize(line) for line in search if line.strip()]
+    if not wanted:
+        return None
+    content = [(i, _normalize(line)) for i, line in enumerate(lines) if line.strip()]
+    norms = [norm for _, norm in content]
+    found = [
+        i
+        for i in range(len(norms) - len(wanted) + 1)
+        if norms[i : i + len(wanted)] == wanted
+    ]
+    if not found:
+        return None
+    after = [i for i in found if content[i][0] >= start]
+    i = (after or found)[0]
+    return content[i][0], content[i + len(wanted) - 1][0] + 1
+
+
+def _locate_fuzzy(
+    lines: List[str], search: List[str], fuzz: float
+) -> Optional[Tuple[int, int]]:
+    """Find the window of lines most similar to the search text."""
+    size = len(search)
+    wanted = "\n".join(_normalize(line) for line in search)
+    matcher = difflib.SequenceMatcher(autojunk=False)
+    matcher.set_seq2(wanted)
+    best: Optional[Tuple[float, int]] = None
+    for begin in range(max(len(lines) - size + 1, 0)):
+        window = lines[begin : begin + size]
+        matcher.set_seq1("\n".join(_normalize(line) for line in window))
+        if matcher.real_quick_ratio() < fuzz or matcher.quick_ratio() < fuzz:
+            continue
+        ratio = matcher.ratio()
+        if ratio >= fuzz and (best is None or ratio > best[0]):
+            best = (ratio, begin)
+    if best is None:
+        return None
+    return best[1], best[1] + size
+
+
+def locate(
+    lines: List[str], search: List[str], start: int = 0, fuzz: float = PATCH_FUZZ
+) -> Tuple[int, int]:
+    """Find the lines an edit's search text refers to.
+
+    Matching is tried exactly, then ignoring all whitespace and blank
+    lines, and finally by similarity of at least ``fuzz``. Exact and
+    whitespace matches at or after ``start`` (the end of the previous edit)
+    are preferred.
+
+    Returns:
+        The start and end (exclusive) of the matched lines
+
+    Raises:
+        PatchError: If the search text is empty or cannot be found
+    """
+    if not any(line.strip() for line in search):
+        raise PatchError("edit has no search text")
+    begin = _locate_exact(lines, search, start)
+    if begin is not None:
+        return begin, begin + len(search)
+    span = _locate_normalized(lines, search, start) or _locate_fuzzy(
+        lines, search, fuzz
+    )
+    if span is None:
+        raise PatchError(f"edit does not match the code: {search[0].strip()!r}")
+    return span
+
+
+def apply_edits(code: str, edits: List[Edit], fuzz: float = PATCH_FUZZ) -> str:
+    """Apply edits in order to ``code``.
+
+    A replacement whose indentation differs from the matched lines (as
+    happens with whitespace-insensitive matches) is shifted to their level.
+    The code's line endings and trailing newline are kept.
+
+    Raises:
+        PatchError: If an edit cannot be located
+    """
+    lines = code.splitlines()
+    cursor = 0
+    for edit in edits:
+        begin, end = locate(lines, edit.search, cursor, fuzz)
+        found, wanted = _indent(lines[begin:end]), _indent(edit.search)
+        replacement = [
+            found + line[len(wanted) :]
+            if found != wanted and line.strip() and line.startswith(wanted)
+            else line
+            for line in edit.replace
+        ]
+        lines[begin:end] = replacement
+        cursor = begin + len(replacement)
+    newline = "\r\n" if "\r\n" in code else "\n"
+    patched = newline.join(lines)
+    if code.endswith(("\n", "\r")):
+        patched += newline
+    return patched
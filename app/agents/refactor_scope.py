@@ -0,0 +1,258 @@
+# app/agents/refactor_scope.py
+import ast
+import textwrap
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from app.agents.quality_rules import CodeIssue
+
+FunctionNode = Union[ast.FunctionDef, ast.AsyncFunctionDef]
+_FUNCTION_NODES = (ast.FunctionDef, ast.AsyncFunctionDef)
+
+
+@dataclass
+class FunctionTarget:
+    """A flagged function and the line range it occupies in its module.
+
+    ``start`` and ``end`` are 1-based and inclusive; ``start`` is the first
+    decorator line. Issue lines are relative to ``source``.
+    """
+
+    qualname: str
+    start: int
+    end: int
+    indent: str
+    source: str
+    context: str = ""
+    issues: List[CodeIssue] = field(default_factory=list)
+
+
+def _first_line(node: FunctionNode) -> int:
+    return min([node.lineno] + [d.lineno for d in node.decorator_list])
+
+
+def scoped_functions(
+    tree: ast.Module,
+) -> List[Tuple[str, FunctionNode, Optional[ast.ClassDef]]]:
+    """Return every function with its qualified name and enclosing class."""
+    found: List[Tuple[str, FunctionNode, Optional[ast.ClassDef]]] = []
+
+    def visit(
+        body: List[ast.stmt], prefix: str, owner: Optional[ast.ClassDef]
+    ) -> None:
+        for node in body:
+            if isinstance(node, _FUNCTION_NODES):
+                found.append((prefix + node.name, node, owner))
+                visit(node.body, f"{prefix}{node.name}.<locals>.", None)
+            elif isinstance(node, ast.ClassDef):
+                visit(node.body, f"{prefix}{node.name}.", node)
+
+    visit(tree.body, "", None)
+    return found
+
+
+def _signature(lines: List[str], node: ast.AST) -> str:
+    """Return the ``def``/``class`` header of ``node`` with its body elided."""
+    body = node.body[0]  # type: ignore[attr-defined]
+    header = lines[node.lineno - 1 : body.lineno]  # type: ignore[attr-defined]
+    if body.lineno == node.lineno:  # type: ignore[attr-defined]
+        header = [header[0][: body.col_offset]]
+    else:
+        header = header[:-1]
+    text = "".join(header).rstrip()
+    indent = " " * (node.col_offset + 4)  # type: ignore[attr-defined]
+    return f"{text}\n{indent}..."
+
+
+def _called_names(node: FunctionNode) -> Tuple[Set[str], Set[str]]:
+    """Return the plain names and the ``self.`` attributes ``node`` calls."""
+    names: Set[str] = set()
+    methods: Set[str] = set()
+    for call in ast.walk(node):
+        if not isinstance(call, ast.Call):
+            continue
+        func = call.func
+        if isinstance(func, ast.Name):
+            names.add(func.id)
+        elif (
+            isinstance(func, ast.Attribute)
+            and isinstance(func.value, ast.Name)
+            and func.value.id in ("self", "cls")
+        ):
+            methods.add(func.attr)
+    return names, methods
+
+
+def function_context(
+    tree: ast.Module,
+    lines: List[str],
+    node: FunctionNode,
+    owner: Optional[ast.ClassDef] = None,
+) -> str:
+    """Return the minimal context a model needs to refactor ``node``.
+
+    The context holds the module's imports, the header of the enclosing
+    class and the signatures of module-level functions, classes and sibling
+    methods that ``node`` calls. Bodies are elided.
+    """
+    imports = [
+        "".join(lines[stmt.lineno - 1 : stmt.end_lineno]).rstrip()
+        for stmt in tree.body
+        if isinstance(stmt, (ast.Import, ast.ImportFrom))
+    ]
+    names, methods = _called_names(node)
+    helpers = [
+        _signature(lines, stmt)
+        for stmt in tree.body
+        if isinstance(stmt, _FUNCTION_NODES + (ast.ClassDef,))
+        and stmt is not node
+        and stmt.name in names
+    ]
+    parts = ["\n".join(imports)] if imports else []
+    if helpers:
+        parts.append("\n\n".join(helpers))
+    if owner is not None:
+        header = _signature(lines, owner).rsplit("\n", 1)[0]
+        methods_context = [
+            _signature(lines, stmt)
+            for stmt in owner.body
+            if isinstance(stmt, _FUNCTION_NODES)
+            and stmt is not node
+            and stmt.name in methods
+        ]
+        parts.append("\n".join([header] + methods_context))
+    return "\n\n".join(parts)
+
+
+def find_function_targets(
+    code: str, issues: List[CodeIssue]
+) -> Optional[List[FunctionTarget]]:
+    """Map issues to the functions they were reported on.
+
+    An issue belongs to the innermost function whose line range holds it;
+    a flagged function nested in another flagged function is refactored as
+    part of the outer one, so targets never overlap.
+
+    Returns:
+        The targets in source order, or None if the module does not parse or
+        an issue lies outside every function, in which case the whole file
+        has to be refactored
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    lines = code.splitlines(keepends=True)
+    functions = scoped_functions(tree)
+
+    flagged: Dict[int, List[CodeIssue]] = {}
+    for issue in issues:
+        owners = [
+            (index, node)
+            for index, (_, node, _) in enumerate(functions)
+            if _first_line(node) <= issue.line <= (node.end_lineno or node.lineno)
+        ]
+        if not owners:
+            return None
+        index = max(owners, key=lambda pair: _first_line(pair[1]))[0]
+        flagged.setdefault(index, []).append(issue)
+
+    targets: List[FunctionTarget] = []
+    for index in sorted(flagged, key=lambda i: _first_line(functions[i][1])):
+        qualname, node, owner = functions[index]
+        start, end = _first_line(node), node.end_lineno or node.lineno
+        outer = targets[-1] if targets else None
+        if outer is not None and start <= outer.end:
+            outer.issues += _relative(flagged[index], outer.start, outer.indent)
+            continue
+        first = lines[start - 1]
+        indent = first[: len(first) - len(first.lstrip())]
+        targets.append(
+            FunctionTarget(
+                qualname=qualname,
+                start=start,
+                end=end,
+                indent=indent,
+                source="".join(lines[start - 1 : end]),
+                context=function_context(tree, lines, node, owner),
+                issues=_relative(flagged[index], start, indent),
+            )
+        )
+    return targets
+
+
+def _relative(issues: List[CodeIssue], start: int, indent: str) -> List[CodeIssue]:
+    """Renumber issue positions relative to a span's dedented source."""
+    return [
+        replace(
+            issue, line=issue.line - start + 1, col=max(issue.col - len(indent), 0)
+        )
+        for issue in issues
+    ]
+
+
+def parse_block(code: str) -> Optional[ast.Module]:
+    """Parse ``code`` at whatever indentation level it has.
+
+    Code still indented after dedenting (e.g. a method containing a string
+    with unindented lines) is parsed as the body of a block.
+
+    Returns:
+        The syntax tree, or None if the code is not valid Python
+    """
+    code = textwrap.dedent(code)
+    if code[:1] in (" ", "\t"):
+        code = "if True:\n" + code
+    try:
+        return ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+
+
+def replaces_target(code: str, target: FunctionTarget) -> bool:
+    """Return True if ``code`` parses and still defines the target function."""
+    tree = parse_block(code)
+    name = target.qualname.rsplit(".", 1)[-1]
+    return tree is not None and any(
+        isinstance(node, _FUNCTION_NODES) and node.name == name
+        for node in ast.walk(tree)
+    )
+
+
+def reindent(code: str, indent: str) -> str:
+    """Indent replacement code to the level of the span it replaces.
+
+    Code whose first line already carries ``indent`` is kept as it is, so
+    multi-line strings inside it are not altered.
+    """
+    first = next((line for line in code.splitlines() if line.strip()), "")
+    if first[: len(first) - len(first.lstrip())] == indent:
+        return code
+    return textwrap.indent(textwrap.dedent(code), indent)
+
+
+def splice_functions(code: str, replacements: List[Tuple[FunctionTarget, str]]) -> str:
+    """Replace the line ranges of functions with new code.
+
+    Replacements are applied bottom-up so earlier line numbers stay valid;
+    all other lines, and the file's line endings, are left untouched.
+
+    Args:
+        code: Original module source
+        replacements: Pairs of target and its replacement code
+
+    Returns:
+        The spliced module source
+    """
+    lines = code.splitlines(keepends=True)
+    newline = "\r\n" if "\r\n" in code else "\n"
+    for target, new_code in sorted(
+        replacements, key=lambda pair: pair[0].start, reverse=True
+    ):
+        text = reindent(new_code.strip("\n"), target.indent)
+        new_lines = [line + newline for line in text.splitlines()]
+        lines[target.start - 1 : target.end] = new_lines
+    spliced = "".join(lines)
+    if not code.endswith(("\n", "\r")):
+        spliced = spliced.rstrip("\r\n")
+    return spliced
@@ -1,5 +1,6 @@
 # app/agents/summarize_agent.py
-from app.llm.gemini import run_gemini
+from app.llm.gemini import prompt_budget, run_routed
+from app.llm.tokens import estimate_tokens, fit_text
 
 SUMMARIZE_PROMPT_TEMPLATE = """
 You are a senior software engineer.
@@ -14,7 +15,13 @@ Code:
 
 
 def summarize_code(file_listing: str, code_snippets: str) -> str:
+    # The listing gets at most half of the input budget, the code the rest
+    available = prompt_budget().input_tokens - estimate_tokens(
+        SUMMARIZE_PROMPT_TEMPLATE.format(file_listing="", code_snippets="")
+    )
+    file_listing = fit_text(file_listing, available // 2)
+    code_snippets = fit_text(code_snippets, available - estimate_tokens(file_listing))
     prompt = SUMMARIZE_PROMPT_TEMPLATE.format(
         file_listing=file_listing, code_snippets=code_snippets
     )
-    return run_gemini(prompt)
+    return run_routed("summarize", prompt)[0]
@@ -1,18 +1,62 @@
 # cli.py
+import importlib
+from typing import Any, Dict, List, Optional, Tuple
+
 import typer
+from typer.core import TyperCommand, TyperGroup
 
-from app.commands import docgen, refactor, summarize
+# Subcommands are imported only when invoked, so `--help` and local commands
+# do not pay for the modules (and SDKs) of the others
+SUBCOMMANDS: Dict[str, Tuple[str, str]] = {
+    "summarize": ("app.commands.summarize", "Generate summaries of code repositories"),
+    "docgen": ("app.commands.docgen", "Generate documentation for Python code"),
+    "refactor": ("app.commands.refactor", "Refactor Python code to improve quality"),
+    "index": ("app.commands.index", "Index code metrics in a SQLite database"),
+}
 
-app = typer.Typer(help="CodexAgent - AI-powered code analysis and refactoring tool")
 
-# Add sub-apps with help text split for line length
-app.add_typer(
-    summarize.app, name="summarize", help="Generate summaries of code repositories"
-)
-app.add_typer(docgen.app, name="docgen", help="Generate documentation for Python code")
-app.add_typer(
-    refactor.app, name="refactor", help="Refactor Python code to improve quality"
+class LazyGroup(TyperGroup):
+    """Top-level command group that imports subcommand modules on demand."""
+
+    def list_commands(self, ctx: Any) -> List[str]:
+        return list(SUBCOMMANDS) + super().list_commands(ctx)
+
+    def get_command(self, ctx: Any, cmd_name: str) -> Optional[Any]:
+        if cmd_name in SUBCOMMANDS:
+            # Placeholder used for help listings; see resolve_command
+            return TyperCommand(name=cmd_name, help=SUBCOMMANDS[cmd_name][1])
+        return super().get_command(ctx, cmd_name)
+
+    def resolve_command(self, ctx: Any, args: List[str]) -> Tuple[Any, Any, Any]:
+        cmd_name, cmd, args = super().resolve_command(ctx, args)
+        if cmd_name in SUBCOMMANDS:
+            cmd = load_subcommand(cmd_name)
+        return cmd_name, cmd, args
+
+
+def load_subcommand(name: str) -> TyperGroup:
+    """Import a subcommand module and build its command group."""
+    module_name, help_text = SUBCOMMANDS[name]
+    module = importlib.import_module(module_name)
+    group = typer.main.get_group(module.app)
+    group.name = name
+    group.help = help_text
+    return group
+
+
+# Plain help formatting for the top level: rendering it with Rich would import
+# rich/markdown-it/pygments and dominate `codexagent --help` start-up time
+app = typer.Typer(
+    cls=LazyGroup,
+    help="CodexAgent - AI-powered code analysis and refactoring tool",
+    rich_markup_mode=None,
 )
 
+
+@app.callback()
+def main() -> None:
+    """CodexAgent - AI-powered code analysis and refactoring tool."""
+
+
 if __name__ == "__main__":
     app()
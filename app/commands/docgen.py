@@ -1,41 +1,233 @@
 # app/commands/docgen.py
+import difflib
 import os
+import shutil
+import tempfile
+from typing import Optional
 
 import typer
 from rich.console import Console
+from rich.progress import (
+    BarColumn,
+    MofNCompleteColumn,
+    Progress,
+    ProgressColumn,
+    Task,
+    TextColumn,
+    TimeElapsedColumn,
+)
+from rich.text import Text
 
-from app.agents.docgen_agent import document_directory, document_file
+from app.agents.docgen_agent import (
+    CHUNK_TOKENS,
+    REDUCE_FANIN,
+    document_file,
+    document_file_stream,
+    find_python_files,
+)
+from app.agents.docgen_apply import apply_docstrings
+from app.agents.docgen_manifest import (
+    JOURNAL_NAME,
+    MANIFEST_NAME,
+    document_directory_incremental,
+)
+from app.llm.gemini import (
+    DEFAULT_CONCURRENCY,
+    configure_cache,
+    configure_metrics,
+    usage_summary,
+    write_metrics,
+)
 
 app = typer.Typer(help="Generate documentation for Python code")
 console = Console()
 
 
-def generate_docs(file_or_dir: str, output: str, style: str = "numpy") -> None:
+class ThroughputColumn(ProgressColumn):
+    """Progress column showing files completed per second since the start."""
+
+    def render(self, task: Task) -> Text:
+        elapsed = task.finished_time if task.finished else task.elapsed
+        speed = task.completed / elapsed if elapsed else 0.0
+        return Text(f"{speed:.1f} files/s", style="progress.data.speed")
+
+
+def _umask() -> int:
+    """Return the process umask (it can only be read by setting it)."""
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+def write_atomic(path: str, text: str) -> None:
+    """Write ``text`` to ``path`` so readers never see a partial file.
+
+    An existing file keeps its permission bits; a new one gets the mode
+    ``open`` would give it under the current umask.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        else:
+            os.chmod(tmp_path, 0o666 & ~_umask())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_directory_docs(
+    directory: str,
+    output: str,
+    style: str = "numpy",
+    jobs: int = 1,
+    pack: bool = False,
+    full: bool = False,
+    resume: bool = False,
+    chunk_tokens: int = CHUNK_TOKENS,
+    reduce_fanin: int = REDUCE_FANIN,
+) -> int:
+    """Document a directory, writing each file's documentation as it completes.
+
+    Output paths mirror the source tree (``pkg/utils.py`` is documented in
+    ``<output>/pkg/utils.py.md``), and a progress bar shows throughput.
+    Files without module-level functions or classes are skipped, and files
+    that fail are reported without touching their previous documentation.
+
+    Args:
+        directory: Directory containing Python files
+        output: Output directory
+        style: Documentation style (numpy, google, or rest)
+        jobs: Number of concurrent model requests
+        pack: Document symbols of several files per request
+        full: Regenerate every symbol, ignoring the manifest
+        resume: Replay files completed by an interrupted run from its journal
+        chunk_tokens: Largest structure documented with one request
+        reduce_fanin: Documents combined per overview (reduce) request
+
+    Returns:
+        Number of files that failed
+    """
+    os.makedirs(output, exist_ok=True)
+    python_files = find_python_files(directory)
+    docs = document_directory_incremental(
+        directory,
+        os.path.join(output, MANIFEST_NAME),
+        style,
+        jobs,
+        pack,
+        full,
+        os.path.join(output, JOURNAL_NAME),
+        resume,
+        chunk_tokens,
+        reduce_fanin,
+        python_files,
+    )
+    with Progress(
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        MofNCompleteColumn(),
+        ThroughputColumn(),
+        TimeElapsedColumn(),
+        console=console,
+    ) as progress:
+        task = progress.add_task("Documenting", total=len(python_files))
+        errors = 0
+        for file_path, doc, error in docs:
+            if error is not None:
+                progress.console.print(f"[red]Error processing {file_path}: {error}")
+                errors += 1
+            elif doc is None:
+                progress.console.print(
+                    f"[yellow]Skipped {file_path}: no functions or classes"
+                )
+            else:
+                output_path = os.path.join(
+                    output, os.path.relpath(file_path, directory) + ".md"
+                )
+                write_atomic(output_path, doc)
+                progress.console.print(
+                    f"[green]Documentation generated: {output_path}"
+                )
+            progress.advance(task)
+    return errors
+
+
+def stream_docs(file_path: str, output: str, style: str = "numpy") -> None:
+    """Stream documentation for one file to the console and the output file.
+
+    Args:
+        file_path: Path to the Python file
+        output: Output file path
+        style: Documentation style (numpy, google, or rest)
+    """
+    doc_stream = document_file_stream(file_path, style)
+    with open(output, "w", encoding="utf-8") as f:
+        for chunk in doc_stream:
+            console.out(chunk, end="", highlight=False)
+            f.write(chunk)
+            f.flush()
+    console.out("")
+    console.print(f"[green]Documentation generated: {output}")
+    console.print(
+        f"[blue]Time to first token: {doc_stream.time_to_first_token:.2f}s, "
+        f"total: {doc_stream.total_time:.2f}s"
+    )
+
+
+def generate_docs(
+    file_or_dir: str,
+    output: str,
+    style: str = "numpy",
+    jobs: int = 1,
+    stream: bool = False,
+    pack: bool = False,
+    full: bool = False,
+    chunk_tokens: int = CHUNK_TOKENS,
+    reduce_fanin: int = REDUCE_FANIN,
+    resume: bool = False,
+) -> None:
     """Generate documentation for Python files.
 
     Args:
         file_or_dir: Path to a Python file or directory containing Python files
         output: Output file or directory path
         style: Documentation style (numpy, google, or rest)
+        jobs: Number of concurrent model requests for directories
+        stream: Stream a single file's documentation as it is generated
+        pack: Document symbols of several files per request
+        full: Regenerate every symbol of a directory, ignoring the manifest
+        chunk_tokens: Largest code structure documented with one request;
+            larger files and symbols are documented in chunks (0 disables)
+        reduce_fanin: Chunk documents combined per reduce call
+        resume: Replay directory files completed by an interrupted run
     """
+    errors = 0
     try:
-        if os.path.isfile(file_or_dir):
-            doc = document_file(file_or_dir, style)
+        if os.path.isfile(file_or_dir) and stream:
+            stream_docs(file_or_dir, output, style)
+        elif os.path.isfile(file_or_dir):
+            doc = document_file(file_or_dir, style, chunk_tokens, reduce_fanin)
             with open(output, "w", encoding="utf-8") as f:
                 f.write(doc)
             console.print(f"[green]Documentation generated: {output}")
         elif os.path.isdir(file_or_dir):
-            docs = document_directory(file_or_dir, style)
-            os.makedirs(output, exist_ok=True)
-
-            for file_path, doc in docs.items():
-                os.path.relpath(file_path, file_or_dir)  # Keep for potential future use
-                output_path = os.path.join(output, os.path.basename(file_path) + ".md")
-                os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
-                with open(output_path, "w", encoding="utf-8") as f:
-                    f.write(doc)
-                console.print(f"[green]Documentation generated: {output_path}")
+            errors = write_directory_docs(
+                file_or_dir,
+                output,
+                style,
+                jobs,
+                pack,
+                full,
+                resume,
+                chunk_tokens,
+                reduce_fanin,
+            )
         else:
             console.print(f"[red]Error: {file_or_dir} is not a valid file or directory")
             raise typer.Exit(1)
@@ -44,6 +236,14 @@ def generate_docs(file_or_dir: str, output: str, style: str = "numpy") -> None:
         console.print(f"[red]Error generating documentation: {str(e)}")
         raise typer.Exit(1) from e
 
+    for line in usage_summary():
+        console.print(f"[blue]{line}", highlight=False, soft_wrap=True)
+    metrics_path = write_metrics()
+    if metrics_path:
+        console.print(f"[blue]Metrics written to: {metrics_path}")
+    if errors:
+        raise typer.Exit(1)
+
 
 @app.command()
 def file(
@@ -52,9 +252,42 @@ def file(
     style: str = typer.Option(
         "numpy", "--style", "-s", help="Docstring style (numpy, google, or rest)"
     ),
+    stream: bool = typer.Option(
+        False, "--stream", help="Print and write documentation as it is generated"
+    ),
+    chunk_tokens: int = typer.Option(
+        CHUNK_TOKENS,
+        "--chunk-tokens",
+        help="Document modules larger than this many tokens in chunks (0: never)",
+    ),
+    reduce_fanin: int = typer.Option(
+        REDUCE_FANIN,
+        "--reduce-fanin",
+        help="Chunk documents combined by each overview (reduce) request",
+    ),
+    no_cache: bool = typer.Option(
+        False, "--no-cache", help="Do not read or write the response cache"
+    ),
+    refresh: bool = typer.Option(
+        False, "--refresh", help="Ignore cached responses and store fresh ones"
+    ),
+    metrics_out: Optional[str] = typer.Option(
+        None,
+        "--metrics-out",
+        help="Write call metrics to a file (.json, else Prometheus text format)",
+    ),
 ) -> None:
     """Generate documentation for a single Python file."""
-    generate_docs(file_path, output, style)
+    configure_cache(enabled=not no_cache, refresh=refresh)
+    configure_metrics("docgen file", metrics_out)
+    generate_docs(
+        file_path,
+        output,
+        style,
+        stream=stream,
+        chunk_tokens=chunk_tokens,
+        reduce_fanin=reduce_fanin,
+    )
 
 
 @app.command()
@@ -66,9 +299,133 @@ def dir(
     style: str = typer.Option(
         "numpy", "--style", "-s", help="Docstring style (numpy, google, or rest)"
     ),
+    jobs: int = typer.Option(
+        DEFAULT_CONCURRENCY, "--jobs", "-j", help="Number of concurrent requests"
+    ),
+    pack: bool = typer.Option(
+        False, "--pack", help="Document symbols of several files per request"
+    ),
+    full: bool = typer.Option(
+        False, "--full", help="Regenerate all documentation, ignoring the manifest"
+    ),
+    resume: bool = typer.Option(
+        False,
+        "--resume",
+        help="Skip files completed by an interrupted run, replaying its journal",
+    ),
+    chunk_tokens: int = typer.Option(
+        CHUNK_TOKENS,
+        "--chunk-tokens",
+        help="Document modules larger than this many tokens in chunks (0: never)",
+    ),
+    reduce_fanin: int = typer.Option(
+        REDUCE_FANIN,
+        "--reduce-fanin",
+        help="Chunk documents combined by each overview (reduce) request",
+    ),
+    no_cache: bool = typer.Option(
+        False, "--no-cache", help="Do not read or write the response cache"
+    ),
+    refresh: bool = typer.Option(
+        False, "--refresh", help="Ignore cached responses and store fresh ones"
+    ),
+    metrics_out: Optional[str] = typer.Option(
+        None,
+        "--metrics-out",
+        help="Write call metrics to a file (.json, else Prometheus text format)",
+    ),
 ) -> None:
     """Generate documentation for all Python files in a directory."""
-    generate_docs(directory, output, style)
+    configure_cache(enabled=not no_cache, refresh=refresh)
+    configure_metrics("docgen dir", metrics_out)
+    generate_docs(
+        directory,
+        output,
+        style,
+        jobs,
+        pack=pack,
+        full=full,
+        chunk_tokens=chunk_tokens,
+        reduce_fanin=reduce_fanin,
+        resume=resume,
+    )
+
+
+@app.command()
+def apply(
+    path: str = typer.Argument(..., help="Python file or directory to update"),
+    style: str = typer.Option(
+        "numpy", "--style", "-s", help="Docstring style (numpy, google, or rest)"
+    ),
+    jobs: int = typer.Option(
+        DEFAULT_CONCURRENCY, "--jobs", "-j", help="Number of concurrent requests"
+    ),
+    dry_run: bool = typer.Option(
+        False, "--dry-run", help="Print a diff instead of modifying the files"
+    ),
+    no_cache: bool = typer.Option(
+        False, "--no-cache", help="Do not read or write the response cache"
+    ),
+    refresh: bool = typer.Option(
+        False, "--refresh", help="Ignore cached responses and store fresh ones"
+    ),
+    metrics_out: Optional[str] = typer.Option(
+        None,
+        "--metrics-out",
+        help="Write call metrics to a file (.json, else Prometheus text format)",
+    ),
+) -> None:
+    """Insert missing docstrings into Python source files.
+
+    Every function, method and class without a docstring is documented with
+    one request per file, and the docstrings are inserted without changing
+    any other line.
+    """
+    if not os.path.exists(path):
+        console.print(f"[red]Error: {path} is not a valid file or directory")
+        raise typer.Exit(1)
+    configure_cache(enabled=not no_cache, refresh=refresh)
+    configure_metrics("docgen apply", metrics_out)
+
+    errors = 0
+    for result in apply_docstrings(path, style, jobs):
+        file_path = result["file"]
+        if "error" in result:
+            console.print(f"[red]{result['error']}")
+            errors += 1
+            continue
+        if result["inserted"]:
+            if dry_run:
+                console.out(
+                    "".join(
+                        difflib.unified_diff(
+                            result["original_code"].splitlines(keepends=True),
+                            result["code"].splitlines(keepends=True),
+                            file_path,
+                            file_path,
+                        )
+                    ),
+                    highlight=False,
+                )
+            else:
+                write_atomic(file_path, result["code"])
+            console.print(
+                f"[green]Docstrings added to {file_path}: {len(result['inserted'])}"
+            )
+        for qualname in result["unanswered"]:
+            console.print(f"[yellow]{file_path}: no docstring returned for {qualname}")
+        for qualname in result["skipped"]:
+            console.print(
+                f"[yellow]{file_path}: skipped {qualname} (body on the definition line)"
+            )
+
+    for line in usage_summary():
+        console.print(f"[blue]{line}", highlight=False, soft_wrap=True)
+    metrics_path = write_metrics()
+    if metrics_path:
+        console.print(f"[blue]Metrics written to: {metrics_path}")
+    if errors:
+        raise typer.Exit(1)
 
 
 if __name__ == "__main__":
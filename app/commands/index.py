@@ -0,0 +1,211 @@
+# app/commands/index.py
+import json
+import os
+from datetime import datetime
+from typing import List, Optional
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from app.agents.metrics_index import (
+    FUNCTION_METRICS,
+    INDEX_PATH,
+    health_report,
+    index_tree,
+    open_index,
+    parse_since,
+    query_functions,
+    run_sql,
+)
+
+app = typer.Typer(help="Index code metrics of repositories in a SQLite database")
+console = Console()
+
+
+def since_timestamp(since: Optional[str]) -> Optional[float]:
+    """Parse the --since option, exiting with an error if it is invalid."""
+    if since is None:
+        return None
+    try:
+        return parse_since(since)
+    except ValueError:
+        console.print(
+            f"[red]Error: invalid --since '{since}' (use e.g. 30d or 2024-05-01)"
+        )
+        raise typer.Exit(1)
+
+
+@app.command()
+def update(
+    paths: List[str] = typer.Argument(..., help="Repository roots to index"),
+    db: str = typer.Option(INDEX_PATH, "--db", help="Index database file"),
+    full: bool = typer.Option(
+        False, "--full", help="Re-analyze every file, ignoring stored hashes"
+    ),
+) -> None:
+    """Index or incrementally update the code metrics of repositories.
+
+    Only files whose modification time or size changed are read, and only
+    those whose content hash changed are analyzed again.
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            console.print(f"[red]Error: {path} is not a valid directory")
+            raise typer.Exit(1)
+    try:
+        conn = open_index(db)
+    except ValueError as e:
+        console.print(f"[red]Error: {e}")
+        raise typer.Exit(1) from e
+    try:
+        for path in paths:
+            stats = index_tree(conn, path, full)
+            console.print(
+                f"[green]Indexed {stats.repo}: {stats.files} files "
+                f"({stats.analyzed} analyzed, {stats.unchanged} unchanged, "
+                f"{stats.removed} removed, {stats.errors} errors) "
+                f"in {stats.seconds:.2f}s"
+            )
+    finally:
+        conn.close()
+    console.print(f"[blue]Index: {db}")
+
+
+@app.command()
+def query(
+    db: str = typer.Option(INDEX_PATH, "--db", help="Index database file"),
+    order_by: str = typer.Option(
+        "complexity",
+        "--order-by",
+        "-s",
+        help=f"Metric to rank functions by ({', '.join(FUNCTION_METRICS)})",
+    ),
+    limit: int = typer.Option(50, "--limit", "-n", help="Number of functions"),
+    repo: Optional[str] = typer.Option(
+        None, "--repo", help="Only functions of this repository root"
+    ),
+    since: Optional[str] = typer.Option(
+        None, "--since", help="Only functions changed since (e.g. 30d or 2024-05-01)"
+    ),
+    sql: Optional[str] = typer.Option(
+        None, "--sql", help="Run a read-only SQL query on the index instead"
+    ),
+    json_output: bool = typer.Option(False, "--json", help="Print JSON"),
+) -> None:
+    """List the top functions by a metric, or run an ad hoc SQL query."""
+    if not os.path.isfile(db):
+        console.print(f"[red]Error: index {db} does not exist; run 'index update'")
+        raise typer.Exit(1)
+    try:
+        if sql is not None:
+            columns, rows = run_sql(db, sql)
+            records = [dict(zip(columns, row)) for row in rows]
+        else:
+            conn = open_index(db)
+            try:
+                records = [
+                    dict(row)
+                    for row in query_functions(
+                        conn, order_by, limit, repo, since_timestamp(since)
+                    )
+                ]
+            finally:
+                conn.close()
+    except typer.Exit:
+        raise
+    except Exception as e:
+        console.print(f"[red]Error querying index: {e}")
+        raise typer.Exit(1) from e
+
+    if json_output:
+        console.out(json.dumps(records, indent=2), highlight=False)
+        return
+    table = Table()
+    if sql is not None:
+        for column in columns:
+            table.add_column(column)
+        for row in rows:
+            table.add_row(*(str(value) for value in row))
+    else:
+        table.add_column("function")
+        for metric in FUNCTION_METRICS:
+            table.add_column(metric, justify="right")
+        table.add_column("changed")
+        for record in records:
+            location = os.path.join(
+                os.path.basename(record["repo"]), record["path"]
+            )
+            changed = datetime.fromtimestamp(record["changed_at"])
+            table.add_row(
+                f"{location}:{record['lineno']} {record['qualname']}",
+                *(str(record[metric]) for metric in FUNCTION_METRICS),
+                changed.strftime("%Y-%m-%d"),
+            )
+    console.print(table)
+
+
+@app.command()
+def report(
+    db: str = typer.Option(INDEX_PATH, "--db", help="Index database file"),
+    repo: Optional[str] = typer.Option(
+        None, "--repo", help="Only functions of this repository root"
+    ),
+    since: Optional[str] = typer.Option(
+        None, "--since", help="Only functions changed since (e.g. 30d or 2024-05-01)"
+    ),
+    outliers: int = typer.Option(
+        5, "--outliers", "-n", help="Outliers listed per metric"
+    ),
+    json_output: bool = typer.Option(False, "--json", help="Print JSON"),
+) -> None:
+    """Report metric distributions (percentiles, outliers) of the index."""
+    if not os.path.isfile(db):
+        console.print(f"[red]Error: index {db} does not exist; run 'index update'")
+        raise typer.Exit(1)
+    since_value = since_timestamp(since)
+    try:
+        conn = open_index(db)
+    except ValueError as e:
+        console.print(f"[red]Error: {e}")
+        raise typer.Exit(1) from e
+    try:
+        health = health_report(conn, repo, since_value, outliers)
+    finally:
+        conn.close()
+
+    if json_output:
+        console.out(json.dumps(health, indent=2), highlight=False)
+        return
+    totals = health["totals"]
+    console.print(
+        f"Files: {totals['files']}, lines: {totals['lines']}, "
+        f"functions: {totals['functions']}, issues: {totals['issues']} "
+        f"({totals['issues_per_kloc']} per 1000 lines)"
+    )
+    if not health["metrics"]:
+        return
+
+    table = Table(title="Function metrics")
+    columns = ["mean", "std", "p50", "p90", "p95", "p99", "max", "fence", "outliers"]
+    table.add_column("metric")
+    for column in columns:
+        table.add_column(column, justify="right")
+    for metric, stats in health["metrics"].items():
+        table.add_row(metric, *(f"{stats[column]:g}" for column in columns))
+    console.print(table)
+
+    for metric, functions in health["outliers"].items():
+        if not functions:
+            continue
+        console.print(f"\n[bold]Top {metric} outliers[/bold]")
+        for function in functions:
+            console.print(
+                f"  {function['value']:>5}  {function['path']}:{function['lineno']} "
+                f"{function['qualname']}",
+                highlight=False,
+            )
+
+
+if __name__ == "__main__":
+    app()
@@ -1,15 +1,48 @@
 # app/commands/refactor.py
+import itertools
 import json
 import os
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Any, Dict, List, Optional, Set, TextIO, Tuple
 
 import typer
 
-from app.agents.refactor_agent import refactor_file
+from app.agents.checkpoint import CheckpointJournal, file_digest
+from app.agents.refactor_agent import (
+    FILE_SCOPE,
+    PATCH_OUTPUT,
+    REFACTOR_MODE,
+    REFACTOR_OUTPUT,
+    REFACTOR_SCOPE,
+    SINGLE_PASS,
+    TWO_PASS,
+    refactor_file,
+)
+from app.agents.refactor_budget import RefactorBudget, refactor_prioritized
+from app.llm.gemini import (
+    DEFAULT_CONCURRENCY,
+    coalesced_calls,
+    configure_cache,
+    configure_metrics,
+    metrics_summary,
+    retry_stats,
+    routing_summary,
+    usage_summary,
+    write_metrics,
+)
 
 app = typer.Typer(help="Refactor Python code to improve quality and maintainability")
 
+# Checkpoint journal of refactor dir, kept in the output directory
+JOURNAL_NAME = ".codexagent-refactor.journal"
+
+# Section titles for streamed model responses, by refactor_file stage
+STREAM_TITLES = {
+    "suggestions": "Suggestions",
+    "refactoring": "Refactored code",
+    "combined": "Suggestions and refactored code",
+}
+
 
 def get_output_path(file_path: str, output_dir: Optional[str], suffix: str = "") -> str:
     """Generate output path for refactored file."""
@@ -37,6 +70,7 @@ def get_output_path(file_path: str, output_dir: Optional[str], suffix: str = "")
 def save_report(report: Dict, output_dir: str) -> str:
     """Save refactoring report to a JSON file."""
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    os.makedirs(output_dir, exist_ok=True)
     report_path = os.path.join(output_dir, f"refactor_report_{timestamp}.json")
 
     with open(report_path, "w", encoding="utf-8") as f:
@@ -45,6 +79,157 @@ def save_report(report: Dict, output_dir: str) -> str:
     return report_path
 
 
+def open_report(output_dir: str) -> Tuple[str, TextIO]:
+    """Create a JSON Lines report file for a directory run.
+
+    Returns:
+        Tuple of the report path and the file, opened for appending
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    os.makedirs(output_dir, exist_ok=True)
+    report_path = os.path.join(output_dir, f"refactor_report_{timestamp}.jsonl")
+    return report_path, open(report_path, "a", encoding="utf-8")
+
+
+def write_report_line(report: TextIO, record: Dict[str, Any]) -> None:
+    """Append one record to a JSON Lines report and flush it to disk."""
+    report.write(json.dumps(record) + "\n")
+    report.flush()
+
+
+class RunTotals:
+    """Totals of a directory run, accumulated one result at a time."""
+
+    def __init__(self) -> None:
+        self.files = 0
+        self.resumed = 0
+        self.errors = 0
+        self.issues_by_severity: Dict[str, int] = {}
+        self.skipped: List[Dict[str, Any]] = []
+        self.skipped_functions: List[Dict[str, Any]] = []
+        self.output = {"fell_back": 0, "response_tokens": 0, "saved": 0}
+        self.sums: Dict[str, Dict[str, float]] = {
+            part: {"requests": 0, "prompt_tokens": 0, "latency_seconds": 0.0}
+            for part in ("cost", "savings")
+        }
+
+    def add(self, result: Dict[str, Any]) -> None:
+        """Count one file's result, or a file skipped for budget reasons."""
+        if result.get("skipped"):
+            self.skipped.append(
+                {key: result[key] for key in ("file", "skipped", "priority")}
+            )
+        else:
+            self.files += 1
+        if result.get("resumed"):
+            self.resumed += 1
+        if result.get("skipped_functions"):
+            self.skipped_functions.append(
+                {"file": result["file"], "functions": result["skipped_functions"]}
+            )
+        if result.get("error"):
+            self.errors += 1
+        for issue in result["issue_records"]:
+            severity = issue["severity"]
+            self.issues_by_severity[severity] = (
+                self.issues_by_severity.get(severity, 0) + 1
+            )
+        for part, sums in self.sums.items():
+            for key in sums:
+                sums[key] += result.get(part, {}).get(key, 0)
+        if result.get("output"):
+            for key in self.output:
+                self.output[key] += result["output"][key]
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return the totals for the summary and the report."""
+        return {
+            "files_processed": self.files,
+            "files_resumed": self.resumed,
+            "errors": self.errors,
+            "total_issues": sum(self.issues_by_severity.values()),
+            "issues_by_severity": dict(self.issues_by_severity),
+            "skipped": self.skipped,
+            "skipped_functions": self.skipped_functions,
+            "patch_output": dict(self.output),
+            **{
+                part: {key: round(value, 3) for key, value in sums.items()}
+                for part, sums in self.sums.items()
+            },
+        }
+
+
+def journal_complete(result: Dict[str, Any]) -> bool:
+    """Return True if a result is final and can be replayed on resume.
+
+    Errors, skipped files and partially refactored files are not journaled,
+    so a resumed run tries them again.
+    """
+    return not (
+        result.get("resumed")
+        or result.get("error")
+        or result.get("skipped")
+        or result.get("skipped_functions")
+    )
+
+
+def echo_report_header(file_path: str) -> None:
+    """Print the banner opening a single-file refactoring report."""
+    typer.echo(f"\n{'=' * 80}")
+    typer.echo(f"Refactoring report for: {file_path}")
+    typer.echo(f"{'=' * 80}")
+
+
+def format_cost(result: Dict) -> str:
+    """Describe the requests a file took and, in single-pass mode, what it saved."""
+    cost = result["cost"]
+    line = (
+        f"Cost ({cost['mode']}): requests {cost['requests']}, "
+        f"prompt tokens ~{cost['prompt_tokens']}, "
+        f"latency {cost['latency_seconds']:.2f}s"
+    )
+    savings = result.get("savings")
+    if savings:
+        line += (
+            f"; saved vs two-pass: requests {savings['requests']}, "
+            f"prompt tokens ~{savings['prompt_tokens']}, "
+            f"latency ~{savings['latency_seconds']:.2f}s"
+        )
+    output = result.get("output")
+    if output:
+        line += (
+            f"; patch output: response tokens ~{output['response_tokens']}, "
+            f"saved ~{output['saved']} vs full code"
+        )
+        if output["fell_back"]:
+            line += f" ({output['fell_back']} pieces fell back to full code)"
+    return line
+
+
+def refactor_mode(two_pass: bool) -> str:
+    """Return the refactoring mode selected by the --two-pass flag."""
+    return TWO_PASS if two_pass else REFACTOR_MODE
+
+
+def refactor_scope(whole_file: bool) -> str:
+    """Return the refactoring scope selected by the --whole-file flag."""
+    return FILE_SCOPE if whole_file else REFACTOR_SCOPE
+
+
+def refactor_output(patch: bool) -> str:
+    """Return the refactored code output selected by the --patch flag."""
+    return PATCH_OUTPUT if patch else REFACTOR_OUTPUT
+
+
+def echo_usage_summary() -> None:
+    """Print cache, retry and call metrics for the run and write the metrics file."""
+    for line in usage_summary():
+        typer.echo(line)
+    metrics_path = write_metrics()
+    if metrics_path:
+        typer.echo(f"Metrics written to: {metrics_path}")
+
+
 @app.command()
 def file(
     file_path: str = typer.Argument(..., help="Path to the Python file to refactor"),
@@ -52,22 +237,87 @@ def file(
         None, "--output-dir", "-o", help="Directory to save refactored files"
     ),
     apply: bool = typer.Option(False, "--apply", help="Apply the refactoring changes"),
+    stream: bool = typer.Option(
+        False, "--stream", help="Print model responses as they are generated"
+    ),
+    patch: bool = typer.Option(
+        False,
+        "--patch",
+        help="Ask for search/replace edits instead of the full refactored code",
+    ),
+    two_pass: bool = typer.Option(
+        False,
+        "--two-pass",
+        help="Request suggestions and refactored code separately (two requests)",
+    ),
+    whole_file: bool = typer.Option(
+        False,
+        "--whole-file",
+        help="Send whole files instead of only the flagged functions",
+    ),
+    no_cache: bool = typer.Option(
+        False, "--no-cache", help="Do not read or write the response cache"
+    ),
+    refresh: bool = typer.Option(
+        False, "--refresh", help="Ignore cached responses and store fresh ones"
+    ),
+    metrics_out: Optional[str] = typer.Option(
+        None,
+        "--metrics-out",
+        help="Write call metrics to a file (.json, else Prometheus text format)",
+    ),
 ) -> None:
     """Refactor a single Python file."""
+    configure_cache(enabled=not no_cache, refresh=refresh)
+    configure_metrics("refactor file", metrics_out)
     if not os.path.isfile(file_path):
         typer.echo(f"Error: File '{file_path}' does not exist.", err=True)
         raise typer.Exit(1)
+    if stream and patch:
+        # Edits are applied once the whole response is in, so they cannot be
+        # streamed
+        typer.echo("Error: --patch cannot be combined with --stream.", err=True)
+        raise typer.Exit(1)
 
     output_path = None
     if apply and output_dir:
         output_path = get_output_path(file_path, output_dir)
 
-    result = refactor_file(file_path, output_path)
-
-    # Display results
-    typer.echo(f"\n{'=' * 80}")
-    typer.echo(f"Refactoring report for: {file_path}")
-    typer.echo(f"{'=' * 80}")
+    streamed: Set[str] = set()
+
+    def echo_chunk(stage: str, chunk: str) -> None:
+        # Refactored code is only shown when it is not saved to a file
+        if stage == "refactoring" and (not apply or output_path):
+            return
+        if stage not in streamed:
+            if streamed:
+                typer.echo()
+            streamed.add(stage)
+            typer.echo(f"\n{STREAM_TITLES[stage]}:")
+            typer.echo("-" * 40)
+        typer.echo(chunk, nl=False)
+
+    if stream:
+        echo_report_header(file_path)
+        result = refactor_file(
+            file_path,
+            output_path,
+            on_chunk=echo_chunk,
+            mode=refactor_mode(two_pass),
+            scope=refactor_scope(whole_file),
+        )
+        if streamed:
+            typer.echo()
+    else:
+        result = refactor_file(
+            file_path,
+            output_path,
+            mode=refactor_mode(two_pass),
+            scope=refactor_scope(whole_file),
+            output=refactor_output(patch),
+        )
+        # Display results
+        echo_report_header(file_path)
 
     if result.get("error"):
         typer.echo(f"Error: {result['error']}", err=True)
@@ -78,25 +328,39 @@ def file(
         typer.echo("-" * 40)
         typer.echo(result["issues"])
 
-        typer.echo("\nSuggestions:")
-        typer.echo("-" * 40)
-        typer.echo(result["suggestions"])
+        if "suggestions" not in streamed and "combined" not in streamed:
+            typer.echo("\nSuggestions:")
+            typer.echo("-" * 40)
+            typer.echo(result["suggestions"])
 
         if apply:
             if output_path:
                 typer.echo(f"\nRefactored code saved to: {output_path}")
-            else:
+            elif "refactoring" not in streamed and "combined" not in streamed:
                 typer.echo("\nRefactored code (not saved, use --apply to save):")
                 typer.echo("-" * 40)
                 typer.echo(result["refactored_code"])
     else:
         typer.echo("\nNo significant issues found. The code looks good!")
 
+    if result.get("functions"):
+        typer.echo(f"\nRefactored functions: {', '.join(result['functions'])}")
+    if result["issues"]:
+        typer.echo(f"\n{format_cost(result)}")
+
+    for stage, timing in result.get("timings", {}).items():
+        typer.echo(
+            f"{STREAM_TITLES[stage]}: time to first token "
+            f"{timing['time_to_first_token']:.2f}s, total {timing['total_time']:.2f}s"
+        )
+
     # Save detailed report if output directory is specified
     if output_dir:
         report_path = save_report(result, output_dir)
         typer.echo(f"\nDetailed report saved to: {report_path}")
 
+    echo_usage_summary()
+
 
 @app.command()
 def dir(
@@ -113,11 +377,72 @@ def dir(
         "-r/",
         help="Search for Python files recursively",
     ),
+    jobs: int = typer.Option(
+        DEFAULT_CONCURRENCY, "--jobs", "-j", help="Number of concurrent requests"
+    ),
+    two_pass: bool = typer.Option(
+        False,
+        "--two-pass",
+        help="Request suggestions and refactored code separately (two requests)",
+    ),
+    whole_file: bool = typer.Option(
+        False,
+        "--whole-file",
+        help="Send whole files instead of only the flagged functions",
+    ),
+    max_calls: Optional[int] = typer.Option(
+        None, "--max-calls", help="Stop starting files after this many model requests"
+    ),
+    max_tokens: Optional[int] = typer.Option(
+        None,
+        "--max-tokens",
+        help="Stop starting files after this many prompt and response tokens",
+    ),
+    time_budget: Optional[float] = typer.Option(
+        None, "--time-budget", help="Stop starting files after this many seconds"
+    ),
+    patch: bool = typer.Option(
+        False,
+        "--patch",
+        help="Ask for search/replace edits instead of the full refactored code",
+    ),
+    resume: bool = typer.Option(
+        False,
+        "--resume",
+        help="Skip files completed by an earlier run and replay their results",
+    ),
+    no_cache: bool = typer.Option(
+        False, "--no-cache", help="Do not read or write the response cache"
+    ),
+    refresh: bool = typer.Option(
+        False, "--refresh", help="Ignore cached responses and store fresh ones"
+    ),
+    metrics_out: Optional[str] = typer.Option(
+        None,
+        "--metrics-out",
+        help="Write call metrics to a file (.json, else Prometheus text format)",
+    ),
 ) -> None:
-    """Refactor all Python files in a directory."""
+    """Refactor all Python files in a directory.
+
+    Files are processed by a pool of ``--jobs`` concurrent requests and each
+    result is appended to a JSON Lines report as soon as it completes. Files
+    are ranked by the severity, number and size of their issues and taken
+    highest-value first; with a budget, files (or functions) that no longer
+    fit are skipped and listed in the report.
+
+    With ``--output-dir`` every completed file is recorded in a checkpoint
+    journal keyed by its path and content hash; ``--resume`` skips files
+    whose content is unchanged since and replays their recorded results.
+    """
+    configure_cache(enabled=not no_cache, refresh=refresh)
+    configure_metrics("refactor dir", metrics_out)
     if not os.path.isdir(directory):
         typer.echo(f"Error: Directory '{directory}' does not exist.", err=True)
         raise typer.Exit(1)
+    if resume and not output_dir:
+        typer.echo("Error: --resume needs the --output-dir of the run.", err=True)
+        raise typer.Exit(1)
 
     # Find all Python files
     python_files = []
@@ -137,50 +462,150 @@ def dir(
         typer.echo("No Python files found in the specified directory.")
         return
 
-    # Process each file
-    all_results = []
-    for i, file_path in enumerate(python_files, 1):
-        typer.echo(f"\n[{i}/{len(python_files)}] Processing: {file_path}")
-
-        output_path = None
-        if apply and output_dir:
-            output_path = get_output_path(file_path, output_dir)
-
-        result = refactor_file(file_path, output_path)
-        all_results.append(result)
-
-        if result.get("error"):
-            typer.echo(f"  Error: {result['error']}", err=True)
-        else:
-            issue_count = len(result["issues"].split("\n")) if result["issues"] else 0
-            typer.echo(f"  Found {issue_count} potential issues")
-
+    output_paths = {
+        file_path: get_output_path(file_path, output_dir) if apply else None
+        for file_path in python_files
+    }
+    mode = refactor_mode(two_pass)
+    scope = refactor_scope(whole_file)
+    output = refactor_output(patch)
+    journal = None
+    replayed: List[Dict[str, Any]] = []
+    digests: Dict[str, Optional[str]] = {}
+    if output_dir:
+        journal = CheckpointJournal(
+            os.path.join(output_dir, JOURNAL_NAME),
+            {"mode": mode, "scope": scope, "output": output, "apply": apply},
+            resume,
+        )
+        if resume and not journal.resumed:
+            typer.echo("No journal of a run with these options; starting afresh.")
+        for file_path in python_files:
+            digests[file_path] = file_digest(file_path)
+            result = journal.lookup(os.path.abspath(file_path), digests[file_path])
+            if result is not None:
+                replayed.append({**result, "resumed": True})
+                output_paths.pop(file_path)
+        if replayed:
+            typer.echo(f"Resuming: {len(replayed)} files already completed.")
+    if jobs > 1:
+        typer.echo(
+            f"Processing {len(python_files)} files with {jobs} concurrent jobs..."
+        )
+
+    totals = RunTotals()
+    report = open_report(output_dir) if output_dir else None
+    try:
+        budget = RefactorBudget(max_calls, max_tokens, time_budget)
+        results = itertools.chain(
+            replayed,
+            refactor_prioritized(
+                output_paths.items(), jobs, mode, scope, budget, output
+            ),
+        )
+        for i, result in enumerate(results, 1):
+            file_path = result["file"]
+            output_path = output_paths.get(file_path)
+            totals.add(result)
+            if journal is not None and journal_complete(result):
+                journal.record(os.path.abspath(file_path), digests[file_path], result)
+            if result.get("skipped"):
+                typer.echo(
+                    f"\n[{i}/{len(python_files)}] Skipped: {file_path} "
+                    f"({result['skipped']}, priority {result['priority']})"
+                )
+                if report is not None:
+                    write_report_line(report[1], {"type": "skipped", **result})
+                continue
+            action = "Resumed" if result.get("resumed") else "Processed"
+            typer.echo(f"\n[{i}/{len(python_files)}] {action}: {file_path}")
+            if report is not None:
+                write_report_line(report[1], {"type": "result", **result})
+
+            if result.get("error"):
+                typer.echo(f"  Error: {result['error']}", err=True)
+                continue
+            typer.echo(f"  Found {len(result['issue_records'])} potential issues")
+            if result.get("functions"):
+                typer.echo(f"  Refactored functions: {', '.join(result['functions'])}")
+            if result.get("skipped_functions"):
+                typer.echo(
+                    "  Skipped for budget: "
+                    f"{', '.join(result['skipped_functions'])}"
+                )
+            if result["issue_records"]:
+                typer.echo(f"  {format_cost(result)}")
             if apply and output_path:
                 typer.echo(f"  Refactored code saved to: {output_path}")
 
-    # Generate summary report
-    total_issues = sum(
-        len(result["issues"].split("\n"))
-        for result in all_results
-        if result.get("issues")
-    )
-
-    typer.echo("\n" + "=" * 80)
-    typer.echo(f"Refactoring complete! Processed {len(python_files)} files.")
-    typer.echo(f"Total issues found: {total_issues}")
-
-    # Save detailed report if output directory is specified
-    if output_dir:
-        report = {
-            "timestamp": datetime.now().isoformat(),
-            "directory": directory,
-            "files_processed": len(python_files),
-            "total_issues": total_issues,
-            "results": all_results,
-        }
-
-        report_path = save_report(report, output_dir)
-        typer.echo(f"\nDetailed report saved to: {report_path}")
+        summary = totals.as_dict()
+        typer.echo("\n" + "=" * 80)
+        typer.echo(
+            f"Refactoring complete! Processed {summary['files_processed']} files"
+            + (
+                f" ({summary['files_resumed']} resumed from the journal)."
+                if summary["files_resumed"]
+                else "."
+            )
+        )
+        by_severity = ", ".join(
+            f"{count} {severity}"
+            for severity, count in sorted(summary["issues_by_severity"].items())
+        )
+        typer.echo(
+            f"Total issues found: {summary['total_issues']}"
+            + (f" ({by_severity})" if by_severity else "")
+        )
+        if summary["errors"]:
+            typer.echo(f"Files with errors: {summary['errors']}")
+        if summary["skipped"] or summary["skipped_functions"]:
+            typer.echo(
+                f"Skipped for budget: {len(summary['skipped'])} files, "
+                f"{sum(len(s['functions']) for s in summary['skipped_functions'])} "
+                "functions of partially refactored files"
+            )
+        typer.echo(
+            f"Model requests: {summary['cost']['requests']}, "
+            f"prompt tokens ~{summary['cost']['prompt_tokens']}"
+        )
+        if mode == SINGLE_PASS:
+            savings = summary["savings"]
+            typer.echo(
+                f"Saved vs two-pass: requests {savings['requests']}, "
+                f"prompt tokens ~{savings['prompt_tokens']}, "
+                f"latency ~{savings['latency_seconds']:.2f}s"
+            )
+        if output == PATCH_OUTPUT:
+            patched = summary["patch_output"]
+            typer.echo(
+                f"Patch output: response tokens ~{patched['response_tokens']}, "
+                f"saved ~{patched['saved']} vs full code, "
+                f"{patched['fell_back']} pieces fell back to full code"
+            )
+
+        if report is not None:
+            write_report_line(
+                report[1],
+                {
+                    "type": "summary",
+                    "timestamp": datetime.now().isoformat(),
+                    "directory": directory,
+                    "mode": mode,
+                    **summary,
+                    "retries": retry_stats(),
+                    "coalesced_calls": coalesced_calls(),
+                    "metrics": metrics_summary(),
+                    "routing": routing_summary(),
+                },
+            )
+            typer.echo(f"\nDetailed report saved to: {report[0]}")
+    finally:
+        if report is not None:
+            report[1].close()
+        if journal is not None:
+            journal.close()
+
+    echo_usage_summary()
 
 
 if __name__ == "__main__":
@@ -1,10 +1,16 @@
 # app/commands/summarize.py
 import os
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 import typer
 
 from app.agents.summarize_agent import summarize_code
+from app.llm.gemini import (
+    configure_cache,
+    configure_metrics,
+    usage_summary,
+    write_metrics,
+)
 
 app = typer.Typer()
 
@@ -49,10 +55,34 @@ def summarize_repo(path: str) -> str:
 
 
 @app.command()
-def run(path: str = typer.Argument(..., help="Path to the repo")) -> None:
+def run(
+    path: str = typer.Argument(..., help="Path to the repo"),
+    no_cache: bool = typer.Option(
+        False, "--no-cache", help="Do not read or write the response cache"
+    ),
+    refresh: bool = typer.Option(
+        False, "--refresh", help="Ignore cached responses and store fresh ones"
+    ),
+    metrics_out: Optional[str] = typer.Option(
+        None,
+        "--metrics-out",
+        help="Write call metrics to a file (.json, else Prometheus text format)",
+    ),
+) -> None:
     """Summarize the given code repository.
     
     Args:
         path: Path to the repository to summarize
+        no_cache: Do not read or write the response cache
+        refresh: Ignore cached responses and store fresh ones
+        metrics_out: File to write call metrics to
     """
+    configure_cache(enabled=not no_cache, refresh=refresh)
+    configure_metrics("summarize", metrics_out)
     typer.echo(summarize_repo(path))
+
+    for line in usage_summary():
+        typer.echo(line, err=True)
+    metrics_path = write_metrics()
+    if metrics_path:
+        typer.echo(f"Metrics written to: {metrics_path}", err=True)
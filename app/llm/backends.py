@@ -0,0 +1,339 @@
+# app/llm/backends.py
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Protocol, Tuple
+
+from app.llm.tokens import get_budget
+
+BACKENDS = ("gemini", "replay", "synthetic")
+
+# (prompt tokens, response tokens) of the last response in the current thread
+# or task, for backends that report usage metadata
+last_usage: ContextVar[Optional[Tuple[int, int]]] = ContextVar(
+    "last_usage", default=None
+)
+
+
+class LLMBackend(Protocol):
+    """Interface every model backend implements.
+
+    ``model`` is the model a request was routed to; offline backends keep
+    the routed name so routing, budgets and per-model metrics behave as
+    with the real API. ``name`` and ``model`` are both part of the response
+    cache key, so responses from different backends never mix.
+    """
+
+    name: str
+    model: str
+
+    def generate(self, prompt: str) -> str:
+        """Return the response text for ``prompt``."""
+        ...
+
+    async def generate_async(self, prompt: str) -> str:
+        """Return the response text for ``prompt`` without blocking the loop."""
+        ...
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """Yield the response text for ``prompt`` in chunks as they arrive."""
+        ...
+
+
+def _extract_text(response: Any) -> str:
+    """Return the text of a Gemini response."""
+    # Handle different response types
+    if hasattr(response, 'text') and callable(response.text):
+        return str(response.text()).strip()
+    elif hasattr(response, 'text') and response.text is not None:
+        return str(response.text).strip()
+    else:
+        return str(response).strip()
+
+
+def _record_usage(response: Any) -> None:
+    """Store the token counts of a Gemini response in :data:`last_usage`."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        last_usage.set(
+            (
+                int(getattr(usage, "prompt_token_count", 0) or 0),
+                int(getattr(usage, "candidates_token_count", 0) or 0),
+            )
+        )
+
+
+def prompt_digest(prompt: str) -> str:
+    """Return the SHA-256 hex digest identifying a prompt in a cassette."""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+class GeminiBackend:
+    """Backend calling the Google Gemini API.
+
+    The SDK is imported and configured on the first request so that
+    creating the backend needs neither the SDK nor an API key.
+    """
+
+    name = "gemini"
+
+    def __init__(
+        self, model: str, generation_config: Optional[Dict[str, Any]] = None
+    ) -> None:
+        self.model = model
+        # Responses never exceed the model's output budget
+        self.generation_config = dict(
+            generation_config or {}, max_output_tokens=get_budget(model).output_tokens
+        )
+        self._client: Any = None
+
+    @property
+    def client(self) -> Any:
+        """Return the ``GenerativeModel``, configuring the SDK on first use.
+
+        Raises:
+            EnvironmentError: If ``GEMINI_API_KEY`` is not set
+        """
+        if self._client is None:
+            api_key = os.getenv("GEMINI_API_KEY")
+            if not api_key:
+                raise EnvironmentError("GEMINI_API_KEY is not set in the environment")
+
+            import google.generativeai as genai
+
+            genai.configure(api_key=api_key)
+            self._client = genai.GenerativeModel(
+                self.model,
+                generation_config=genai.GenerationConfig(**self.generation_config),
+            )
+        return self._client
+
+    def generate(self, prompt: str) -> str:
+        response = self.client.generate_content(prompt)
+        _record_usage(response)
+        return _extract_text(response)
+
+    async def generate_async(self, prompt: str) -> str:
+        response = await self.client.generate_content_async(prompt)
+        _record_usage(response)
+        return _extract_text(response)
+
+    def count_tokens(self, text: str) -> int:
+        """Count tokens with the model's tokenizer (one API call)."""
+        return int(self.client.count_tokens(text).total_tokens)
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        for chunk in self.client.generate_content(prompt, stream=True):
+            text = getattr(chunk, "text", None)
+            if text:
+                yield text
+
+
+class CassetteMissError(LookupError):
+    """Raised when a replay cassette has no response for a prompt."""
+
+
+class ReplayBackend:
+    """Deterministic backend serving responses from a recorded cassette.
+
+    A cassette is a JSON Lines file with one ``{"prompt_sha256", "response"}``
+    object per line, as written by :class:`RecordingBackend`.
+    """
+
+    name = "replay"
+
+    def __init__(self, path: str, model: str = "replay") -> None:
+        self.path = path
+        self.model = model
+        self._responses: Dict[str, str] = {}
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    self._responses[record["prompt_sha256"]] = record["response"]
+
+    def generate(self, prompt: str) -> str:
+        try:
+            return self._responses[prompt_digest(prompt)]
+        except KeyError:
+            raise CassetteMissError(
+                f"No recorded response in {self.path} for prompt "
+                f"{prompt_digest(prompt)[:12]}"
+            ) from None
+
+    async def generate_async(self, prompt: str) -> str:
+        return self.generate(prompt)
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        yield self.generate(prompt)
+
+
+class RecordingBackend:
+    """Wrap another backend and append every response to a cassette file."""
+
+    def __init__(self, inner: LLMBackend, path: str) -> None:
+        self.inner = inner
+        self.name = inner.name
+        self.model = inner.model
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _record(self, prompt: str, response: str) -> None:
+        line = json.dumps(
+            {"prompt_sha256": prompt_digest(prompt), "response": response}
+        )
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def generate(self, prompt: str) -> str:
+        response = self.inner.generate(prompt)
+        self._record(prompt, response)
+        return response
+
+    async def generate_async(self, prompt: str) -> str:
+        response = await self.inner.generate_async(prompt)
+        self._record(prompt, response)
+        return response
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        chunks: List[str] = []
+        for chunk in self.inner.stream(prompt):
+            chunks.append(chunk)
+            yield chunk
+        self._record(prompt, "".join(chunks).strip())
+
+
+# Section headers of multi-section prompts, e.g. "=== FILE 1: a.py ==="
+_SECTION_HEADER_PATTERN = re.compile(
+    r"^=== (?:FILE|SYMBOL) \d+: .* ===$", re.MULTILINE
+)
+
+
+class SyntheticBackendError(RuntimeError):
+    """Simulated transient API failure raised by :class:`SyntheticBackend`."""
+
+    code = 503
+
+
+class SyntheticBackend:
+    """Offline backend with configurable latency and failure rate.
+
+    Responses are derived from the prompt, so runs are reproducible, and
+    contain a fenced Python block so code-extracting callers keep working.
+    Failures raise :class:`SyntheticBackendError`, which the retry layer
+    treats like an HTTP 503. Section headers of multi-file and multi-symbol
+    prompts are echoed with a section each, so responses can be split back.
+    """
+
+    name = "synthetic"
+
+    def __init__(
+        self,
+        latency: float = 0.5,
+        jitter: float = 0.0,
+        failure_rate: float = 0.0,
+        seed: Optional[int] = None,
+        model: str = "synthetic",
+    ) -> None:
+        self.model = model
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _next_delay(self) -> float:
+        """Draw the simulated latency, raising if this call should fail."""
+        with self._lock:
+            fail = self._random.random() < self.failure_rate
+            delay = self.latency + self._random.uniform(0, self.jitter)
+        if fail:
+            raise SyntheticBackendError("503 Synthetic backend unavailable")
+        return delay
+
+    @staticmethod
+    def _response(prompt: str) -> str:
+        digest = prompt_digest(prompt)[:12]
+        response = (
+            f"Synthetic response {digest} for a {len(prompt)}-character prompt.\n\n"
+            f"```python\n# synthetic output {digest}\n```"
+        )
+        headers = dict.fromkeys(_SECTION_HEADER_PATTERN.findall(prompt))
+        if headers:
+            response += "".join(
+                f"\n\n{header}\nSynthetic section {digest}." for header in headers
+            )
+        return response
+
+    def generate(self, prompt: str) -> str:
+        time.sleep(self._next_delay())
+        return self._response(prompt)
+
+    async def generate_async(self, prompt: str) -> str:
+        import asyncio
+
+        await asyncio.sleep(self._next_delay())
+        return self._response(prompt)
+
+    def stream(self, prompt: str, chunks: int = 4) -> Iterator[str]:
+        # First chunk after a quarter of the latency, the rest spread evenly
+        delay = self._next_delay()
+        time.sleep(delay / 4)
+        words = self._response(prompt).split(" ")
+        size = max(1, -(-len(words) // chunks))
+        for start in range(0, len(words), size):
+            if start:
+                time.sleep(delay * 3 / 4 / (chunks - 1))
+            piece = " ".join(words[start:start + size])
+            yield piece if start + size >= len(words) else piece + " "
+
+
+def create_backend(
+    name: str, model: str, generation_config: Optional[Dict[str, Any]] = None
+) -> LLMBackend:
+    """Create a backend by name, reading its settings from the environment.
+
+    Args:
+        name: One of :data:`BACKENDS`
+        model: Model the requests are routed to
+        generation_config: Generation settings for the ``gemini`` backend
+
+    Returns:
+        The backend, wrapped in a :class:`RecordingBackend` when
+        ``CODEXAGENT_RECORD_CASSETTE`` is set
+
+    Raises:
+        ValueError: If ``name`` is not a known backend
+    """
+    backend: LLMBackend
+    if name == "gemini":
+        backend = GeminiBackend(model, generation_config)
+    elif name == "replay":
+        path = os.getenv("CODEXAGENT_CASSETTE")
+        if not path:
+            raise ValueError("CODEXAGENT_CASSETTE must point to a cassette file")
+        backend = ReplayBackend(path, model)
+    elif name == "synthetic":
+        seed = os.getenv("CODEXAGENT_SYNTHETIC_SEED")
+        backend = SyntheticBackend(
+            latency=float(os.getenv("CODEXAGENT_SYNTHETIC_LATENCY", "0.5")),
+            jitter=float(os.getenv("CODEXAGENT_SYNTHETIC_JITTER", "0.0")),
+            failure_rate=float(os.getenv("CODEXAGENT_SYNTHETIC_FAILURE_RATE", "0.0")),
+            seed=int(seed) if seed is not None else None,
+            model=model,
+        )
+    else:
+        raise ValueError(
+            f"Unknown LLM backend '{name}'. Choose one of: {', '.join(BACKENDS)}"
+        )
+
+    record_path = os.getenv("CODEXAGENT_RECORD_CASSETTE")
+    if record_path:
+        backend = RecordingBackend(backend, record_path)
+    return backend
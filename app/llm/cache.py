@@ -0,0 +1,211 @@
+# app/llm/cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "codexagent")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_AGE = 30 * 24 * 60 * 60
+
+# Expired entries are deleted every this many writes (they are never served)
+EXPIRE_EVERY = 256
+
+# Eviction over max_bytes frees space down to this fraction of it, so the
+# next writes do not trigger it again
+EVICT_TO = 0.9
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    compressed INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+)
+"""
+
+
+def make_cache_key(model: str, settings: Dict[str, Any], prompt: str) -> str:
+    """Build a content-addressed key for a model call.
+
+    Args:
+        model: Name of the model the prompt is sent to
+        settings: Generation settings that affect the response
+        prompt: The prompt text
+
+    Returns:
+        Hex SHA-256 digest identifying the request
+    """
+    payload = json.dumps(
+        {"model": model, "settings": settings, "prompt": prompt},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """On-disk SQLite cache of model responses with LRU eviction.
+
+    The database runs in WAL mode so several CLI processes can share one
+    cache file. Entries older than ``max_age`` seconds are dropped, and the
+    least recently used entries are evicted once the stored payload exceeds
+    ``max_bytes``. Writes keep a running total of the payload size, so
+    eviction only scans the table when the limit is crossed.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_age: float = DEFAULT_MAX_AGE,
+        compress: bool = True,
+    ) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compress = compress
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_accessed ON responses (accessed_at)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_created ON responses (created_at)"
+        )
+        self._conn.commit()
+        self._total = self._size()
+        self._writes = 0
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for ``key``, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, compressed, created_at FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None or (self.max_age and now - row[2] > self.max_age):
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+
+        value, compressed, _ = row
+        if compressed:
+            value = zlib.decompress(value)
+        return bytes(value).decode("utf-8")
+
+    def set(self, key: str, value: str) -> None:
+        """Store ``value`` under ``key`` and evict entries over the limits."""
+        data = value.encode("utf-8")
+        compressed = 0
+        if self.compress:
+            packed = zlib.compress(data)
+            if len(packed) < len(data):
+                data, compressed = packed, 1
+
+        now = time.time()
+        with self._lock:
+            replaced = self._conn.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, value, compressed, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, sqlite3.Binary(data), compressed, len(data), now, now),
+            )
+            self._conn.commit()
+            self._total += len(data) - (replaced[0] if replaced else 0)
+            self._writes += 1
+            due = (self.max_bytes and self._total > self.max_bytes) or (
+                self.max_age and self._writes % EXPIRE_EVERY == 0
+            )
+        if due:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop expired entries, then LRU entries if over ``max_bytes``.
+
+        LRU eviction frees space down to ``EVICT_TO`` of ``max_bytes``. The
+        total is recounted here, as other processes may share the file.
+
+        Returns:
+            Number of entries removed
+        """
+        removed = 0
+        with self._lock:
+            if self.max_age:
+                cur = self._conn.execute(
+                    "DELETE FROM responses WHERE created_at < ?",
+                    (time.time() - self.max_age,),
+                )
+                removed += cur.rowcount
+
+            total = self._size()
+            if self.max_bytes and total > self.max_bytes:
+                target = self.max_bytes * EVICT_TO
+                stale = []
+                # Rows are read from the index only as far as needed
+                for key, size in self._conn.execute(
+                    "SELECT key, size FROM responses ORDER BY accessed_at ASC"
+                ):
+                    if total <= target:
+                        break
+                    stale.append((key,))
+                    total -= size
+                self._conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+                removed += len(stale)
+
+            self._conn.commit()
+            self._total = total
+        return removed
+
+    def _size(self) -> int:
+        """Return the stored payload size in bytes."""
+        row = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        return int(row[0])
+
+    def clear(self) -> None:
+        """Remove every entry from the cache."""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._total = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and the current number of entries."""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
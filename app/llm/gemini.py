@@ -1,42 +1,815 @@
 import os
-from typing import Optional
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
-import google.generativeai as genai
 from dotenv import load_dotenv
 
+from app.llm.backends import LLMBackend, create_backend, last_usage
+from app.llm.cache import (
+    DEFAULT_CACHE_DIR,
+    DEFAULT_MAX_AGE,
+    DEFAULT_MAX_BYTES,
+    ResponseCache,
+    make_cache_key,
+)
+from app.llm.metrics import CallRecord, MetricsCollector
+from app.llm.routing import RouteDecision, RoutingLog, RoutingPolicy
+from app.llm.retry import (
+    CircuitBreaker,
+    RetryPolicy,
+    RetryStats,
+    call_with_retry,
+    call_with_retry_async,
+)
+from app.llm.tokens import (
+    PromptTooLargeError,
+    TokenBudget,
+    estimate_tokens,
+    get_budget,
+)
+
+if TYPE_CHECKING:
+    import asyncio
+
 load_dotenv()
 
 # Configure Gemini 2.0 Flash
 GEMINI_MODEL = "models/gemini-1.5-flash"
-API_KEY: Optional[str] = os.getenv("GEMINI_API_KEY")
 
-if not API_KEY:
-    raise EnvironmentError("GEMINI_API_KEY is not set in the environment")
+# Settings that change the model output; part of every cache key
+GENERATION_CONFIG: Dict[str, Any] = {}
+
+# Default number of concurrent requests for directory-wide commands
+DEFAULT_CONCURRENCY = int(os.getenv("CODEXAGENT_JOBS", "4"))
+
+# Count prompt tokens with the backend's exact tokenizer (one extra API call
+# per request) instead of the local estimate
+EXACT_TOKEN_COUNT = os.getenv("CODEXAGENT_EXACT_TOKENS", "0") == "1"
+
+# Backend serving run_gemini: "gemini", "replay" or "synthetic"
+LLM_BACKEND = os.getenv("CODEXAGENT_BACKEND", "gemini")
+
+# Transient errors (429/503/...) are retried; the breaker pauses the whole run
+# when too many recent calls failed
+RETRY_POLICY = RetryPolicy.from_env()
+_breaker = CircuitBreaker.from_env()
+_retry_stats = RetryStats()
+
+# Per-call latency, tokens and retries, labelled with the running command
+_metrics = MetricsCollector()
+_command = "codexagent"
+_stage: ContextVar[str] = ContextVar("codexagent_metrics_stage", default="")
+_metrics_path = os.getenv("CODEXAGENT_METRICS_FILE")
+
+# Small/large model per task and input size, with escalation on bad output
+ROUTING_POLICY = RoutingPolicy.from_env(GEMINI_MODEL)
+_routing_log = RoutingLog()
+
+# Backends by model; a backend instance passed to set_backend serves all models
+_backends: Dict[str, LLMBackend] = {}
+_pinned_backend: Optional[LLMBackend] = None
+# Single flight: concurrent identical prompts share one in-flight request
+_in_flight: Dict[str, "asyncio.Future[str]"] = {}
+_coalesced = 0
+_cache: Optional[ResponseCache] = None
+_cache_enabled = os.getenv("CODEXAGENT_CACHE", "1") != "0"
+_cache_refresh = False
+
+
+def get_backend(model: Optional[str] = None) -> LLMBackend:
+    """Return the backend for ``model``, creating it from ``LLM_BACKEND`` on first use.
+
+    Args:
+        model: Model name; defaults to ``GEMINI_MODEL``
+
+    Raises:
+        ValueError: If ``LLM_BACKEND`` names an unknown backend
+    """
+    if _pinned_backend is not None:
+        return _pinned_backend
+    model = model or GEMINI_MODEL
+    if model not in _backends:
+        _backends[model] = create_backend(LLM_BACKEND, model, GENERATION_CONFIG)
+    return _backends[model]
+
+
+def set_backend(backend: Union[str, LLMBackend]) -> None:
+    """Select the backend used by :func:`run_gemini`.
+
+    Args:
+        backend: A backend name understood by
+            :func:`app.llm.backends.create_backend`, or a backend instance
+            that then serves every model
+    """
+    global LLM_BACKEND, _pinned_backend
+    _backends.clear()
+    if isinstance(backend, str):
+        _backends[GEMINI_MODEL] = create_backend(
+            backend, GEMINI_MODEL, GENERATION_CONFIG
+        )
+        LLM_BACKEND, _pinned_backend = backend, None
+    else:
+        _pinned_backend = backend
+
+
+def prompt_budget(model: Optional[str] = None) -> TokenBudget:
+    """Return the input and output token budget of ``model`` (default model)."""
+    return get_budget(get_backend(model).model)
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Count the tokens in ``text`` for ``model`` (default model).
+
+    Uses the backend's tokenizer when ``CODEXAGENT_EXACT_TOKENS=1`` and the
+    backend provides one, and the local estimate otherwise.
+    """
+    backend = get_backend(model)
+    counter = getattr(backend, "count_tokens", None)
+    if EXACT_TOKEN_COUNT and counter is not None:
+        return int(counter(text))
+    return estimate_tokens(text)
+
+
+def check_prompt(prompt: str, model: Optional[str] = None) -> None:
+    """Refuse prompts over the model's input budget before they are sent.
+
+    Raises:
+        PromptTooLargeError: If the prompt exceeds the input budget
+    """
+    budget = prompt_budget(model)
+    tokens = count_tokens(prompt, model)
+    if tokens > budget.input_tokens:
+        raise PromptTooLargeError(
+            f"Prompt has {tokens} tokens, above the {budget.input_tokens}-token "
+            f"input budget of {get_backend(model).model}"
+        )
+
+
+def configure_cache(enabled: bool = True, refresh: bool = False) -> None:
+    """Configure the response cache used by :func:`run_gemini`.
+
+    Setting ``CODEXAGENT_CACHE=0`` in the environment disables the cache
+    regardless of ``enabled``.
+
+    Args:
+        enabled: Whether responses are read from and written to the cache
+        refresh: Ignore cached responses but still store fresh ones
+    """
+    global _cache_enabled, _cache_refresh
+    _cache_enabled = enabled and os.getenv("CODEXAGENT_CACHE", "1") != "0"
+    _cache_refresh = refresh
+
+
+def get_cache() -> Optional[ResponseCache]:
+    """Return the process-wide response cache, opening it on first use.
+
+    Returns:
+        The cache, or None if caching is disabled
+    """
+    global _cache
+    if not _cache_enabled:
+        return None
+    if _cache is None:
+        cache_dir = os.path.expanduser(
+            os.getenv("CODEXAGENT_CACHE_DIR", DEFAULT_CACHE_DIR)
+        )
+        _cache = ResponseCache(
+            os.path.join(cache_dir, "responses.sqlite3"),
+            max_bytes=int(
+                float(os.getenv("CODEXAGENT_CACHE_MAX_MB", DEFAULT_MAX_BYTES >> 20))
+                * 1024
+                * 1024
+            ),
+            max_age=float(
+                os.getenv("CODEXAGENT_CACHE_MAX_AGE_DAYS", DEFAULT_MAX_AGE / 86400)
+            )
+            * 86400,
+            compress=os.getenv("CODEXAGENT_CACHE_COMPRESS", "1") != "0",
+        )
+    return _cache
+
+
+def cache_stats() -> Optional[Dict[str, int]]:
+    """Return cache hit/miss counters, or None if the cache was not used."""
+    if _cache is None:
+        return None
+    return _cache.stats()
+
+
+def retry_stats() -> Dict[str, Any]:
+    """Return retry counters, backoff time and circuit breaker openings."""
+    stats = _retry_stats.as_dict()
+    stats["breaker_opens"] = _breaker.opens
+    return stats
+
+
+def configure_metrics(command: str, path: Optional[str] = None) -> None:
+    """Label the calls of this run and choose where metrics are written.
+
+    Args:
+        command: Command name recorded with every call, e.g. "docgen dir"
+        path: File for :func:`write_metrics`; ``.json`` for JSON, anything
+            else for Prometheus text format. Defaults to
+            ``CODEXAGENT_METRICS_FILE``
+    """
+    global _command, _metrics_path
+    _command = command
+    if path is not None:
+        _metrics_path = path
+
+
+@contextmanager
+def metrics_stage(stage: str) -> Iterator[None]:
+    """Label the calls made inside the block, and tasks started in it, with ``stage``.
+
+    Args:
+        stage: Pipeline step shown next to the command in metrics, e.g. "map"
+    """
+    token = _stage.set(stage)
+    try:
+        yield
+    finally:
+        _stage.reset(token)
+
+
+def metrics_summary() -> List[Dict[str, Any]]:
+    """Return call counts, latency quantiles and token totals per command and stage."""
+    return _metrics.summary()
+
+
+def write_metrics() -> Optional[str]:
+    """Write the run's metrics to the configured file.
+
+    Returns:
+        The path written, or None if no metrics file is configured
+    """
+    if not _metrics_path:
+        return None
+    _metrics.write(_metrics_path)
+    return _metrics_path
+
+
+def _record_call(
+    model: str,
+    prompt: str,
+    text: str,
+    latency: float,
+    retries: int = 0,
+    cached: bool = False,
+    streamed: bool = False,
+    error: Optional[str] = None,
+) -> None:
+    """Record one call, preferring token counts reported by the backend."""
+    usage = None if cached else last_usage.get()
+    estimated = usage is None
+    if usage is None:
+        usage = (estimate_tokens(prompt), estimate_tokens(text))
+    _metrics.record(
+        CallRecord(
+            command=_command,
+            model=model,
+            latency=latency,
+            prompt_tokens=usage[0],
+            response_tokens=usage[1],
+            retries=retries,
+            cached=cached,
+            streamed=streamed,
+            estimated_tokens=estimated,
+            error=error,
+            stage=_stage.get(),
+        )
+    )
+
+
+def routing_summary() -> Dict[str, Any]:
+    """Return request counts per task and model, and the escalation count."""
+    return {
+        "requests": [
+            {"task": task, "model": model, "count": count}
+            for (task, model), count in _routing_log.counts().items()
+        ],
+        "escalations": _routing_log.escalations(),
+    }
+
+
+def coalesced_calls() -> int:
+    """Return how many calls shared an identical prompt's in-flight request."""
+    return _coalesced
+
+
+def usage_summary() -> List[str]:
+    """Return human-readable lines describing cache, retry and call activity."""
+    lines = []
+    cached = cache_stats()
+    if cached:
+        lines.append(f"Cache: {cached['hits']} hits, {cached['misses']} misses")
+    if _coalesced:
+        lines.append(f"Coalesced: {_coalesced} identical in-flight requests shared")
+    retries = retry_stats()
+    if retries["retries"] or retries["breaker_opens"]:
+        lines.append(
+            f"Retries: {retries['retries']} "
+            f"({retries['backoff_seconds']:.1f}s backing off, "
+            f"{retries['breaker_opens']} circuit breaker pauses, "
+            f"{retries['pause_seconds']:.1f}s paused)"
+        )
+    routed = _routing_log.counts()
+    if len({model for _, model in routed}) > 1 or _routing_log.escalations():
+        lines.append(
+            "Routing: "
+            + ", ".join(
+                f"{task} {count}x {model}" for (task, model), count in routed.items()
+            )
+            + f" ({_routing_log.escalations()} escalated)"
+        )
+    lines.extend(_metrics.table())
+    return lines
+
+
+def _generate(prompt: str, model: Optional[str] = None) -> str:
+    """Send a prompt to the backend without consulting the cache."""
+    backend = get_backend(model)
+    stats = RetryStats(parent=_retry_stats)
+    last_usage.set(None)
+    start = time.perf_counter()
+    try:
+        text = call_with_retry(
+            lambda: backend.generate(prompt), RETRY_POLICY, _breaker, stats
+        )
+    except Exception as e:
+        _record_call(
+            backend.model,
+            prompt,
+            "",
+            time.perf_counter() - start,
+            stats.retries,
+            error=str(e),
+        )
+        raise RuntimeError(
+            f"Error generating response from {backend.name} backend: {str(e)}"
+        )
+    _record_call(
+        backend.model, prompt, text, time.perf_counter() - start, stats.retries
+    )
+    return text
+
+
+async def _generate_async(prompt: str, model: Optional[str] = None) -> str:
+    """Send a prompt to the backend asynchronously without consulting the cache."""
+    backend = get_backend(model)
+    stats = RetryStats(parent=_retry_stats)
+    last_usage.set(None)
+    start = time.perf_counter()
+    try:
+        text = await call_with_retry_async(
+            lambda: backend.generate_async(prompt), RETRY_POLICY, _breaker, stats
+        )
+    except Exception as e:
+        _record_call(
+            backend.model,
+            prompt,
+            "",
+            time.perf_counter() - start,
+            stats.retries,
+            error=str(e),
+        )
+        raise RuntimeError(
+            f"Error generating response from {backend.name} backend: {str(e)}"
+        )
+    _record_call(
+        backend.model, prompt, text, time.perf_counter() - start, stats.retries
+    )
+    return text
+
+
+def _request_key(prompt: str, model: Optional[str] = None) -> str:
+    """Return the key identifying a request: model, settings and prompt."""
+    budget = prompt_budget(model)
+    settings = dict(GENERATION_CONFIG, max_output_tokens=budget.output_tokens)
+    backend = get_backend(model)
+    return make_cache_key(f"{backend.name}:{backend.model}", settings, prompt)
+
+
+async def _single_flight(
+    prompt: str, model: Optional[str], factory: Callable[[], Awaitable[str]]
+) -> str:
+    """Run ``factory`` unless an identical request is already in flight.
+
+    Callers arriving while the request runs await the same result, or the
+    same exception, instead of sending the prompt again.
+    """
+    import asyncio
+
+    global _coalesced
+    key = _request_key(prompt, model)
+    flight = _in_flight.get(key)
+    if flight is None or flight.get_loop() is not asyncio.get_running_loop():
+        flight = asyncio.ensure_future(factory())
+        _in_flight[key] = flight
+
+        def land(done: "asyncio.Future[str]") -> None:
+            if _in_flight.get(key) is done:
+                del _in_flight[key]
+
+        flight.add_done_callback(land)
+    else:
+        _coalesced += 1
+    # Shielded so that one cancelled caller does not cancel the shared request
+    return await asyncio.shield(flight)
+
+
+def _cache_lookup(
+    prompt: str, model: Optional[str] = None
+) -> Tuple[Optional[str], Optional[str]]:
+    """Look a prompt up in the cache.
+
+    Returns:
+        Tuple of the cache key (None when caching is disabled) and the
+        cached response (None on a miss)
+    """
+    cache = get_cache()
+    if cache is None:
+        return None, None
 
-genai.configure(api_key=API_KEY)
-model = genai.GenerativeModel(GEMINI_MODEL)
+    key = _request_key(prompt, model)
+    if _cache_refresh:
+        return key, None
+    return key, cache.get(key)
 
 
-def run_gemini(prompt: str) -> str:
+def _cache_store(key: Optional[str], text: str) -> None:
+    """Store a fresh response under ``key`` if caching is enabled."""
+    cache = get_cache()
+    if key is not None and cache is not None:
+        cache.set(key, text)
+
+
+def run_gemini(prompt: str, model: Optional[str] = None) -> str:
     """Run a prompt through the Gemini model and return the response.
-    
+
+    The prompt goes to the backend selected by ``CODEXAGENT_BACKEND`` or
+    :func:`set_backend` (Gemini by default). Responses are served from the
+    on-disk cache when the same model, generation settings and prompt were
+    seen before.
+
+    Args:
+        prompt: The prompt to send to the model
+        model: Model to use instead of ``GEMINI_MODEL``
+
+    Returns:
+        The model's response as a string
+
+    Raises:
+        PromptTooLargeError: If the prompt exceeds the model's input budget
+        RuntimeError: If there's an error generating the response, after
+            transient errors were retried with exponential backoff
+    """
+    check_prompt(prompt, model)
+    key, cached = _cache_lookup(prompt, model)
+    if cached is not None:
+        _record_call(get_backend(model).model, prompt, cached, 0.0, cached=True)
+        return cached
+
+    text = _generate(prompt, model)
+    _cache_store(key, text)
+    return text
+
+
+async def _run_gemini_async(prompt: str, model: Optional[str] = None) -> str:
+    """Serve a prompt from the cache or the backend, without coalescing."""
+    key, cached = _cache_lookup(prompt, model)
+    if cached is not None:
+        _record_call(get_backend(model).model, prompt, cached, 0.0, cached=True)
+        return cached
+
+    text = await _generate_async(prompt, model)
+    _cache_store(key, text)
+    return text
+
+
+async def run_gemini_async(prompt: str, model: Optional[str] = None) -> str:
+    """Asynchronous variant of :func:`run_gemini`.
+
+    Concurrent calls with an identical prompt share a single request.
+
     Args:
         prompt: The prompt to send to the model
-        
+        model: Model to use instead of ``GEMINI_MODEL``
+
     Returns:
         The model's response as a string
-        
+
     Raises:
+        PromptTooLargeError: If the prompt exceeds the model's input budget
         RuntimeError: If there's an error generating the response
     """
+    check_prompt(prompt, model)
+    return await _single_flight(
+        prompt, model, lambda: _run_gemini_async(prompt, model)
+    )
+
+
+def _open_stream(backend: LLMBackend, prompt: str) -> Tuple[str, Iterator[str]]:
+    """Start a streaming request and wait for its first chunk."""
+    chunks = iter(backend.stream(prompt))
+    return next(chunks, ""), chunks
+
+
+class GeminiStream:
+    """Streaming response from :func:`stream_gemini`.
+
+    Iterate over it to receive chunks of the response as they arrive. Once
+    exhausted, ``text`` holds the full response and ``time_to_first_token``
+    and ``total_time`` the latencies in seconds. Transient errors are
+    retried only until the first chunk arrives.
+    """
+
+    def __init__(self, prompt: str, model: Optional[str] = None) -> None:
+        self.prompt = prompt
+        self.model = model
+        self.text = ""
+        self.cached = False
+        self.time_to_first_token: Optional[float] = None
+        self.total_time: Optional[float] = None
+
+    def __iter__(self) -> Iterator[str]:
+        start = time.perf_counter()
+        key, cached = _cache_lookup(self.prompt, self.model)
+        if cached is not None:
+            self.cached = True
+            self.text = cached
+            self.time_to_first_token = self.total_time = time.perf_counter() - start
+            _record_call(
+                get_backend(self.model).model,
+                self.prompt,
+                cached,
+                self.total_time,
+                cached=True,
+            )
+            yield cached
+            return
+
+        backend = get_backend(self.model)
+        stats = RetryStats(parent=_retry_stats)
+        last_usage.set(None)
+        parts: List[str] = []
+        try:
+            first, chunks = call_with_retry(
+                lambda: _open_stream(backend, self.prompt),
+                RETRY_POLICY,
+                _breaker,
+                stats,
+            )
+            self.time_to_first_token = time.perf_counter() - start
+            parts.append(first)
+            yield first
+            for chunk in chunks:
+                parts.append(chunk)
+                yield chunk
+        except Exception as e:
+            _record_call(
+                backend.model,
+                self.prompt,
+                "".join(parts),
+                time.perf_counter() - start,
+                stats.retries,
+                streamed=True,
+                error=str(e),
+            )
+            raise RuntimeError(
+                f"Error generating response from {backend.name} backend: {str(e)}"
+            )
+
+        self.total_time = time.perf_counter() - start
+        self.text = "".join(parts).strip()
+        _record_call(
+            backend.model,
+            self.prompt,
+            self.text,
+            self.total_time,
+            stats.retries,
+            streamed=True,
+        )
+        _cache_store(key, self.text)
+
+
+def stream_gemini(prompt: str, model: Optional[str] = None) -> GeminiStream:
+    """Run a prompt through the model, streaming the response.
+
+    Args:
+        prompt: The prompt to send to the model
+        model: Model to use instead of ``GEMINI_MODEL``
+
+    Returns:
+        A :class:`GeminiStream` yielding response chunks
+
+    Raises:
+        PromptTooLargeError: If the prompt exceeds the model's input budget
+        RuntimeError: While iterating, if there's an error generating the
+            response
+    """
+    check_prompt(prompt, model)
+    return GeminiStream(prompt, model)
+
+
+class GeminiClient:
+    """Async Gemini client that bounds the number of in-flight requests.
+
+    Create one client per event loop and share it between all tasks of a
+    run; at most ``max_concurrency`` requests are sent at the same time.
+    Identical prompts are coalesced before they wait for a slot.
+    """
+
+    def __init__(self, max_concurrency: int = DEFAULT_CONCURRENCY) -> None:
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphore: Optional["asyncio.Semaphore"] = None
+
+    async def generate(self, prompt: str, model: Optional[str] = None) -> str:
+        """Run a prompt through the model, waiting for a free slot first.
+
+        Args:
+            prompt: The prompt to send to the model
+            model: Model to use instead of ``GEMINI_MODEL``
+
+        Returns:
+            The model's response as a string
+        """
+        check_prompt(prompt, model)
+        return await _single_flight(
+            prompt, model, lambda: self._generate(prompt, model)
+        )
+
+    async def _generate(self, prompt: str, model: Optional[str] = None) -> str:
+        """Run a prompt once a request slot is free."""
+        import asyncio
+
+        if self._semaphore is None:
+            # Created lazily so it binds to the running event loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            return await _run_gemini_async(prompt, model)
+
+
+T = TypeVar("T")
+
+
+async def as_completed_bounded(
+    coroutines: Iterable[Awaitable[T]], limit: int
+) -> AsyncIterator[T]:
+    """Run coroutines concurrently and yield their results as they finish.
+
+    Coroutines are taken from ``coroutines`` lazily, so at most ``limit`` are
+    pending at any time and memory stays flat however many there are. If the
+    consumer stops early, the pending ones are cancelled.
+
+    Args:
+        coroutines: Work to run, usually a generator expression
+        limit: Maximum number of coroutines in flight
+
+    Yields:
+        Each result, in completion order
+    """
+    import asyncio
+
+    work = iter(coroutines)
+    pending: set = set()
     try:
-        response = model.generate_content(prompt)
-        # Handle different response types
-        if hasattr(response, 'text') and callable(response.text):
-            return response.text().strip()
-        elif hasattr(response, 'text') and response.text is not None:
-            return str(response.text).strip()
-        else:
-            return str(response).strip()
-    except Exception as e:
-        raise RuntimeError(f"Error generating response from Gemini: {str(e)}")
+        while True:
+            for coroutine in work:
+                pending.add(asyncio.ensure_future(coroutine))
+                if len(pending) >= max(1, limit):
+                    break
+            if not pending:
+                return
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+def iterate_blocking(iterator: AsyncIterator[T]) -> Iterator[T]:
+    """Consume an async iterator from synchronous code.
+
+    The iterator runs on a private event loop, which only advances while the
+    next item is awaited.
+    """
+    import asyncio
+
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                item = loop.run_until_complete(iterator.__anext__())
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            loop.run_until_complete(aclose())
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+
+
+def route(task: str, prompt: str, complexity: int = 0) -> RouteDecision:
+    """Choose the model for a prompt with ``ROUTING_POLICY`` and log the choice.
+
+    Args:
+        task: Task type, e.g. "docgen" or "refactoring"
+        prompt: The prompt to be sent
+        complexity: Task-specific complexity, e.g. the number of issues
+
+    Returns:
+        The routing decision
+    """
+    decision = ROUTING_POLICY.route(task, estimate_tokens(prompt), complexity)
+    _routing_log.record(decision)
+    return decision
+
+
+def escalate(decision: RouteDecision) -> Optional[RouteDecision]:
+    """Return and log the large-model retry of a rejected response, if any.
+
+    Returns:
+        The escalated decision, or None if ``decision`` already used the
+        large model or routing is disabled
+    """
+    escalation = ROUTING_POLICY.escalate(decision)
+    if escalation is not None:
+        _routing_log.record(escalation)
+    return escalation
+
+
+def run_routed(
+    task: str,
+    prompt: str,
+    validate: Optional[Callable[[str], bool]] = None,
+    complexity: int = 0,
+) -> Tuple[str, List[RouteDecision]]:
+    """Run a prompt on the routed model, escalating if the output is invalid.
+
+    Args:
+        task: Task type, e.g. "docgen" or "refactoring"
+        prompt: The prompt to send to the model
+        validate: Returns False for output that should be regenerated by the
+            large model, e.g. unparseable code
+        complexity: Task-specific complexity, e.g. the number of issues
+
+    Returns:
+        Tuple of the response and the routing decisions taken for it
+    """
+    decision = route(task, prompt, complexity)
+    text = run_gemini(prompt, decision.model)
+    decisions = [decision]
+    if validate is not None and not validate(text):
+        escalation = escalate(decision)
+        if escalation is not None:
+            decisions.append(escalation)
+            text = run_gemini(prompt, escalation.model)
+    return text, decisions
+
+
+async def run_routed_async(
+    task: str,
+    prompt: str,
+    client: Optional[GeminiClient] = None,
+    validate: Optional[Callable[[str], bool]] = None,
+    complexity: int = 0,
+) -> Tuple[str, List[RouteDecision]]:
+    """Asynchronous variant of :func:`run_routed`.
+
+    Args:
+        client: Client bounding concurrency; without one the request is sent
+            with :func:`run_gemini_async`
+    """
+    generate = client.generate if client is not None else run_gemini_async
+    decision = route(task, prompt, complexity)
+    text = await generate(prompt, decision.model)
+    decisions = [decision]
+    if validate is not None and not validate(text):
+        escalation = escalate(decision)
+        if escalation is not None:
+            decisions.append(escalation)
+            text = await generate(prompt, escalation.model)
+    return text, decisions
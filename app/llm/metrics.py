@@ -0,0 +1,306 @@
+# app/llm/metrics.py
+import json
+import os
+import threading
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+# Latency quantiles reported in the summary table and metric files
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+@dataclass(frozen=True)
+class ModelPrice:
+    """Price of a model's prompt and response tokens, in USD per million."""
+
+    input: float
+    output: float
+
+
+# Published list prices for prompts up to 128k tokens; models without a
+# price, such as the offline backends, are counted as free
+MODEL_PRICES: Dict[str, ModelPrice] = {
+    "models/gemini-1.5-flash": ModelPrice(0.075, 0.30),
+    "models/gemini-1.5-flash-8b": ModelPrice(0.0375, 0.15),
+    "models/gemini-1.5-pro": ModelPrice(1.25, 5.00),
+    "models/gemini-2.0-flash": ModelPrice(0.10, 0.40),
+}
+FREE = ModelPrice(0.0, 0.0)
+
+
+def get_prices() -> Dict[str, ModelPrice]:
+    """Return the token prices per model.
+
+    ``CODEXAGENT_PRICES`` overrides or adds prices as a JSON object mapping
+    model names (the ``models/`` prefix is optional) to ``[input, output]``
+    USD per million tokens, e.g. ``{"gemini-1.5-pro": [1.25, 5.0]}``.
+
+    Raises:
+        ValueError: If ``CODEXAGENT_PRICES`` is not such an object
+    """
+    prices = dict(MODEL_PRICES)
+    override = os.getenv("CODEXAGENT_PRICES")
+    if not override:
+        return prices
+    try:
+        for model, (input_price, output_price) in json.loads(override).items():
+            price = ModelPrice(float(input_price), float(output_price))
+            prices[model] = price
+            if "/" not in model:
+                prices[f"models/{model}"] = price
+    except (AttributeError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid CODEXAGENT_PRICES: {override!r}") from e
+    return prices
+
+
+def call_cost(
+    price: ModelPrice, prompt_tokens: int, response_tokens: int
+) -> float:
+    """Return the USD cost of a call's tokens."""
+    return (prompt_tokens * price.input + response_tokens * price.output) / 1e6
+
+
+@dataclass
+class CallRecord:
+    """One model call as seen by :func:`app.llm.gemini.run_gemini`.
+
+    ``latency`` includes retries and backoff. Token counts come from the
+    response usage metadata when the backend reports it, otherwise from the
+    local estimate (``estimated_tokens`` is then True). ``stage`` names the
+    step of a multi-call pipeline, e.g. "map" or "reduce" for chunked docgen.
+    """
+
+    command: str
+    model: str
+    latency: float
+    prompt_tokens: int
+    response_tokens: int
+    retries: int = 0
+    cached: bool = False
+    streamed: bool = False
+    estimated_tokens: bool = False
+    error: Optional[str] = None
+    stage: str = ""
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Return the ``q`` quantile (0-1) of ``values`` by linear interpolation."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class MetricsCollector:
+    """Thread-safe store of :class:`CallRecord` entries for one run."""
+
+    def __init__(self) -> None:
+        self.records: List[CallRecord] = []
+        self._lock = threading.Lock()
+
+    def record(self, record: CallRecord) -> None:
+        """Add one call."""
+        with self._lock:
+            self.records.append(record)
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Aggregate the calls per command, stage and model.
+
+        Latency quantiles, throughput and cost only count calls that reached
+        the backend; cache hits are counted separately. Cost is in USD, from
+        :func:`get_prices`.
+
+        Returns:
+            One dictionary of aggregated metrics per command, stage and model
+        """
+        with self._lock:
+            records = list(self.records)
+
+        groups: Dict[Tuple[str, str, str], List[CallRecord]] = {}
+        for record in records:
+            key = (record.command, record.stage, record.model)
+            groups.setdefault(key, []).append(record)
+
+        prices = get_prices()
+        summary = []
+        for (command, stage, model), calls in groups.items():
+            sent = [call for call in calls if not call.cached]
+            latencies = [call.latency for call in sent if call.error is None]
+            prompt_tokens = sum(call.prompt_tokens for call in sent)
+            response_tokens = sum(call.response_tokens for call in sent)
+            busy = sum(call.latency for call in sent)
+            price = prices.get(model, FREE)
+            stats: Dict[str, Any] = {
+                "command": command,
+                "stage": stage,
+                "model": model,
+                "calls": len(calls),
+                "cached": len(calls) - len(sent),
+                "errors": sum(call.error is not None for call in calls),
+                "retries": sum(call.retries for call in calls),
+                "prompt_tokens": prompt_tokens,
+                "response_tokens": response_tokens,
+                "cost_usd": round(call_cost(price, prompt_tokens, response_tokens), 6),
+                "latency_seconds": round(busy, 3),
+                "tokens_per_second": round(response_tokens / busy, 1) if busy else 0.0,
+            }
+            for q in QUANTILES:
+                stats[f"p{int(q * 100)}_seconds"] = round(percentile(latencies, q), 3)
+            summary.append(stats)
+        return summary
+
+    def table(self) -> List[str]:
+        """Return the per-command (and stage) summary as fixed-width table lines."""
+        summary = self.summary()
+        if not summary:
+            return []
+        labels = [_row_label(stats) for stats in summary]
+        width = max(12, *(len(label) + 2 for label in labels))
+        lines = [
+            f"{'command (model)':<{width}}{'calls':>7}{'cached':>8}{'errors':>8}"
+            f"{'retries':>9}{'p50':>8}{'p95':>8}{'p99':>8}"
+            f"{'in tok':>10}{'out tok':>10}{'tok/s':>10}{'cost':>11}"
+        ]
+        for label, stats in zip(labels, summary):
+            lines.append(
+                f"{label:<{width}}{stats['calls']:>7}{stats['cached']:>8}"
+                f"{stats['errors']:>8}{stats['retries']:>9}"
+                f"{stats['p50_seconds']:>7.2f}s{stats['p95_seconds']:>7.2f}s"
+                f"{stats['p99_seconds']:>7.2f}s{stats['prompt_tokens']:>10}"
+                f"{stats['response_tokens']:>10}{stats['tokens_per_second']:>10.1f}"
+                f"{'$' + format(stats['cost_usd'], '.4f'):>11}"
+            )
+        return lines
+
+    def to_prometheus(self) -> str:
+        """Render the metrics in the Prometheus text exposition format."""
+        with self._lock:
+            records = list(self.records)
+
+        lines = [
+            "# HELP codexagent_llm_calls_total Model calls by command and outcome.",
+            "# TYPE codexagent_llm_calls_total counter",
+        ]
+        summary = self.summary()
+        for stats in summary:
+            label = _labels(stats)
+            ok = stats["calls"] - stats["cached"] - stats["errors"]
+            for outcome, count in (
+                ("ok", ok),
+                ("cached", stats["cached"]),
+                ("error", stats["errors"]),
+            ):
+                lines.append(
+                    f'codexagent_llm_calls_total{{{label},outcome="{outcome}"}} {count}'
+                )
+
+        lines += [
+            "# HELP codexagent_llm_retries_total Retried model requests.",
+            "# TYPE codexagent_llm_retries_total counter",
+        ]
+        for stats in summary:
+            lines.append(
+                f"codexagent_llm_retries_total{{{_labels(stats)}}} {stats['retries']}"
+            )
+
+        lines += [
+            "# HELP codexagent_llm_tokens_total Tokens sent and received.",
+            "# TYPE codexagent_llm_tokens_total counter",
+        ]
+        for stats in summary:
+            label = _labels(stats)
+            lines.append(
+                f'codexagent_llm_tokens_total{{{label},direction="prompt"}} '
+                f"{stats['prompt_tokens']}"
+            )
+            lines.append(
+                f'codexagent_llm_tokens_total{{{label},direction="response"}} '
+                f"{stats['response_tokens']}"
+            )
+
+        lines += [
+            "# HELP codexagent_llm_cost_usd_total Estimated cost of model calls.",
+            "# TYPE codexagent_llm_cost_usd_total counter",
+        ]
+        for stats in summary:
+            lines.append(
+                f"codexagent_llm_cost_usd_total{{{_labels(stats)}}} "
+                f"{stats['cost_usd']:.6f}"
+            )
+
+        lines += [
+            "# HELP codexagent_llm_latency_seconds Latency of model requests.",
+            "# TYPE codexagent_llm_latency_seconds summary",
+        ]
+        for stats in summary:
+            label = _labels(stats)
+            sent = [
+                call.latency
+                for call in records
+                if (call.command, call.stage, call.model)
+                == (stats["command"], stats["stage"], stats["model"])
+                and not call.cached
+                and call.error is None
+            ]
+            for q in QUANTILES:
+                lines.append(
+                    f'codexagent_llm_latency_seconds{{{label},quantile="{q}"}} '
+                    f"{percentile(sent, q):.6f}"
+                )
+            lines.append(
+                f"codexagent_llm_latency_seconds_sum{{{label}}} {sum(sent):.6f}"
+            )
+            lines.append(
+                f"codexagent_llm_latency_seconds_count{{{label}}} {len(sent)}"
+            )
+        return "\n".join(lines) + "\n"
+
+    def to_json(self) -> Dict[str, Any]:
+        """Return the summary, total cost and every call record as plain data."""
+        with self._lock:
+            records = [asdict(record) for record in self.records]
+        summary = self.summary()
+        return {
+            "summary": summary,
+            "cost_usd": round(sum(stats["cost_usd"] for stats in summary), 6),
+            "calls": records,
+        }
+
+    def write(self, path: str) -> None:
+        """Write the metrics to ``path``.
+
+        Files ending in ``.json`` get :meth:`to_json`; anything else gets the
+        Prometheus text format, e.g. for the node exporter's textfile
+        collector.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            if path.endswith(".json"):
+                json.dump(self.to_json(), f, indent=2)
+            else:
+                f.write(self.to_prometheus())
+
+
+def _escape_label(value: str) -> str:
+    """Escape a Prometheus label value."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(stats: Dict[str, Any]) -> str:
+    """Return the Prometheus labels identifying a summary row."""
+    return (
+        f'command="{_escape_label(stats["command"])}",'
+        f'stage="{_escape_label(stats["stage"])}",'
+        f'model="{_escape_label(stats["model"])}"'
+    )
+
+
+def _row_label(stats: Dict[str, Any]) -> str:
+    """Return the table label of a summary row, without the "models/" prefix."""
+    model = stats["model"].split("/")[-1]
+    stage = f" {stats['stage']}" if stats["stage"] else ""
+    return f"{stats['command']}{stage} ({model})"
@@ -0,0 +1,275 @@
+# app/llm/retry.py
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+# HTTP status codes worth retrying: timeouts, rate limits and server errors
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# Exception class names used by google.api_core for the same conditions
+RETRYABLE_ERROR_NAMES = {
+    "DeadlineExceeded",
+    "InternalServerError",
+    "ResourceExhausted",
+    "ServiceUnavailable",
+    "TooManyRequests",
+    "BadGateway",
+    "GatewayTimeout",
+    "TimeoutError",
+}
+
+_RETRY_DELAY_PATTERN = re.compile(
+    r"retry in (\d+(?:\.\d+)?)\s*s|retry_delay\s*\{\s*seconds:\s*(\d+)",
+    re.IGNORECASE,
+)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Return True if ``error`` is a transient failure worth retrying."""
+    if isinstance(error, ConnectionError):
+        return True
+    code = getattr(error, "code", None)
+    if isinstance(code, int) and code in RETRYABLE_STATUS_CODES:
+        return True
+    return any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__)
+
+
+def retry_hint(error: BaseException) -> Optional[float]:
+    """Extract the server-suggested retry delay from an error, in seconds.
+
+    Looks at a ``Retry-After`` response header, ``RetryInfo`` error details
+    and finally the error message itself.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is not None:
+        value = headers.get("Retry-After") or headers.get("retry-after")
+        try:
+            if value is not None:
+                return float(value)
+        except (TypeError, ValueError):
+            pass
+
+    for detail in getattr(error, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None:
+            return float(getattr(delay, "seconds", 0)) + (
+                float(getattr(delay, "nanos", 0)) / 1e9
+            )
+
+    match = _RETRY_DELAY_PATTERN.search(str(error))
+    if match:
+        return float(match.group(1) or match.group(2))
+    return None
+
+
+@dataclass
+class RetryPolicy:
+    """Exponential backoff with full jitter."""
+
+    max_attempts: int = 5
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+    multiplier: float = 2.0
+    max_hint: float = 600.0
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        """Build a policy from ``CODEXAGENT_RETRY_*`` environment variables."""
+        return cls(
+            max_attempts=int(os.getenv("CODEXAGENT_RETRY_ATTEMPTS", "5")),
+            base_delay=float(os.getenv("CODEXAGENT_RETRY_BASE_DELAY", "1.0")),
+            max_delay=float(os.getenv("CODEXAGENT_RETRY_MAX_DELAY", "60.0")),
+            max_hint=float(os.getenv("CODEXAGENT_RETRY_MAX_HINT", "600.0")),
+        )
+
+    def delay(self, attempt: int, hint: Optional[float] = None) -> Optional[float]:
+        """Return how long to wait before retry number ``attempt`` (from 1).
+
+        Backoff is capped at ``max_delay``, but a server hint is honored as
+        a lower bound even when it is longer: retrying earlier would only be
+        rejected again. A hint above ``max_hint`` is not waited for.
+
+        Returns:
+            The delay in seconds, or None if the call should fail now
+        """
+        if hint is not None and hint > self.max_hint:
+            return None
+        backoff = self.base_delay * self.multiplier ** (attempt - 1)
+        delay = random.uniform(0, min(self.max_delay, backoff))
+        if hint is not None:
+            delay = max(delay, hint)
+        return delay
+
+
+class CircuitBreaker:
+    """Pause all callers when the recent transient error rate spikes.
+
+    The breaker tracks the outcome of the last ``window`` calls. Once at
+    least ``min_calls`` were seen and the failure ratio reaches
+    ``threshold``, it opens for ``cooldown`` seconds; every caller waits
+    for it to close before sending another request.
+    """
+
+    def __init__(
+        self,
+        window: int = 20,
+        min_calls: int = 10,
+        threshold: float = 0.5,
+        cooldown: float = 30.0,
+    ) -> None:
+        self.min_calls = min_calls
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.opens = 0
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "CircuitBreaker":
+        """Build a breaker from ``CODEXAGENT_BREAKER_*`` environment variables."""
+        return cls(
+            threshold=float(os.getenv("CODEXAGENT_BREAKER_THRESHOLD", "0.5")),
+            cooldown=float(os.getenv("CODEXAGENT_BREAKER_COOLDOWN", "30.0")),
+        )
+
+    def record(self, success: bool) -> None:
+        """Record the outcome of one call and open the breaker if needed."""
+        with self._lock:
+            self._outcomes.append(success)
+            if len(self._outcomes) < self.min_calls:
+                return
+            failures = self._outcomes.count(False)
+            if failures / len(self._outcomes) >= self.threshold:
+                self._open_until = time.monotonic() + self.cooldown
+                self._outcomes.clear()
+                self.opens += 1
+
+    def remaining(self) -> float:
+        """Return the seconds left before the breaker closes again."""
+        with self._lock:
+            return max(0.0, self._open_until - time.monotonic())
+
+
+class RetryStats:
+    """Counters describing retries and pauses across a run.
+
+    Counts added to a child created with ``parent`` are added to the parent
+    too, e.g. to count the retries of a single call within a run.
+    """
+
+    def __init__(self, parent: Optional["RetryStats"] = None) -> None:
+        self.parent = parent
+        self.retries = 0
+        self.failures = 0
+        self.backoff_seconds = 0.0
+        self.pause_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(
+        self,
+        retries: int = 0,
+        failures: int = 0,
+        backoff: float = 0.0,
+        pause: float = 0.0,
+    ) -> None:
+        """Increment the counters."""
+        with self._lock:
+            self.retries += retries
+            self.failures += failures
+            self.backoff_seconds += backoff
+            self.pause_seconds += pause
+        if self.parent is not None:
+            self.parent.add(retries, failures, backoff, pause)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return the counters as a plain dictionary."""
+        with self._lock:
+            return {
+                "retries": self.retries,
+                "failures": self.failures,
+                "backoff_seconds": round(self.backoff_seconds, 3),
+                "pause_seconds": round(self.pause_seconds, 3),
+            }
+
+
+def call_with_retry(
+    func: Callable[[], T],
+    policy: RetryPolicy,
+    breaker: CircuitBreaker,
+    stats: RetryStats,
+) -> T:
+    """Call ``func``, retrying transient errors according to ``policy``.
+
+    Raises:
+        Exception: The last error once retries are exhausted, or the first
+            error that is not retryable
+    """
+    attempt = 0
+    while True:
+        pause = breaker.remaining()
+        if pause:
+            stats.add(pause=pause)
+            time.sleep(pause)
+
+        try:
+            result = func()
+        except Exception as e:
+            attempt += 1
+            if not is_retryable(e):
+                raise
+            breaker.record(False)
+            delay = policy.delay(attempt, retry_hint(e))
+            if attempt >= policy.max_attempts or delay is None:
+                stats.add(failures=1)
+                raise
+            stats.add(retries=1, backoff=delay)
+            time.sleep(delay)
+            continue
+
+        breaker.record(True)
+        return result
+
+
+async def call_with_retry_async(
+    func: Callable[[], Awaitable[T]],
+    policy: RetryPolicy,
+    breaker: CircuitBreaker,
+    stats: RetryStats,
+) -> T:
+    """Asynchronous variant of :func:`call_with_retry`."""
+    # Imported here to keep asyncio off the start-up path of local commands
+    import asyncio
+
+    attempt = 0
+    while True:
+        pause = breaker.remaining()
+        if pause:
+            stats.add(pause=pause)
+            await asyncio.sleep(pause)
+
+        try:
+            result = await func()
+        except Exception as e:
+            attempt += 1
+            if not is_retryable(e):
+                raise
+            breaker.record(False)
+            delay = policy.delay(attempt, retry_hint(e))
+            if attempt >= policy.max_attempts or delay is None:
+                stats.add(failures=1)
+                raise
+            stats.add(retries=1, backoff=delay)
+            await asyncio.sleep(delay)
+            continue
+
+        breaker.record(True)
+        return result
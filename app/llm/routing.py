@@ -0,0 +1,151 @@
+# app/llm/routing.py
+import os
+import threading
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+# Model used for inputs too big or complex for the default model
+DEFAULT_LARGE_MODEL = "models/gemini-1.5-pro"
+
+# Largest prompt, in tokens, that the small model handles for each task
+DEFAULT_SMALL_TOKENS: Dict[str, int] = {
+    "summarize": 16_000,
+    "docgen": 8_000,
+    "suggestions": 6_000,
+    "refactoring": 3_000,
+}
+
+# Inputs with more findings than this (e.g. refactoring issues) go to the
+# large model regardless of their size
+DEFAULT_MAX_COMPLEXITY = 10
+
+# Reason of every decision that retries a request with the large model
+ESCALATION_REASON = "small model output failed validation"
+
+
+@dataclass(frozen=True)
+class RouteDecision:
+    """Which model serves a request, and why."""
+
+    task: str
+    model: str
+    reason: str
+    prompt_tokens: int
+    complexity: int = 0
+    escalated: bool = False
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return the decision as a plain dictionary for reports."""
+        return asdict(self)
+
+
+@dataclass
+class RoutingPolicy:
+    """Route each request to a small or a large model by task and input size.
+
+    Prompts up to ``small_tokens[task]`` tokens with at most
+    ``max_complexity`` findings go to ``small_model``; everything else, and
+    every request whose small-model output fails validation, goes to
+    ``large_model``. Tasks without a threshold always use the small model.
+    """
+
+    small_model: str
+    large_model: str = DEFAULT_LARGE_MODEL
+    small_tokens: Dict[str, int] = field(
+        default_factory=lambda: dict(DEFAULT_SMALL_TOKENS)
+    )
+    max_complexity: int = DEFAULT_MAX_COMPLEXITY
+    enabled: bool = True
+
+    @classmethod
+    def from_env(cls, default_model: str) -> "RoutingPolicy":
+        """Build a policy from ``CODEXAGENT_ROUTING*`` environment variables.
+
+        Args:
+            default_model: Small model unless ``CODEXAGENT_SMALL_MODEL`` is set
+        """
+        small_tokens = {
+            task: int(os.getenv(f"CODEXAGENT_ROUTE_TOKENS_{task.upper()}", tokens))
+            for task, tokens in DEFAULT_SMALL_TOKENS.items()
+        }
+        return cls(
+            small_model=os.getenv("CODEXAGENT_SMALL_MODEL", default_model),
+            large_model=os.getenv("CODEXAGENT_LARGE_MODEL", DEFAULT_LARGE_MODEL),
+            small_tokens=small_tokens,
+            max_complexity=int(
+                os.getenv("CODEXAGENT_ROUTE_MAX_COMPLEXITY", DEFAULT_MAX_COMPLEXITY)
+            ),
+            enabled=os.getenv("CODEXAGENT_ROUTING", "1") != "0",
+        )
+
+    def route(
+        self, task: str, prompt_tokens: int, complexity: int = 0
+    ) -> RouteDecision:
+        """Choose the model for one request.
+
+        Args:
+            task: Task type, e.g. "docgen" or "refactoring"
+            prompt_tokens: Size of the prompt
+            complexity: Task-specific complexity, e.g. the number of issues
+
+        Returns:
+            The routing decision
+        """
+        limit = self.small_tokens.get(task)
+        if not self.enabled:
+            model, reason = self.small_model, "routing disabled"
+        elif limit is not None and prompt_tokens > limit:
+            model, reason = self.large_model, f"prompt over {limit} tokens"
+        elif complexity > self.max_complexity:
+            model, reason = self.large_model, f"complexity over {self.max_complexity}"
+        else:
+            model, reason = self.small_model, "small input"
+        return RouteDecision(task, model, reason, prompt_tokens, complexity)
+
+    def escalate(self, decision: RouteDecision) -> Optional[RouteDecision]:
+        """Return the decision to retry with the large model, if any is left."""
+        if not self.enabled or decision.model == self.large_model:
+            return None
+        return RouteDecision(
+            decision.task,
+            self.large_model,
+            ESCALATION_REASON,
+            decision.prompt_tokens,
+            decision.complexity,
+            escalated=True,
+        )
+
+
+class RoutingLog:
+    """Thread-safe counts of the routing decisions of a run.
+
+    Decisions are counted per task, model and reason rather than kept, so
+    the log stays small however many requests a run makes.
+    """
+
+    def __init__(self) -> None:
+        self.decisions: Dict[Tuple[str, str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, decision: RouteDecision) -> None:
+        """Count one decision."""
+        key = (decision.task, decision.model, decision.reason)
+        with self._lock:
+            self.decisions[key] = self.decisions.get(key, 0) + 1
+
+    def counts(self) -> Dict[Tuple[str, str], int]:
+        """Return the number of requests per task and model."""
+        counts: Dict[Tuple[str, str], int] = {}
+        with self._lock:
+            for (task, model, _), count in self.decisions.items():
+                counts[task, model] = counts.get((task, model), 0) + count
+        return counts
+
+    def escalations(self) -> int:
+        """Return the number of requests retried with the large model."""
+        with self._lock:
+            return sum(
+                count
+                for (_, _, reason), count in self.decisions.items()
+                if reason == ESCALATION_REASON
+            )
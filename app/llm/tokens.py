@@ -0,0 +1,122 @@
+# app/llm/tokens.py
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+# Word pieces, runs of punctuation and single newlines are roughly one token
+# each; long identifiers are split into pieces of CHARS_PER_TOKEN characters
+CHARS_PER_TOKEN = 4
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]+|\n")
+
+
+@dataclass(frozen=True)
+class TokenBudget:
+    """Maximum prompt and response size for a model, in tokens."""
+
+    input_tokens: int
+    output_tokens: int
+
+
+# Published context limits; unknown models get DEFAULT_BUDGET
+MODEL_BUDGETS: Dict[str, TokenBudget] = {
+    "models/gemini-1.5-flash": TokenBudget(1_048_576, 8_192),
+    "models/gemini-1.5-flash-8b": TokenBudget(1_048_576, 8_192),
+    "models/gemini-1.5-pro": TokenBudget(2_097_152, 8_192),
+    "models/gemini-2.0-flash": TokenBudget(1_048_576, 8_192),
+    "synthetic": TokenBudget(1_048_576, 8_192),
+    "replay": TokenBudget(1_048_576, 8_192),
+}
+DEFAULT_BUDGET = TokenBudget(32_768, 2_048)
+
+
+class PromptTooLargeError(ValueError):
+    """Raised when a prompt does not fit the model's input budget."""
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in ``text`` without calling the API.
+
+    The estimate is deterministic and errs on the high side for code.
+    """
+    return sum(
+        -(-len(piece) // CHARS_PER_TOKEN) for piece in _TOKEN_PATTERN.findall(text)
+    )
+
+
+def get_budget(model: str) -> TokenBudget:
+    """Return the token budget for ``model``.
+
+    ``CODEXAGENT_MAX_INPUT_TOKENS`` and ``CODEXAGENT_MAX_OUTPUT_TOKENS``
+    lower the limits, e.g. to keep prompts within a useful context size.
+    """
+    budget = MODEL_BUDGETS.get(model, DEFAULT_BUDGET)
+    input_tokens = int(os.getenv("CODEXAGENT_MAX_INPUT_TOKENS", budget.input_tokens))
+    output_tokens = int(
+        os.getenv("CODEXAGENT_MAX_OUTPUT_TOKENS", budget.output_tokens)
+    )
+    return TokenBudget(
+        min(input_tokens, budget.input_tokens),
+        min(output_tokens, budget.output_tokens),
+    )
+
+
+def fit_text(text: str, max_tokens: int) -> str:
+    """Trim ``text`` at a line boundary so it fits in ``max_tokens``.
+
+    Leading lines are kept and a marker line states how many were dropped.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    lines = text.splitlines(keepends=True)
+    marker = "\n... [{} lines truncated to fit the context window]\n"
+    # Reserve room for the marker itself
+    available = max_tokens - estimate_tokens(marker.format(len(lines)))
+    kept: List[str] = []
+    used = 0
+    for line in lines:
+        cost = estimate_tokens(line)
+        if used + cost > available:
+            break
+        kept.append(line)
+        used += cost
+    return "".join(kept) + marker.format(len(lines) - len(kept))
+
+
+def _is_boundary(line: str) -> bool:
+    """Return True if a top-level statement may start at ``line``."""
+    return bool(line.strip()) and not line[0].isspace() and not line.startswith(")")
+
+
+def split_text(text: str, max_tokens: int) -> List[str]:
+    """Split ``text`` into pieces of at most ``max_tokens`` tokens.
+
+    Pieces end at line boundaries, preferably just before a top-level
+    statement so that functions and classes stay whole. A single line longer
+    than the budget becomes its own piece.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    pieces: List[str] = []
+    current: List[str] = []
+    used = 0
+    # Index in ``current`` of the last line starting a top-level statement
+    boundary: Optional[int] = None
+    for line in text.splitlines(keepends=True):
+        cost = estimate_tokens(line)
+        while current and used + cost > max_tokens:
+            cut = boundary if boundary else len(current)
+            pieces.append("".join(current[:cut]))
+            current = current[cut:]
+            used = sum(estimate_tokens(kept) for kept in current)
+            boundary = None
+        # Keep decorators attached to the definition that follows them
+        if current and _is_boundary(line) and not current[-1].startswith("@"):
+            boundary = len(current)
+        current.append(line)
+        used += cost
+    if current:
+        pieces.append("".join(current))
+    return pieces
@@ -0,0 +1,231 @@
+"""Measure docgen symbol extraction on a large generated module and package.
+
+Compares :func:`app.agents.docgen_agent.extract_functions_and_classes`
+(one ``NodeVisitor`` pass, source sliced lazily from a shared buffer) with
+the previous implementation, which walked the whole tree, walked every
+function again to look for classes and copied every symbol's source with
+``ast.unparse``. For the package, the results of every module are kept
+alive, as ``docgen dir`` does, and peak traced memory is reported.
+
+Usage::
+
+    python benchmarks/extract.py --lines 10000 --runs 5 --modules 50
+"""
+
+import argparse
+import ast
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.agents.docgen_agent import extract_functions_and_classes  # noqa: E402
+
+CLASS_TEMPLATE = '''
+
+class Service{index}:
+    """Service {index}."""
+
+    def __init__(self, client, retries=3):
+        self.client = client
+        self.retries = retries
+
+    def fetch(self, key: str) -> dict:
+        """Fetch one record."""
+        for attempt in range(self.retries):
+            value = self.client.get(key, attempt=attempt)
+            if value is not None:
+                return {{"key": key, "value": value}}
+        return {{}}
+
+    async def fetch_many(self, keys):
+        return [await self.client.aget(key) for key in keys]
+
+    class Config:
+        timeout = 30
+
+        def merged(self, other):
+            return {{**vars(self), **vars(other)}}
+
+
+def helper_{index}(items, predicate=None):
+    """Filter items."""
+    result = []
+    for item in items:
+        if predicate is None or predicate(item):
+            result.append(item)
+    return result
+'''
+
+
+def make_module(lines: int) -> str:
+    """Return a module of roughly ``lines`` lines."""
+    chunks: List[str] = ['"""Generated module."""\n']
+    total = 1
+    index = 0
+    while total < lines:
+        chunk = CLASS_TEMPLATE.format(index=index)
+        chunks.append(chunk)
+        total += chunk.count("\n")
+        index += 1
+    return "".join(chunks)
+
+
+@dataclass
+class FunctionInfo:
+    """Record type of the previous extractor."""
+
+    name: str
+    args: List[str]
+    returns: Optional[str]
+    docstring: str
+    source: str
+
+
+@dataclass
+class ClassInfo:
+    """Record type of the previous extractor."""
+
+    name: str
+    methods: List[FunctionInfo] = field(default_factory=list)
+    docstring: str = ""
+    source: str = ""
+
+
+def legacy_extract(code: str) -> Dict[str, Any]:
+    """The extractor this benchmark replaced, for comparison."""
+    tree = ast.parse(code)
+
+    functions = []
+    classes = []
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.FunctionDef):
+            if not any(isinstance(parent, ast.ClassDef) for parent in ast.walk(node)):
+                functions.append(
+                    FunctionInfo(
+                        name=node.name,
+                        args=[arg.arg for arg in node.args.args],
+                        returns=ast.unparse(node.returns) if node.returns else None,
+                        docstring=ast.get_docstring(node) or "",
+                        source=ast.unparse(node),
+                    )
+                )
+        elif isinstance(node, ast.ClassDef):
+            methods = []
+            for item in node.body:
+                if isinstance(item, ast.FunctionDef):
+                    methods.append(
+                        FunctionInfo(
+                            name=item.name,
+                            args=[a.arg for a in item.args.args if a.arg != "self"],
+                            returns=ast.unparse(item.returns) if item.returns else None,
+                            docstring=ast.get_docstring(item) or "",
+                            source=ast.unparse(item),
+                        )
+                    )
+            classes.append(
+                ClassInfo(
+                    name=node.name,
+                    methods=methods,
+                    docstring=ast.get_docstring(node) or "",
+                    source=ast.unparse(node),
+                )
+            )
+
+    return {"functions": functions, "classes": classes}
+
+
+def time_extractor(
+    extract: Callable[[str], Dict[str, Any]], code: str, runs: int
+) -> List[float]:
+    """Run ``extract`` ``runs`` times and return timings in ms."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        extract(code)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def measure_package(
+    extract: Callable[[str], Dict[str, Any]], modules: List[str]
+) -> Dict[str, float]:
+    """Extract every module, keeping all results, and return time and memory."""
+    start = time.perf_counter()
+    results = [extract(code) for code in modules]
+    elapsed = time.perf_counter() - start
+    del results
+
+    tracemalloc.start()
+    results = [extract(code) for code in modules]
+    # Reading the sources is part of the work; the new records slice lazily
+    sources = sum(
+        len(symbol.source)
+        for result in results
+        for symbol in result["functions"] + result["classes"]
+    )
+    _, peak = tracemalloc.get_traced_memory()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return {
+        "seconds": elapsed,
+        "peak_mb": peak / 2**20,
+        "retained_mb": retained / 2**20,
+        "source_chars": sources,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=10_000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--modules", type=int, default=50)
+    parser.add_argument("--module-lines", type=int, default=2_000)
+    args = parser.parse_args()
+
+    code = make_module(args.lines)
+    print(f"module: {code.count(chr(10))} lines")
+    print(f"{'extractor':<24}{'best ms':>10}{'median ms':>12}{'functions':>11}")
+    parse = min(time_extractor(ast.parse, code, args.runs))
+    print(f"{'ast.parse only':<24}{parse:>10.1f}")
+    best = {}
+    for name, extract in (
+        ("legacy (ast.walk)", legacy_extract),
+        ("SymbolExtractor", extract_functions_and_classes),
+    ):
+        timings = time_extractor(extract, code, args.runs)
+        result = extract(code)
+        best[name] = min(timings)
+        print(
+            f"{name:<24}{min(timings):>10.1f}{statistics.median(timings):>12.1f}"
+            f"{len(result['functions']):>11}"
+        )
+    legacy, visitor = best["legacy (ast.walk)"], best["SymbolExtractor"]
+    print(
+        f"speedup: {legacy / visitor:.1f}x overall, "
+        f"{(legacy - parse) / max(visitor - parse, 1e-9):.1f}x excluding parsing"
+    )
+
+    modules = [make_module(args.module_lines) for _ in range(args.modules)]
+    print(f"\npackage: {args.modules} modules of {args.module_lines} lines")
+    print(f"{'extractor':<24}{'seconds':>10}{'peak MB':>10}{'retained MB':>13}")
+    for name, extract in (
+        ("legacy (ast.walk)", legacy_extract),
+        ("SymbolExtractor", extract_functions_and_classes),
+    ):
+        stats = measure_package(extract, modules)
+        print(
+            f"{name:<24}{stats['seconds']:>10.2f}{stats['peak_mb']:>10.1f}"
+            f"{stats['retained_mb']:>13.1f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
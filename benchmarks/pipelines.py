@@ -0,0 +1,133 @@
+"""Measure docgen/refactor/summarize pipeline throughput offline.
+
+Generates a synthetic source tree and runs each pipeline against the
+``synthetic`` LLM backend (fixed latency, optional failure rate), so no
+network access or API key is needed. The response cache is disabled.
+
+Usage::
+
+    python benchmarks/pipelines.py --files 200 --latency 0.2 --jobs 1 8 32
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.llm import gemini  # noqa: E402
+from app.llm.backends import SyntheticBackend  # noqa: E402
+
+MODULE_TEMPLATE = '''"""Synthetic module {index}."""
+
+
+class Record{index}:
+    """A record."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def double(self):
+        return self.value * 2
+
+
+def process_{index}(data, a, b, c, d, e, f):
+    """Function with too many arguments, flagged by the refactor agent."""
+    return [item for item in data if item]
+'''
+
+
+def make_tree(root: str, files: int) -> None:
+    """Write ``files`` small modules spread over a few packages."""
+    for index in range(files):
+        package = os.path.join(root, f"pkg{index % 10}")
+        os.makedirs(package, exist_ok=True)
+        with open(os.path.join(package, f"module_{index}.py"), "w") as f:
+            f.write(MODULE_TEMPLATE.format(index=index))
+
+
+calls = [0]
+
+
+def measure(name: str, files: int, run: Callable[[], object]) -> None:
+    """Run one pipeline and print its wall time and throughput."""
+    calls_before = calls[0]
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<28}{elapsed:>10.2f}{files / elapsed:>12.1f}"
+        f"{calls[0] - calls_before:>10}"
+    )
+
+
+class CountingBackend(SyntheticBackend):
+    """Synthetic backend that counts requests."""
+
+    def generate(self, prompt: str) -> str:
+        calls[0] += 1
+        return super().generate(prompt)
+
+    async def generate_async(self, prompt: str) -> str:
+        calls[0] += 1
+        return await super().generate_async(prompt)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+
+    gemini.set_backend(
+        CountingBackend(
+            latency=args.latency, failure_rate=args.failure_rate, seed=1234
+        )
+    )
+    gemini.configure_cache(enabled=False)
+
+    # Imported after the backend is selected
+    from app.agents.docgen_manifest import document_directory_incremental
+    from app.agents.refactor_agent import refactor_files
+    from app.commands.summarize import summarize_repo
+
+    with tempfile.TemporaryDirectory() as root, tempfile.TemporaryDirectory() as out:
+        make_tree(root, args.files)
+        paths: List[str] = sorted(
+            os.path.join(dirpath, name)
+            for dirpath, _, names in os.walk(root)
+            for name in names
+        )
+        targets = [(path, None) for path in paths]
+
+        print(f"{'pipeline':<28}{'seconds':>10}{'files/s':>12}{'calls':>10}")
+        measure("summarize", args.files, lambda: summarize_repo(root))
+        for jobs in args.jobs:
+            measure(
+                f"docgen dir -j {jobs}",
+                args.files,
+                lambda: list(
+                    document_directory_incremental(
+                        root, os.path.join(out, "manifest.json"), jobs=jobs, full=True
+                    )
+                ),
+            )
+        for jobs in args.jobs:
+            measure(
+                f"refactor dir -j {jobs}",
+                args.files,
+                lambda: list(refactor_files(targets, jobs)),
+            )
+
+    for line in gemini.usage_summary():
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
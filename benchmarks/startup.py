@@ -0,0 +1,88 @@
+"""Measure CodexAgent cold start time.
+
+Runs ``codexagent --help`` and a command that never calls the model
+(``refactor file`` on a file without issues) in fresh interpreters, with
+``GEMINI_API_KEY`` unset, and reports the fastest and median wall-clock time.
+
+Usage::
+
+    python benchmarks/startup.py --runs 20 --max-ms 150
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+CLEAN_SOURCE = 'def add(a, b):\n    """Add two numbers."""\n    return a + b\n'
+
+
+def time_command(args: List[str], runs: int, env: Dict[str, str]) -> List[float]:
+    """Run ``python <args>`` ``runs`` times and return timings in ms."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, *args],
+            env=env,
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        default=150.0,
+        help="Fail if the fastest run of any command is slower than this",
+    )
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.pop("GEMINI_API_KEY", None)
+    env["PYTHONPATH"] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        clean_file = os.path.join(tmp, "clean.py")
+        with open(clean_file, "w", encoding="utf-8") as f:
+            f.write(CLEAN_SOURCE)
+
+        # Warm the OS file cache and bytecode so every run measures the same
+        time_command(["-m", "app.cli", "--help"], 1, env)
+
+        # The bare interpreter is the floor every command pays
+        baseline = time_command(["-c", "pass"], args.runs, env)
+        print(f"{'command':<28}{'min ms':>10}{'median ms':>12}")
+        print(f"{'python (baseline)':<28}{min(baseline):>10.1f}", end="")
+        print(f"{statistics.median(baseline):>12.1f}")
+
+        commands = {
+            "--help": ["-m", "app.cli", "--help"],
+            "refactor file (no LLM)": ["-m", "app.cli", "refactor", "file", clean_file],
+        }
+
+        failed = False
+        for name, command in commands.items():
+            timings = time_command(command, args.runs, env)
+            fastest = min(timings)
+            print(f"{name:<28}{fastest:>10.1f}{statistics.median(timings):>12.1f}")
+            failed = failed or fastest > args.max_ms
+
+    if failed:
+        print(f"FAIL: cold start above {args.max_ms:.0f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
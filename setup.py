@@ -21,7 +21,7 @@ setup(
         "rich>=13.0.0",
         "google-generativeai>=0.3.0",
         "python-dotenv>=1.0.0",
-        "astor>=0.8.1",
+        "numpy>=1.20.0",
     ],
     entry_points={
         "console_scripts": [
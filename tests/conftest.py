@@ -7,6 +7,9 @@ from typing import Any, Generator
 import pytest
 from typer.testing import CliRunner
 
+from app.llm import gemini
+from app.llm.backends import SyntheticBackend
+
 
 @pytest.fixture(scope="session")
 def test_data_dir() -> Path:
@@ -50,6 +53,15 @@ def process_data(data, param1, param2, param3, param4, param5, param6):
     return file_path
 
 
+@pytest.fixture
+def synthetic_backend(monkeypatch: Any) -> SyntheticBackend:
+    """Serve every model call from an offline backend, without the cache."""
+    backend = SyntheticBackend(latency=0.0)
+    monkeypatch.setattr(gemini, "_pinned_backend", backend)
+    monkeypatch.setattr(gemini, "_cache_enabled", False)
+    return backend
+
+
 @pytest.fixture
 def cli_runner() -> CliRunner:
     """Return a CliRunner for testing CLI commands."""
@@ -0,0 +1,138 @@
+"""Tests for the bounded async client and its helpers."""
+
+import asyncio
+from typing import Any, List
+
+import pytest
+
+from app.llm.backends import SyntheticBackend
+from app.llm.gemini import GeminiClient, as_completed_bounded, iterate_blocking
+
+
+def test_as_completed_bounded_pulls_work_lazily() -> None:
+    """Test that no more than ``limit`` coroutines are started at once."""
+    running = [0]
+    peak = [0]
+
+    async def work(index: int) -> int:
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.001 * (index % 3))
+        running[0] -= 1
+        return index
+
+    work_items = (work(index) for index in range(10))
+    results = list(iterate_blocking(as_completed_bounded(work_items, 3)))
+
+    assert sorted(results) == list(range(10))
+    assert peak[0] == 3
+
+
+def test_iterate_blocking_stops_pending_work_early() -> None:
+    """Test that stopping the consumer does not start the remaining work."""
+    started: List[int] = []
+
+    async def work(index: int) -> int:
+        started.append(index)
+        return index
+
+    iterator = iterate_blocking(
+        as_completed_bounded((work(index) for index in range(100)), 2)
+    )
+    first = next(iterator)
+    iterator.close()
+
+    assert first in (0, 1)
+    assert len(started) <= 3
+
+
+def test_client_bounds_concurrent_requests(
+    synthetic_backend: SyntheticBackend, monkeypatch: Any
+) -> None:
+    """Test that the client never has more than max_concurrency calls in flight."""
+    running = [0]
+    peak = [0]
+    generate = synthetic_backend.generate_async
+
+    async def counting_generate(prompt: str) -> str:
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.005)
+        try:
+            return await generate(prompt)
+        finally:
+            running[0] -= 1
+
+    monkeypatch.setattr(synthetic_backend, "generate_async", counting_generate)
+
+    async def run() -> List[str]:
+        client = GeminiClient(max_concurrency=2)
+        return await asyncio.gather(
+            *(client.generate(f"prompt {index}") for index in range(6))
+        )
+
+    responses = asyncio.run(run())
+
+    assert len(responses) == 6
+    assert all(response.startswith("Synthetic response") for response in responses)
+    assert peak[0] == 2
+
+
+def test_as_completed_bounded_yields_in_completion_order() -> None:
+    """Test that fast work is yielded before slow work started earlier."""
+
+    async def work(index: int, delay: float) -> int:
+        await asyncio.sleep(delay)
+        return index
+
+    delays = [0.06, 0.0, 0.04, 0.02]
+    results = list(
+        iterate_blocking(
+            as_completed_bounded(
+                (work(index, delay) for index, delay in enumerate(delays)), 4
+            )
+        )
+    )
+
+    assert results == [1, 3, 2, 0]
+
+
+def test_as_completed_bounded_runs_one_at_a_time_at_limit_one() -> None:
+    """Test that a limit of one (or less) runs work in submission order."""
+    running = [0]
+    peak = [0]
+
+    async def work(index: int) -> int:
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.001 * (3 - index % 3))
+        running[0] -= 1
+        return index
+
+    for limit in (1, 0):
+        items = (work(index) for index in range(6))
+        results = list(iterate_blocking(as_completed_bounded(items, limit)))
+
+        assert results == list(range(6))
+    assert peak[0] == 1
+
+
+def test_as_completed_bounded_cancels_pending_work_on_error() -> None:
+    """Test that an exception propagates and pending work is cancelled."""
+    cancelled: List[int] = []
+
+    async def work(index: int) -> int:
+        if index == 0:
+            raise ValueError("failed")
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(index)
+            raise
+        return index
+
+    items = (work(index) for index in range(10))
+    with pytest.raises(ValueError):
+        list(iterate_blocking(as_completed_bounded(items, 3)))
+
+    assert sorted(cancelled) == [1, 2]
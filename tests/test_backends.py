@@ -0,0 +1,47 @@
+"""Tests for the pluggable LLM backends."""
+
+import json
+from pathlib import Path
+from typing import Any
+
+from app.llm import gemini
+from app.llm.backends import create_backend, prompt_digest
+from app.llm.metrics import MetricsCollector
+
+
+def test_offline_backends_keep_the_routed_model(
+    tmp_path: Path, monkeypatch: Any
+) -> None:
+    """Test that replay and synthetic backends report the model they serve."""
+    cassette = tmp_path / "cassette.jsonl"
+    cassette.write_text(
+        json.dumps({"prompt_sha256": prompt_digest("hi"), "response": "hello"})
+        + "\n"
+    )
+    monkeypatch.setenv("CODEXAGENT_CASSETTE", str(cassette))
+
+    replay = create_backend("replay", "models/gemini-1.5-pro")
+    synthetic = create_backend("synthetic", "models/gemini-1.5-flash")
+
+    assert (replay.model, replay.generate("hi")) == ("models/gemini-1.5-pro", "hello")
+    assert synthetic.model == "models/gemini-1.5-flash"
+
+
+def test_metrics_are_kept_per_routed_model_offline(monkeypatch: Any) -> None:
+    """Test that an escalated call is recorded under the large model."""
+    monkeypatch.setenv("CODEXAGENT_SYNTHETIC_LATENCY", "0")
+    monkeypatch.setattr(gemini, "LLM_BACKEND", "synthetic")
+    monkeypatch.setattr(gemini, "_backends", {})
+    monkeypatch.setattr(gemini, "_pinned_backend", None)
+    monkeypatch.setattr(gemini, "_cache_enabled", False)
+    monkeypatch.setattr(gemini, "_metrics", MetricsCollector())
+
+    _, decisions = gemini.run_routed("refactoring", "x = 1", validate=lambda _: False)
+
+    models = [decision.model for decision in decisions]
+    assert models == [
+        gemini.ROUTING_POLICY.small_model,
+        gemini.ROUTING_POLICY.large_model,
+    ]
+    assert [record.model for record in gemini._metrics.records] == models
+    assert [stats["model"] for stats in gemini.metrics_summary()] == sorted(models)
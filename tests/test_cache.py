@@ -0,0 +1,101 @@
+"""Tests for the on-disk response cache."""
+
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+
+from app.llm import cache as cache_module
+from app.llm.cache import ResponseCache, make_cache_key
+
+
+@pytest.fixture
+def clock(monkeypatch: Any) -> List[float]:
+    """Replace the cache's clock with one advanced by hand."""
+    now = [1_000_000.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+    return now
+
+
+def test_cache_key_depends_on_model_settings_and_prompt() -> None:
+    """Test that every part of a request changes its key."""
+    key = make_cache_key("model", {"temperature": 0.2}, "prompt")
+    assert key == make_cache_key("model", {"temperature": 0.2}, "prompt")
+    assert key != make_cache_key("other", {"temperature": 0.2}, "prompt")
+    assert key != make_cache_key("model", {"temperature": 0.3}, "prompt")
+    assert key != make_cache_key("model", {"temperature": 0.2}, "prompt2")
+
+
+def test_get_and_set_round_trip(tmp_path: Path) -> None:
+    """Test that stored responses come back and misses are counted."""
+    cache = ResponseCache(str(tmp_path / "cache.db"))
+    try:
+        assert cache.get("missing") is None
+        cache.set("key", "response " * 100)
+        assert cache.get("key") == "response " * 100
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+    finally:
+        cache.close()
+
+
+def test_lru_eviction_keeps_recently_used_entries(
+    tmp_path: Path, clock: List[float]
+) -> None:
+    """Test that the least recently used entries are evicted over the size limit."""
+    cache = ResponseCache(str(tmp_path / "cache.db"), max_bytes=250, compress=False)
+    try:
+        for key in ("a", "b"):
+            cache.set(key, key * 100)
+            clock[0] += 1
+        # Reading "a" makes "b" the least recently used entry
+        assert cache.get("a") == "a" * 100
+        clock[0] += 1
+        cache.set("c", "c" * 100)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == "a" * 100
+        assert cache.get("c") == "c" * 100
+        assert cache.stats()["bytes"] <= 250
+    finally:
+        cache.close()
+
+
+def test_expired_entries_are_dropped(tmp_path: Path, clock: List[float]) -> None:
+    """Test that entries older than max_age are misses and get evicted."""
+    cache = ResponseCache(str(tmp_path / "cache.db"), max_age=60)
+    try:
+        cache.set("old", "value")
+        clock[0] += 61
+        assert cache.get("old") is None
+        assert cache.evict() == 1
+        assert cache.stats()["entries"] == 0
+    finally:
+        cache.close()
+
+
+def test_writes_under_the_limit_do_not_evict(
+    tmp_path: Path, clock: List[float], monkeypatch: Any
+) -> None:
+    """Test that eviction only runs once the running total crosses the limit."""
+    cache = ResponseCache(str(tmp_path / "cache.db"), max_bytes=1000, compress=False)
+    evictions: List[int] = []
+    evict = cache.evict
+    monkeypatch.setattr(cache, "evict", lambda: evictions.append(evict()) or 0)
+    try:
+        for index in range(9):
+            cache.set(str(index), "x" * 100)
+            clock[0] += 1
+        # Replacing an entry does not count its old size twice
+        cache.set("0", "y" * 100)
+        clock[0] += 1
+        assert evictions == []
+
+        # Over the limit, space is freed down to EVICT_TO of it
+        cache.set("9", "x" * 200)
+        assert evictions == [2]
+        assert cache.get("1") is None
+        assert cache.get("0") == "y" * 100
+        assert cache.stats()["bytes"] == 1000 * cache_module.EVICT_TO
+    finally:
+        cache.close()
@@ -0,0 +1,100 @@
+"""Tests for the checkpoint journal of resumable runs."""
+
+import json
+from pathlib import Path
+
+from app.agents.checkpoint import CheckpointJournal, content_digest, file_digest
+
+OPTIONS = {"style": "numpy"}
+
+
+def write_journal(path: Path) -> None:
+    """Write a journal with two completed units."""
+    with CheckpointJournal(str(path), OPTIONS) as journal:
+        journal.record("a.py", "hash-a", {"doc": "A"})
+        journal.record("b.py", "hash-b", {"doc": "B"})
+
+
+def test_resume_replays_completed_units(tmp_path: Path) -> None:
+    """Test that a resumed journal returns results of unchanged units only."""
+    path = tmp_path / "run.journal"
+    write_journal(path)
+
+    with CheckpointJournal(str(path), OPTIONS, resume=True) as journal:
+        assert journal.resumed
+        assert journal.lookup("a.py", "hash-a") == {"doc": "A"}
+        assert journal.lookup("a.py", "changed") is None
+        assert journal.lookup("c.py", "hash-c") is None
+        assert journal.lookup("a.py", None) is None
+
+
+def test_torn_last_line_is_skipped(tmp_path: Path) -> None:
+    """Test that a record cut short by a crash is ignored and appended after."""
+    path = tmp_path / "run.journal"
+    write_journal(path)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"key": "c.py", "hash": "hash-c", "res')
+
+    with CheckpointJournal(str(path), OPTIONS, resume=True) as journal:
+        assert set(journal.entries) == {"a.py", "b.py"}
+        journal.record("c.py", "hash-c", {"doc": "C"})
+
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert json.loads(lines[-1])["key"] == "c.py"
+    with CheckpointJournal(str(path), OPTIONS, resume=True) as journal:
+        assert journal.lookup("c.py", "hash-c") == {"doc": "C"}
+
+
+def test_records_without_a_key_are_skipped(tmp_path: Path) -> None:
+    """Test that well-formed lines that are not records are ignored."""
+    path = tmp_path / "run.journal"
+    write_journal(path)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"hash": "hash-c", "result": {}}\n42\n')
+
+    with CheckpointJournal(str(path), OPTIONS, resume=True) as journal:
+        assert set(journal.entries) == {"a.py", "b.py"}
+
+
+def test_recorded_results_are_not_kept_in_memory(tmp_path: Path) -> None:
+    """Test that a run only holds the entries it resumed from."""
+    path = tmp_path / "run.journal"
+    with CheckpointJournal(str(path), OPTIONS) as journal:
+        journal.record("a.py", "hash-a", {"doc": "A" * 1000})
+        assert journal.entries == {}
+        assert journal.lookup("a.py", "hash-a") is None
+
+    with CheckpointJournal(str(path), OPTIONS, resume=True) as journal:
+        assert journal.lookup("a.py", "hash-a") == {"doc": "A" * 1000}
+
+
+def test_options_mismatch_starts_afresh(tmp_path: Path) -> None:
+    """Test that a journal written with other options is not resumed."""
+    path = tmp_path / "run.journal"
+    write_journal(path)
+
+    with CheckpointJournal(str(path), {"style": "google"}, resume=True) as journal:
+        assert not journal.resumed
+        assert journal.entries == {}
+
+    header = json.loads(path.read_text(encoding="utf-8").splitlines()[0])
+    assert header["options"] == {"style": "google"}
+
+
+def test_without_resume_the_journal_is_truncated(tmp_path: Path) -> None:
+    """Test that a fresh run does not keep an old journal's records."""
+    path = tmp_path / "run.journal"
+    write_journal(path)
+
+    with CheckpointJournal(str(path), OPTIONS) as journal:
+        assert not journal.resumed
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 1
+
+
+def test_file_digest(tmp_path: Path) -> None:
+    """Test that file digests match content digests and missing files give None."""
+    path = tmp_path / "module.py"
+    path.write_bytes(b"x = 1\n")
+
+    assert file_digest(str(path)) == content_digest(b"x = 1\n")
+    assert file_digest(str(tmp_path / "missing.py")) is None
@@ -0,0 +1,56 @@
+"""Tests for lazy CLI start-up."""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import List
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Runs the CLI and reports whether the Gemini SDK was imported
+SCRIPT = """
+import sys
+from app.cli import app
+try:
+    app(sys.argv[1:])
+except SystemExit:
+    pass
+print("sdk imported:", "google.generativeai" in sys.modules)
+"""
+
+
+def run_cli(args: List[str]) -> str:
+    """Run the CLI in a fresh interpreter without an API key."""
+    env = {key: value for key, value in os.environ.items() if key != "GEMINI_API_KEY"}
+    env["PYTHONPATH"] = str(ROOT)
+    completed = subprocess.run(
+        [sys.executable, "-c", SCRIPT, *args],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return completed.stdout
+
+
+@pytest.mark.parametrize("args", [["--help"], ["docgen", "--help"]])
+def test_help_does_not_import_the_sdk(args: List[str]) -> None:
+    """Test that help output needs neither the Gemini SDK nor an API key."""
+    output = run_cli(args)
+
+    assert "Usage:" in output
+    assert output.rstrip().endswith("sdk imported: False")
+
+
+def test_local_command_runs_without_the_sdk(tmp_path: Path) -> None:
+    """Test that a command that never calls the model does not load the SDK."""
+    clean = tmp_path / "clean.py"
+    clean.write_text('def add(a, b):\n    """Add two numbers."""\n    return a + b\n')
+
+    output = run_cli(["refactor", "file", str(clean), "--no-cache"])
+
+    assert output.rstrip().endswith("sdk imported: False")
@@ -0,0 +1,139 @@
+"""Tests for inserting generated docstrings into source files."""
+
+import ast
+import difflib
+import os
+import stat
+from pathlib import Path
+
+from app.agents.docgen_apply import (
+    clean_docstring,
+    find_missing_docstrings,
+    format_docstring,
+    insert_docstrings,
+)
+from app.commands.docgen import write_atomic
+
+CODE = '''class Service:
+    def run(self, job):
+        return job
+
+    @property
+    def name(self):
+        return "service"
+
+
+def helper():  # keep this comment
+    if True:
+        pass
+
+
+def one_liner(): pass
+'''
+
+DOCSTRINGS = {
+    "Service": "A service.",
+    "Service.run": "Run a job.\n\nArgs:\n    job: The job",
+    "helper": "Help.",
+}
+
+
+def test_finds_missing_docstrings() -> None:
+    """Test that nested definitions are found and one-liners skipped."""
+    missing, skipped = find_missing_docstrings(CODE)
+
+    assert [symbol.qualname for symbol in missing] == [
+        "Service",
+        "Service.run",
+        "Service.name",
+        "helper",
+    ]
+    assert [symbol.kind for symbol in missing] == [
+        "class",
+        "method",
+        "method",
+        "function",
+    ]
+    assert skipped == ["one_liner"]
+
+
+def test_inserts_at_the_body_indentation() -> None:
+    """Test that docstrings are indented like their body and nothing else moves."""
+    missing, _ = find_missing_docstrings(CODE)
+    updated = insert_docstrings(CODE, missing, DOCSTRINGS)
+
+    run_docstring = '        """Run a job.\n\n        Args:\n            job: The job\n'
+    assert run_docstring in updated
+    assert '    """A service."""\n    def run' in updated
+    assert 'def helper():  # keep this comment\n    """Help."""\n' in updated
+    # Symbols without a docstring are left alone
+    assert "def name(self):\n        return" in updated
+    tree = ast.parse(updated)
+    assert ast.get_docstring(tree.body[0]) == "A service."
+    matcher = difflib.SequenceMatcher(a=CODE.splitlines(), b=updated.splitlines())
+    assert {tag for tag, *_ in matcher.get_opcodes()} == {"equal", "insert"}
+
+
+def test_keeps_crlf_line_endings() -> None:
+    """Test that Windows line endings are used for inserted lines too."""
+    code = CODE.replace("\n", "\r\n")
+    missing, _ = find_missing_docstrings(code)
+    updated = insert_docstrings(code, missing, DOCSTRINGS)
+
+    assert "\n" not in updated.replace("\r\n", "")
+    assert updated.replace("\r\n", "\n") == insert_docstrings(
+        CODE, find_missing_docstrings(CODE)[0], DOCSTRINGS
+    )
+
+
+def test_clean_docstring_strips_fences_and_quotes() -> None:
+    """Test that model decoration around a docstring is removed."""
+    assert clean_docstring('```python\n"""Do it.\n\n    More."""\n```') == (
+        "Do it.\n\nMore."
+    )
+    assert clean_docstring("  Plain text.  ") == "Plain text."
+
+
+
+def docstring_of(text: str) -> str:
+    """Insert ``text`` as a function's docstring and read it back."""
+    code = "def f():\n    return 1\n"
+    missing, _ = find_missing_docstrings(code)
+    updated = insert_docstrings(code, missing, {"f": text})
+    return ast.get_docstring(ast.parse(updated).body[0]) or ""
+
+
+def test_docstring_ending_in_quote() -> None:
+    """Test that a final quote does not run into the closing quotes."""
+    assert format_docstring('Return "x"', "") == '"""Return "x\\""""\n'
+    assert docstring_of('Return "x"') == 'Return "x"'
+    assert docstring_of('Quote """this"""') == 'Quote """this"""'
+    assert docstring_of('Two lines.\n\nThe second ends in "y"') == (
+        'Two lines.\n\nThe second ends in "y"'
+    )
+
+
+def test_docstring_ending_in_backslash() -> None:
+    """Test that a final backslash does not escape the closing quotes."""
+    assert docstring_of("Split on \\") == "Split on \\"
+    assert docstring_of('Escaped \\"') == 'Escaped \\"'
+
+
+def test_write_atomic_keeps_permissions(tmp_path: Path) -> None:
+    """Test that rewritten files keep their mode and new files follow the umask."""
+    existing = tmp_path / "script.py"
+    existing.write_text("old")
+    existing.chmod(0o755)
+    write_atomic(str(existing), "new")
+
+    assert existing.read_text() == "new"
+    assert stat.S_IMODE(existing.stat().st_mode) == 0o755
+
+    umask = os.umask(0o022)
+    try:
+        created = tmp_path / "sub" / "created.md"
+        write_atomic(str(created), "text")
+    finally:
+        os.umask(umask)
+    assert stat.S_IMODE(created.stat().st_mode) == 0o644
+    assert [path.name for path in created.parent.iterdir()] == ["created.md"]
@@ -0,0 +1,131 @@
+"""Tests for map-reduce documentation of oversized modules."""
+
+import asyncio
+import json
+import re
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+
+from app.agents.docgen_agent import (
+    document_chunks,
+    generate_documentation_chunked,
+    reduce_documents,
+)
+from app.agents.docgen_manifest import OVERVIEW_NAME, document_directory_incremental
+from app.llm import gemini
+from app.llm.backends import SyntheticBackend
+from app.llm.gemini import GeminiClient
+from app.llm.metrics import MetricsCollector
+from app.llm.tokens import estimate_tokens
+
+STRUCTURE = "".join(
+    f"Function: function_{index}\nArguments: a, b\nDocstring: Add numbers.\n\n"
+    for index in range(12)
+)
+
+
+@pytest.fixture
+def prompts(synthetic_backend: SyntheticBackend, monkeypatch: Any) -> List[str]:
+    """Record the prompts sent to the synthetic backend, and fresh metrics."""
+    sent: List[str] = []
+    generate = synthetic_backend.generate_async
+
+    async def recording_generate(prompt: str) -> str:
+        sent.append(prompt)
+        return await generate(prompt)
+
+    monkeypatch.setattr(synthetic_backend, "generate_async", recording_generate)
+    monkeypatch.setattr(gemini, "_metrics", MetricsCollector())
+    return sent
+
+
+def test_map_documents_every_chunk_in_order(prompts: List[str]) -> None:
+    """Test that each chunk gets one request and the documents keep order."""
+    chunk_tokens = estimate_tokens(STRUCTURE) // 3
+
+    docs = asyncio.run(
+        document_chunks(STRUCTURE, GeminiClient(), "numpy", chunk_tokens)
+    )
+
+    total = len(docs)
+    assert total >= 3
+    parts = sorted(re.findall(r"part (\d+) of (\d+)", "".join(prompts)))
+    assert parts == sorted((str(index), str(total)) for index in range(1, total + 1))
+    assert {record.stage for record in gemini._metrics.records} == {"map"}
+
+
+@pytest.mark.parametrize(
+    "fanin, calls",
+    [
+        # 10 -> 4 -> 2 -> 1
+        (3, 7),
+        # 10 -> 1
+        (10, 1),
+        # Fan-in below two is raised to two: 10 -> 5 -> 3 -> 2 -> 1
+        (1, 11),
+    ],
+)
+def test_reduce_combines_fanin_documents_per_call(
+    prompts: List[str], fanin: int, calls: int
+) -> None:
+    """Test the number of reduce rounds and that only the last is final."""
+    docs = [f"Documentation of part {index}." for index in range(10)]
+
+    overview = asyncio.run(reduce_documents(docs, GeminiClient(), fanin))
+
+    assert len(prompts) == calls
+    assert ["Write the module overview" in prompt for prompt in prompts] == [False] * (
+        calls - 1
+    ) + [True]
+    assert max(prompt.count("--- Part ") for prompt in prompts) <= max(2, fanin)
+    assert overview.startswith("Synthetic response")
+    assert {record.stage for record in gemini._metrics.records} == {"reduce"}
+
+
+def test_chunked_document_starts_with_the_overview(prompts: List[str]) -> None:
+    """Test that the overview comes before the chunk documents."""
+    chunk_tokens = estimate_tokens(STRUCTURE) // 2
+
+    document = asyncio.run(
+        generate_documentation_chunked(
+            STRUCTURE, GeminiClient(), chunk_tokens=chunk_tokens, reduce_fanin=8
+        )
+    )
+
+    map_prompts = [prompt for prompt in prompts if "Code Structure:" in prompt]
+    assert len(prompts) == len(map_prompts) + 1
+    assert document.count("Synthetic response") == len(prompts)
+    assert document.index("Synthetic response") == 0
+
+
+def test_docgen_dir_stores_the_overview_of_large_files(
+    tmp_path: Path, prompts: List[str]
+) -> None:
+    """Test that large files get an overview that is reused when unchanged."""
+    source = tmp_path / "src"
+    source.mkdir()
+    (source / "big.py").write_text(
+        "".join(
+            f"def function_{index}(a, b):\n    return a + b\n\n\n"
+            for index in range(12)
+        )
+    )
+    manifest = tmp_path / "manifest.json"
+
+    def run() -> str:
+        ((_, doc, error),) = document_directory_incremental(
+            str(source), str(manifest), chunk_tokens=40, reduce_fanin=4
+        )
+        assert error is None
+        return doc
+
+    first = run()
+    sent = len(prompts)
+    entries = json.loads(manifest.read_text())["files"]["big.py"]
+
+    assert any("Write the module overview" in prompt for prompt in prompts)
+    assert first.startswith(entries[OVERVIEW_NAME]["doc"])
+    assert run() == first
+    assert len(prompts) == sent
@@ -0,0 +1,91 @@
+"""Tests for symbol extraction in the docgen agent."""
+
+from app.agents.docgen_agent import extract_functions_and_classes
+
+CODE = '''import functools
+
+
+@functools.lru_cache()
+def cached(value: int) -> int:
+    """Return the value."""
+    def local_helper():
+        return value
+    return local_helper()
+
+
+async def fetch(url, timeout=1):
+    return url
+
+
+class Outer:
+    """Outer class."""
+
+    def method(self, x):
+        # A comment kept in the source
+        return x
+
+    class Inner:
+        async def run(self):
+            pass
+'''
+
+
+def test_extracts_functions_and_qualified_classes() -> None:
+    """Test that module-level functions and nested classes are found once."""
+    info = extract_functions_and_classes(CODE)
+
+    assert [f.qualname for f in info["functions"]] == ["cached", "fetch"]
+    assert [c.qualname for c in info["classes"]] == ["Outer", "Outer.Inner"]
+    outer, inner = info["classes"]
+    assert [m.qualname for m in outer.methods] == ["Outer.method"]
+    assert [m.qualname for m in inner.methods] == ["Outer.Inner.run"]
+
+
+def test_function_details() -> None:
+    """Test arguments, annotations, async flags and docstrings."""
+    cached, fetch = extract_functions_and_classes(CODE)["functions"]
+    method = extract_functions_and_classes(CODE)["classes"][0].methods[0]
+
+    assert cached.args == ["value"]
+    assert cached.returns == "int"
+    assert cached.docstring == "Return the value."
+    assert not cached.is_async
+    assert fetch.is_async
+    assert fetch.args == ["url", "timeout"]
+    assert method.args == ["x"]
+
+
+def test_source_spans_include_decorators_and_comments() -> None:
+    """Test that sources are sliced verbatim, decorators included."""
+    info = extract_functions_and_classes(CODE)
+    cached = info["functions"][0]
+    method = info["classes"][0].methods[0]
+
+    assert cached.source.startswith("@functools.lru_cache()\ndef cached")
+    assert "local_helper" in cached.source
+    assert "# A comment kept in the source" in method.source
+    assert (cached.lineno, cached.end_lineno) == (4, 9)
+
+
+def test_digests_ignore_formatting_but_not_changes() -> None:
+    """Test that digests only change when the AST does."""
+    original = extract_functions_and_classes(CODE, digests=True)
+    reformatted = extract_functions_and_classes(
+        CODE.replace("# A comment kept in the source", "# Another comment").replace(
+            "(url, timeout=1)", "(url,  timeout = 1)"
+        ),
+        digests=True,
+    )
+    changed = extract_functions_and_classes(
+        CODE.replace("return x", "return x + 1"), digests=True
+    )
+
+    assert original["functions"][0].digest
+    assert [f.digest for f in original["functions"]] == [
+        f.digest for f in reformatted["functions"]
+    ]
+    assert original["classes"][0].digest == reformatted["classes"][0].digest
+    assert original["classes"][0].digest != changed["classes"][0].digest
+    # Nested classes are part of their module-level class's digest
+    assert original["classes"][1].digest == ""
+    assert extract_functions_and_classes(CODE)["functions"][0].digest == ""
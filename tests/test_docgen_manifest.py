@@ -0,0 +1,124 @@
+"""Tests for incremental directory documentation."""
+
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pytest
+from typer.testing import CliRunner
+
+from app.agents.docgen_manifest import DocManifest, document_directory_incremental
+from app.cli import app
+from app.llm.backends import SyntheticBackend
+
+MODULE = '''def first(a):
+    return a
+
+
+class Second:
+    def method(self):
+        return 2
+'''
+
+
+@pytest.fixture
+def prompts(synthetic_backend: SyntheticBackend, monkeypatch: Any) -> List[str]:
+    """Record the prompts sent to the synthetic backend."""
+    sent: List[str] = []
+    generate = synthetic_backend.generate_async
+
+    async def recording_generate(prompt: str) -> str:
+        sent.append(prompt)
+        return await generate(prompt)
+
+    monkeypatch.setattr(synthetic_backend, "generate_async", recording_generate)
+    return sent
+
+
+def document(
+    source: Path, manifest: Path, style: str = "numpy"
+) -> Dict[str, Optional[str]]:
+    """Document a directory and return the documentation by file name."""
+    return {
+        Path(path).name: doc
+        for path, doc, _ in document_directory_incremental(
+            str(source), str(manifest), style=style
+        )
+    }
+
+
+def test_unchanged_symbols_are_reused(tmp_path: Path, prompts: List[str]) -> None:
+    """Test that only changed symbols are sent again."""
+    source = tmp_path / "src"
+    source.mkdir()
+    module = source / "module.py"
+    module.write_text(MODULE)
+    manifest = tmp_path / "docs" / "manifest.json"
+
+    first_docs = document(source, manifest)
+    assert "## first" in first_docs["module.py"]
+    assert "## Second" in first_docs["module.py"]
+    sent = len(prompts)
+    assert sent >= 1
+
+    # Comments and formatting do not change a symbol's hash
+    module.write_text(MODULE.replace("def first(a):", "def first( a ):  # same"))
+    assert document(source, manifest) == first_docs
+    assert len(prompts) == sent
+
+    module.write_text(MODULE.replace("return 2", "return 3"))
+    document(source, manifest)
+    assert len(prompts) == sent + 1
+    assert "Second" in prompts[-1]
+    assert "def first" not in prompts[-1]
+
+
+def test_style_change_invalidates_manifest(tmp_path: Path, prompts: List[str]) -> None:
+    """Test that entries are not reused for another documentation style."""
+    source = tmp_path / "src"
+    source.mkdir()
+    (source / "module.py").write_text(MODULE)
+    manifest = tmp_path / "manifest.json"
+
+    document(source, manifest)
+    sent = len(prompts)
+    assert DocManifest(str(manifest), "numpy").files
+    assert not DocManifest(str(manifest), "google").files
+
+    document(source, manifest, style="google")
+    assert len(prompts) > sent
+
+
+def test_files_without_symbols_are_skipped(
+    tmp_path: Path, prompts: List[str]
+) -> None:
+    """Test that modules without functions or classes yield no documentation."""
+    source = tmp_path / "src"
+    source.mkdir()
+    (source / "__init__.py").write_text("VERSION = 1\n")
+
+    assert document(source, tmp_path / "manifest.json") == {"__init__.py": None}
+    assert prompts == []
+
+
+def test_failed_files_keep_their_documentation(
+    tmp_path: Path, prompts: List[str], cli_runner: CliRunner
+) -> None:
+    """Test that a failed file is reported without overwriting its document."""
+    source = tmp_path / "src"
+    source.mkdir()
+    module = source / "module.py"
+    module.write_text(MODULE)
+    output = tmp_path / "docs"
+    args = ["docgen", "dir", str(source), "--output", str(output)]
+
+    assert cli_runner.invoke(app, args).exit_code == 0
+    document_path = output / "module.py.md"
+    previous = document_path.read_text()
+
+    module.write_text("def broken(:\n")
+    result = cli_runner.invoke(app, args)
+
+    assert result.exit_code == 1
+    assert "Error processing" in result.output
+    assert "Documentation generated" not in result.output
+    assert document_path.read_text() == previous
@@ -0,0 +1,63 @@
+"""Tests for call metrics and cost reporting."""
+
+from typing import Any
+
+import pytest
+
+from app.llm.metrics import CallRecord, MetricsCollector, get_prices
+
+
+def collector() -> MetricsCollector:
+    """Return a collector with two sent calls and one cache hit."""
+    metrics = MetricsCollector()
+    for cached in (False, False, True):
+        metrics.record(
+            CallRecord(
+                command="docgen dir",
+                model="models/gemini-1.5-pro",
+                latency=0.5,
+                prompt_tokens=1_000_000,
+                response_tokens=100_000,
+                cached=cached,
+            )
+        )
+    return metrics
+
+
+def test_cost_uses_model_prices() -> None:
+    """Test that sent calls are priced and cache hits are free."""
+    (stats,) = collector().summary()
+
+    assert stats["calls"] == 3
+    assert stats["cached"] == 1
+    assert stats["cost_usd"] == pytest.approx(2 * (1.25 + 0.5))
+
+
+def test_prices_can_be_overridden(monkeypatch: Any) -> None:
+    """Test that CODEXAGENT_PRICES replaces and adds prices."""
+    monkeypatch.setenv(
+        "CODEXAGENT_PRICES", '{"gemini-1.5-pro": [2, 10], "synthetic": [1, 1]}'
+    )
+    prices = get_prices()
+
+    assert prices["models/gemini-1.5-pro"].input == 2.0
+    assert prices["synthetic"].output == 1.0
+    assert collector().summary()[0]["cost_usd"] == pytest.approx(2 * (2 + 1))
+
+    monkeypatch.setenv("CODEXAGENT_PRICES", "[1, 2]")
+    with pytest.raises(ValueError, match="CODEXAGENT_PRICES"):
+        get_prices()
+
+
+def test_cost_in_every_output() -> None:
+    """Test that the table, Prometheus and JSON outputs report the cost."""
+    metrics = collector()
+
+    header, row = metrics.table()
+    assert header.rstrip().endswith("cost")
+    assert row.rstrip().endswith("$3.5000")
+    assert (
+        'codexagent_llm_cost_usd_total{command="docgen dir",stage="",'
+        'model="models/gemini-1.5-pro"} 3.500000'
+    ) in metrics.to_prometheus()
+    assert metrics.to_json()["cost_usd"] == pytest.approx(3.5)
@@ -0,0 +1,118 @@
+"""Tests for the code metrics index."""
+
+import os
+import sqlite3
+from pathlib import Path
+from typing import Any
+
+import pytest
+from typer.testing import CliRunner
+
+from app.agents.metrics_index import health_report, index_tree, open_index
+from app.agents.quality_rules import QualityThresholds
+from app.cli import app
+
+MANY_ARGUMENTS = "def wide(a, b, c, d):\n    return a\n"
+
+
+@pytest.fixture
+def conn(tmp_path: Path) -> Any:
+    """Open an index database in a temporary directory."""
+    connection = open_index(str(tmp_path / "index.sqlite"))
+    yield connection
+    connection.close()
+
+
+def make_repo(root: Path, files: int = 3) -> Path:
+    """Write a small repository whose functions take four arguments."""
+    root.mkdir()
+    for index in range(files):
+        (root / f"module_{index}.py").write_text(MANY_ARGUMENTS)
+    return root
+
+
+def issue_count(conn: sqlite3.Connection, repo: Path) -> int:
+    """Return the number of issues indexed for a repository."""
+    return conn.execute(
+        "SELECT COALESCE(SUM(issues), 0) FROM files WHERE repo = ?",
+        (os.path.realpath(repo),),
+    ).fetchone()[0]
+
+
+def test_incremental_update(tmp_path: Path, conn: sqlite3.Connection) -> None:
+    """Test that only changed files are analyzed again."""
+    repo = make_repo(tmp_path / "repo")
+    first = index_tree(conn, str(repo))
+    assert (first.files, first.analyzed, first.unchanged) == (3, 3, 0)
+
+    again = index_tree(conn, str(repo))
+    assert (again.analyzed, again.unchanged) == (0, 3)
+
+    # Touched but identical content is not analyzed again
+    module = repo / "module_0.py"
+    os.utime(module, (1, 1))
+    (repo / "module_1.py").write_text(MANY_ARGUMENTS + "\n\ndef extra():\n    pass\n")
+    (repo / "module_2.py").unlink()
+    update = index_tree(conn, str(repo))
+
+    assert (update.files, update.analyzed, update.unchanged) == (2, 1, 1)
+    assert update.removed == 1
+    functions = conn.execute("SELECT qualname FROM functions ORDER BY qualname")
+    assert [row["qualname"] for row in functions] == ["extra", "wide", "wide"]
+
+
+def test_threshold_change_reanalyzes_every_repository(
+    tmp_path: Path, conn: sqlite3.Connection
+) -> None:
+    """Test that each repository is re-analyzed under new thresholds."""
+    first = make_repo(tmp_path / "first")
+    second = make_repo(tmp_path / "second")
+    lenient = QualityThresholds(max_arguments=5)
+    strict = QualityThresholds(max_arguments=3)
+    for repo in (first, second):
+        index_tree(conn, str(repo), thresholds=lenient)
+        assert issue_count(conn, repo) == 0
+
+    for repo in (first, second):
+        stats = index_tree(conn, str(repo), thresholds=strict)
+        assert (stats.analyzed, stats.unchanged) == (3, 0)
+        assert issue_count(conn, repo) == 3
+
+    assert index_tree(conn, str(second), thresholds=strict).analyzed == 0
+
+
+def test_health_report_outliers(tmp_path: Path, conn: sqlite3.Connection) -> None:
+    """Test that functions far above the quartiles are reported as outliers."""
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    small = "".join(f"def small_{i}(a):\n    return a\n\n\n" for i in range(10))
+    branches = "".join(f"    if x == {i}:\n        return {i}\n" for i in range(12))
+    (repo / "module.py").write_text(small + f"def big(x):\n{branches}    return x\n")
+    index_tree(conn, str(repo))
+
+    report = health_report(conn, str(repo), outliers=3)
+
+    assert report["totals"]["functions"] == 11
+    complexity = report["metrics"]["complexity"]
+    assert complexity["p50"] == 1.0
+    assert complexity["max"] == 13.0
+    assert complexity["outliers"] == 1
+    (outlier,) = report["outliers"]["complexity"]
+    assert (outlier["qualname"], outlier["value"]) == ("big", 13)
+    assert report["outliers"]["arguments"] == []
+
+
+def test_report_rejects_incompatible_index(
+    tmp_path: Path, cli_runner: CliRunner
+) -> None:
+    """Test that a schema mismatch is reported without a traceback."""
+    db = tmp_path / "index.sqlite"
+    connection = sqlite3.connect(db)
+    connection.execute("PRAGMA user_version=99")
+    connection.close()
+
+    result = cli_runner.invoke(app, ["index", "report", "--db", str(db)])
+
+    assert result.exit_code == 1
+    assert "schema version 99" in result.output
+    assert result.exception is None or isinstance(result.exception, SystemExit)
@@ -0,0 +1,115 @@
+"""Tests for the quality rule engine and its function metrics."""
+
+import ast
+from typing import Any
+
+import pytest
+
+from app.agents.quality_rules import (
+    FunctionNode,
+    FunctionRule,
+    FunctionStats,
+    QualityThresholds,
+    RuleEngine,
+    function_stats,
+)
+
+GRADE = '''
+def grade(score):
+    if score > 90:
+        return "A"
+    elif score > 80:
+        return "B"
+    elif score > 70 and score < 75:
+        return "C"
+    return "D"
+'''
+
+FETCH = '''
+async def fetch(urls):
+    def helper(url):
+        if url:
+            for part in url:
+                if part:
+                    return part
+        return None
+
+    results = []
+    async for url in urls:
+        async with url as response:
+            try:
+                results.append([x for x in response if x])
+            except ValueError:
+                return None
+    return results
+'''
+
+
+def function(code: str, name: str) -> FunctionNode:
+    """Return the definition of function ``name`` in ``code``."""
+    for node in ast.walk(ast.parse(code)):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            if node.name == name:
+                return node
+    raise LookupError(name)
+
+
+def test_elif_counts_as_a_branch_but_not_as_nesting() -> None:
+    """Test the metrics of an if/elif chain with a boolean condition."""
+    assert function_stats(function(GRADE, "grade")) == FunctionStats(
+        complexity=5, nesting=1, returns=4, branches=3
+    )
+
+
+def test_nested_functions_are_measured_on_their_own() -> None:
+    """Test that a nested function does not count against its parent."""
+    assert function_stats(function(FETCH, "fetch")) == FunctionStats(
+        complexity=5, nesting=3, returns=2, branches=2
+    )
+    assert function_stats(function(FETCH, "helper")) == FunctionStats(
+        complexity=4, nesting=3, returns=2, branches=3
+    )
+
+
+def test_rules_report_metrics_over_their_thresholds() -> None:
+    """Test that each rule fires only above its threshold."""
+    thresholds = QualityThresholds(
+        max_complexity=4, max_nesting=2, max_returns=3, max_branches=2
+    )
+    messages = [
+        issue.message
+        for issue in RuleEngine(thresholds=thresholds).run(ast.parse(FETCH + GRADE))
+    ]
+
+    assert messages == [
+        "Function 'fetch' has a cyclomatic complexity of 5. "
+        "Consider simplifying its control flow.",
+        "Function 'fetch' nests blocks 3 levels deep. Consider flattening it.",
+        "Function 'helper' nests blocks 3 levels deep. Consider flattening it.",
+        "Function 'helper' has 3 branches. Consider splitting it.",
+        "Function 'grade' has a cyclomatic complexity of 5. "
+        "Consider simplifying its control flow.",
+        "Function 'grade' has 4 return statements. "
+        "Consider a single exit point or smaller functions.",
+        "Function 'grade' has 3 branches. Consider splitting it.",
+    ]
+
+
+def test_thresholds_from_env(monkeypatch: Any) -> None:
+    """Test that thresholds are read from CODEXAGENT_QUALITY_* variables."""
+    monkeypatch.setenv("CODEXAGENT_QUALITY_MAX_COMPLEXITY", "3")
+    monkeypatch.setenv("CODEXAGENT_QUALITY_MAX_BRANCHES", "20")
+
+    assert QualityThresholds.from_env() == QualityThresholds(
+        max_complexity=3, max_branches=20
+    )
+
+
+def test_incomplete_rule_cannot_be_instantiated() -> None:
+    """Test that a rule without check_function fails when it is created."""
+
+    class Incomplete(FunctionRule):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,137 @@
+"""Tests for budgeted, prioritized refactoring runs."""
+
+import heapq
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pytest
+
+from app.agents.refactor_agent import FILE_SCOPE
+from app.agents.refactor_budget import (
+    FunctionPlan,
+    RefactorBudget,
+    WorkItem,
+    plan_refactoring,
+    refactor_prioritized,
+    select_work,
+)
+from app.llm.backends import SyntheticBackend
+
+TWO_WARNINGS = '''def first(a, b, c, d, e, f):
+    return a
+
+
+def second(a, b, c, d, e, f):
+    return b
+'''
+
+ONE_WARNING = '''def only(a, b, c, d, e, f):
+    return a
+'''
+
+CLEAN = '''def clean(a):
+    return a
+'''
+
+
+@pytest.fixture
+def targets(tmp_path: Path) -> List[Tuple[str, Optional[str]]]:
+    """Write three files of decreasing value, listed lowest value first."""
+    paths = []
+    for name, code in (
+        ("clean.py", CLEAN),
+        ("one.py", ONE_WARNING),
+        ("two.py", TWO_WARNINGS),
+    ):
+        path = tmp_path / name
+        path.write_text(code)
+        paths.append((str(path), None))
+    return paths
+
+
+def item(requests: int, tokens: int, functions: List[FunctionPlan]) -> WorkItem:
+    """Return the plan of a file with the given cost and functions."""
+    return WorkItem("module.py", None, "digest", 10.0, requests, tokens, [], functions)
+
+
+def test_queue_pops_highest_value_first(
+    targets: List[Tuple[str, Optional[str]]]
+) -> None:
+    """Test that files are queued by score and only scores are kept."""
+    heap = plan_refactoring(targets, scope=FILE_SCOPE)
+
+    order = [Path(heapq.heappop(heap)[1]).name for _ in range(len(targets))]
+
+    assert order == ["two.py", "one.py", "clean.py"]
+
+
+def test_select_work_fits_the_whole_file() -> None:
+    """Test that a file within the budget is refactored whole."""
+    budget = RefactorBudget(max_calls=2, max_tokens=1000)
+
+    assert select_work(item(2, 1000, []), budget) == (None, None)
+
+
+def test_select_work_picks_the_best_functions_that_fit() -> None:
+    """Test that a file over budget is refactored partially, best first."""
+    functions = [
+        FunctionPlan("big", 9.0, 600),
+        FunctionPlan("medium", 5.0, 300),
+        FunctionPlan("small", 1.0, 200),
+    ]
+    budget = RefactorBudget(max_tokens=500)
+
+    assert select_work(item(3, 1100, functions), budget) == (
+        ["medium", "small"],
+        None,
+    )
+
+
+def test_select_work_reports_the_exhausted_budget() -> None:
+    """Test the reasons given for skipping a file."""
+    functions = [FunctionPlan("big", 9.0, 600)]
+
+    calls = RefactorBudget(max_calls=1, calls=1)
+    tokens = RefactorBudget(max_tokens=500)
+    expired = RefactorBudget(time_budget=0.0)
+
+    assert select_work(item(1, 600, functions), calls) == (
+        None,
+        "call budget exhausted",
+    )
+    assert select_work(item(1, 600, functions), tokens) == (
+        None,
+        "token budget exhausted",
+    )
+    assert select_work(item(1, 600, functions), expired) == (
+        None,
+        "time budget exhausted",
+    )
+
+
+def test_budget_exhausted_mid_run(
+    targets: List[Tuple[str, Optional[str]]],
+    synthetic_backend: SyntheticBackend,
+) -> None:
+    """Test that files after the budget runs out are skipped in priority order."""
+    budget = RefactorBudget(max_calls=1)
+
+    results: List[Dict] = list(
+        refactor_prioritized(targets, jobs=1, scope=FILE_SCOPE, budget=budget)
+    )
+
+    assert [Path(result["file"]).name for result in results] == [
+        "two.py",
+        "one.py",
+        "clean.py",
+    ]
+    refactored, skipped, clean = results
+    assert refactored["refactored_code"] is not None
+    assert refactored["priority"] > skipped["priority"]
+    assert skipped["skipped"] == "call budget exhausted"
+    assert skipped["estimate"]["requests"] == 1
+    assert len(skipped["issue_records"]) == 1
+    # Files without issues cost nothing and are still processed
+    assert "skipped" not in clean
+    assert clean["cost"]["requests"] == 0
+    assert budget.calls >= 1
@@ -0,0 +1,109 @@
+"""Tests for parsing and applying refactoring edits."""
+
+import pytest
+
+from app.agents.refactor_patch import (
+    Edit,
+    PatchError,
+    apply_edits,
+    locate,
+    parse_edits,
+    parse_search_replace,
+    parse_unified_diff,
+)
+
+CODE = """def area(width, height):
+    result = width * height
+    return result
+
+
+def perimeter(width, height):
+    return 2 * (width + height)
+"""
+
+
+def test_parse_search_replace() -> None:
+    """Test that blocks are parsed and text around them ignored."""
+    text = """Here are the edits:
+<<<<<<< SEARCH
+    result = width * height
+    return result
+=======
+    return width * height
+>>>>>>> REPLACE
+Done.
+"""
+    (edit,) = parse_search_replace(text)
+
+    assert edit.search == ["    result = width * height", "    return result"]
+    assert edit.replace == ["    return width * height"]
+    assert parse_edits(text) == [edit]
+
+
+def test_parse_unified_diff() -> None:
+    """Test that hunks become edits with context on both sides."""
+    text = """--- a/shapes.py
++++ b/shapes.py
+@@ -1,3 +1,2 @@
+ def area(width, height):
+-    result = width * height
+-    return result
++    return width * height
+"""
+    (edit,) = parse_unified_diff(text)
+
+    assert edit.search == [
+        "def area(width, height):",
+        "    result = width * height",
+        "    return result",
+    ]
+    assert edit.replace == ["def area(width, height):", "    return width * height"]
+    assert parse_edits(text) == [edit]
+
+
+def test_locate_exact_whitespace_and_fuzzy() -> None:
+    """Test the three matching strategies, in order."""
+    lines = CODE.splitlines()
+
+    assert locate(lines, ["    return 2 * (width + height)"]) == (6, 7)
+    # Whitespace differences and blank lines are ignored
+    assert locate(lines, ["  return  2*(width + height)"]) == (6, 7)
+    search = ["    result = width * height", "", "    return result"]
+    assert locate(lines, search) == (1, 3)
+    # Small typos still match by similarity
+    assert locate(lines, ["    return 2 * (widht + height)"]) == (6, 7)
+    with pytest.raises(PatchError):
+        locate(lines, ["    return volume"])
+    with pytest.raises(PatchError):
+        locate(lines, ["", "   "])
+
+
+def test_locate_prefers_matches_after_the_cursor() -> None:
+    """Test that repeated lines are matched after the previous edit."""
+    lines = ["x = 1", "y = 2", "x = 1"]
+
+    assert locate(lines, ["x = 1"]) == (0, 1)
+    assert locate(lines, ["x = 1"], start=1) == (2, 3)
+
+
+def test_apply_edits_reindents_and_keeps_newlines() -> None:
+    """Test that replacements follow the matched indentation and line endings."""
+    code = CODE.replace("\n", "\r\n")
+    edits = [
+        Edit(
+            search=["result = width * height", "return result"],
+            replace=["return width * height"],
+        )
+    ]
+    patched = apply_edits(code, edits)
+
+    area = "def area(width, height):\r\n    return width * height\r\n"
+    assert patched.startswith(area)
+    assert patched.endswith("    return 2 * (width + height)\r\n")
+    assert "\n" not in patched.replace("\r\n", "")
+
+
+def test_apply_edits_raises_on_unmatched_edit() -> None:
+    """Test that an edit that cannot be located fails the whole patch."""
+    with pytest.raises(PatchError):
+        apply_edits(CODE, [Edit(search=["def volume():"], replace=["pass"])])
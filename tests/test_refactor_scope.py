@@ -0,0 +1,124 @@
+"""Tests for function-scoped refactoring."""
+
+import ast
+from pathlib import Path
+
+from app.agents.quality_rules import CodeIssue
+from app.agents.refactor_agent import build_function_prompt, refactor_file
+from app.agents.refactor_scope import (
+    FunctionTarget,
+    find_function_targets,
+    reindent,
+    replaces_target,
+    splice_functions,
+)
+from app.llm.backends import SyntheticBackend
+
+CODE = '''import os
+
+
+class Store:
+    def load(self, path, a, b, c, d, e):
+        """Load a file."""
+        return open(path).read()
+
+    def save(self):
+        pass
+
+
+def main(argv, a, b, c, d, e):
+    return Store().load(argv[0], a, b, c, d, e)
+'''
+
+LOAD_REPLACEMENT = """def load(self, path):
+    return self._read(path)
+
+def _read(self, path):
+    return open(path).read()
+"""
+
+
+def issue(line: int) -> CodeIssue:
+    """Return a warning reported on ``line``."""
+    return CodeIssue(line=line, message="Too many arguments", severity="warning")
+
+
+def test_find_function_targets() -> None:
+    """Test that issues map to the functions holding them."""
+    targets = find_function_targets(CODE, [issue(5), issue(13)])
+
+    assert [target.qualname for target in targets] == ["Store.load", "main"]
+    load, main = targets
+    assert (load.start, load.end, load.indent) == (5, 7, "    ")
+    assert (main.start, main.end, main.indent) == (13, 14, "")
+    assert load.issues[0].line == 1
+    assert "class Store:" in load.context
+    assert find_function_targets(CODE, [issue(1)]) is None
+
+
+def test_reindent() -> None:
+    """Test that code is shifted to the target level unless already there."""
+    assert reindent("def f():\n    pass", "    ") == "    def f():\n        pass"
+    indented = "    def f():\n        pass"
+    assert reindent(indented, "    ") == indented
+    assert reindent("        x = 1\n        y = 2", "") == "x = 1\ny = 2"
+
+
+def test_splice_functions_replaces_only_the_targets() -> None:
+    """Test that replacements land at the right level and other lines stay."""
+    load, main = find_function_targets(CODE, [issue(5), issue(13)])
+    spliced = splice_functions(
+        CODE,
+        [
+            (load, LOAD_REPLACEMENT),
+            (main, "def main(argv):\n    return Store().load(argv[0])"),
+        ],
+    )
+
+    tree = ast.parse(spliced)
+    store = tree.body[1]
+    assert [node.name for node in store.body] == ["load", "_read", "save"]
+    assert "    def save(self):\n        pass\n" in spliced
+    assert spliced.startswith("import os\n")
+    assert spliced.endswith("def main(argv):\n    return Store().load(argv[0])\n")
+
+
+def test_splice_functions_keeps_line_endings() -> None:
+    """Test that CRLF files stay CRLF and a missing final newline stays missing."""
+    code = CODE.replace("\n", "\r\n").rstrip("\r\n")
+    (main,) = find_function_targets(code, [issue(13)])
+    spliced = splice_functions(code, [(main, "def main():\n    pass\n")])
+
+    assert "\n" not in spliced.replace("\r\n", "")
+    assert spliced.endswith("def main():\r\n    pass")
+
+
+def test_replaces_target() -> None:
+    """Test that a replacement must parse and still define its function."""
+    target = FunctionTarget("Store.load", 5, 7, "    ", "")
+    assert replaces_target("def load(self):\n    pass", target)
+    assert not replaces_target("def other(self):\n    pass", target)
+    assert not replaces_target("def load(self:\n    pass", target)
+
+
+def test_method_prompt_asks_for_helper_methods() -> None:
+    """Test that helpers of a method are requested as methods of its class."""
+    load, main = find_function_targets(CODE, [issue(5), issue(13)])
+
+    assert "private methods of the same class" in build_function_prompt(load)
+    assert "new helper functions" in build_function_prompt(main)
+
+
+def test_failed_selection_is_not_refactored_whole(
+    tmp_path: Path, synthetic_backend: SyntheticBackend
+) -> None:
+    """Test that a selection that cannot be spliced back reports an error."""
+    path = tmp_path / "module.py"
+    path.write_text(CODE)
+
+    # Synthetic responses never define the function, so splicing fails
+    result = refactor_file(str(path), only=["main"])
+
+    assert "could not be spliced back" in result["error"]
+    assert result["refactored_code"] is None
+    assert path.read_text() == CODE
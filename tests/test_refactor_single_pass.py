@@ -0,0 +1,95 @@
+"""Tests for single-pass refactoring prompts and responses."""
+
+import asyncio
+from pathlib import Path
+
+from app.agents.quality_rules import CodeIssue
+from app.agents.refactor_agent import (
+    CODE_HEADER,
+    FILE_SCOPE,
+    SUGGESTIONS_HEADER,
+    build_combined_prompt,
+    combined_prompts,
+    is_valid_combined,
+    join_combined,
+    refactor_file,
+    refactor_file_async,
+    split_combined_response,
+)
+from app.llm.backends import SyntheticBackend
+from app.llm.gemini import GeminiClient
+
+RESPONSE = (
+    f"{SUGGESTIONS_HEADER}\n1. Use a dataclass.\n\n{CODE_HEADER}\n"
+    "```python\ndef f(options):\n    return options\n```\n"
+)
+
+
+def test_split_combined_response_with_headers() -> None:
+    """Test that both parts are split on their headers."""
+    suggestions, code = split_combined_response(RESPONSE)
+
+    assert suggestions == "1. Use a dataclass."
+    assert code.startswith("```python\ndef f(options):")
+
+
+def test_split_combined_response_without_headers() -> None:
+    """Test the fallbacks for responses that ignore the requested layout."""
+    suggestions, code = split_combined_response(
+        "Use fewer arguments.\n```python\nx = 1\n```"
+    )
+    assert suggestions == "Use fewer arguments."
+    assert code == "```python\nx = 1\n```"
+    assert split_combined_response("just text") == ("", "just text")
+
+
+def test_is_valid_combined_checks_the_code_part() -> None:
+    """Test that only responses with parsing code are valid."""
+    assert is_valid_combined(RESPONSE)
+    assert not is_valid_combined(RESPONSE.replace("(options):", "(options:"))
+
+
+def test_combined_prompt_asks_for_both_parts() -> None:
+    """Test that the prompt names both headers and the issues."""
+    issue = CodeIssue(line=1, message="Too many arguments", severity="warning")
+    prompt = build_combined_prompt("def f(a, b):\n    pass\n", [issue])
+
+    assert SUGGESTIONS_HEADER in prompt
+    assert CODE_HEADER in prompt
+    assert "Too many arguments" in prompt
+
+
+def test_join_combined_keeps_pieces_without_issues() -> None:
+    """Test that unchanged pieces are kept and responses are split."""
+    code = "x = 1\n"
+    issue = CodeIssue(line=1, message="Bad name", severity="info")
+    parts = combined_prompts(code, [issue])
+    assert [(piece, prompt is not None, count) for piece, prompt, count in parts] == [
+        (code, True, 1)
+    ]
+    assert combined_prompts(code, []) == [(code, None, 0)]
+
+    suggestions, refactored = join_combined(
+        [("kept = 0\n", None), ("x = 1\n", RESPONSE)]
+    )
+    assert suggestions == "1. Use a dataclass."
+    assert refactored == "kept = 0\n\n\ndef f(options):\n    return options"
+
+
+def test_refactor_file_matches_the_async_path(
+    sample_python_file: Path, synthetic_backend: SyntheticBackend
+) -> None:
+    """Test that the blocking and async entry points give the same result."""
+
+    async def refactor_in_loop() -> dict:
+        return await refactor_file_async(
+            str(sample_python_file), GeminiClient(), scope=FILE_SCOPE
+        )
+
+    blocking = refactor_file(str(sample_python_file), scope=FILE_SCOPE)
+    awaited = asyncio.run(refactor_in_loop())
+
+    assert blocking["error"] is None
+    assert blocking["refactored_code"] is not None
+    for key in ("suggestions", "refactored_code", "routing", "scope"):
+        assert blocking[key] == awaited[key]
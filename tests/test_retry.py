@@ -0,0 +1,136 @@
+"""Tests for retry classification, backoff and the circuit breaker."""
+
+from typing import Any, List
+
+import pytest
+
+from app.llm import retry as retry_module
+from app.llm.retry import (
+    CircuitBreaker,
+    RetryPolicy,
+    RetryStats,
+    call_with_retry,
+    is_retryable,
+    retry_hint,
+)
+
+
+class ApiError(Exception):
+    """API error carrying an HTTP status code."""
+
+    def __init__(self, message: str, code: int) -> None:
+        super().__init__(message)
+        self.code = code
+
+
+class ResourceExhausted(Exception):
+    """Stand-in for the google.api_core exception of the same name."""
+
+
+class Response:
+    """HTTP response with headers."""
+
+    def __init__(self, headers: dict) -> None:
+        self.headers = headers
+
+
+@pytest.mark.parametrize(
+    "error, expected",
+    [
+        (ApiError("rate limited", 429), True),
+        (ApiError("unavailable", 503), True),
+        (ApiError("bad request", 400), False),
+        (ResourceExhausted("quota"), True),
+        (ConnectionError("reset"), True),
+        (ValueError("bug"), False),
+    ],
+)
+def test_is_retryable(error: Exception, expected: bool) -> None:
+    """Test that only transient errors are retried."""
+    assert is_retryable(error) is expected
+
+
+def test_retry_hint_sources() -> None:
+    """Test that hints are read from headers and messages."""
+    error = ApiError("slow down", 429)
+    error.response = Response({"Retry-After": "12"})  # type: ignore[attr-defined]
+    assert retry_hint(error) == 12.0
+    assert retry_hint(ApiError("Please retry in 3.5s.", 429)) == 3.5
+    assert retry_hint(ApiError("no hint", 429)) is None
+
+
+def test_delay_honors_hints_beyond_max_delay() -> None:
+    """Test that backoff is capped but a server hint is not."""
+    policy = RetryPolicy(base_delay=1.0, max_delay=5.0, max_hint=100.0)
+    assert all(0 <= policy.delay(attempt) <= 5.0 for attempt in range(1, 10))
+    assert policy.delay(1, hint=30.0) == 30.0
+    assert policy.delay(1, hint=101.0) is None
+
+
+def test_call_with_retry_retries_transient_errors(monkeypatch: Any) -> None:
+    """Test that transient errors are retried and counted."""
+    sleeps: List[float] = []
+    monkeypatch.setattr(retry_module.time, "sleep", sleeps.append)
+    outcomes: List[Any] = [ApiError("busy", 503), ApiError("busy", 503), "ok"]
+
+    def call() -> str:
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    stats = RetryStats()
+    result = call_with_retry(call, RetryPolicy(), CircuitBreaker(), stats)
+
+    assert result == "ok"
+    assert stats.retries == 2
+    assert len(sleeps) == 2
+
+
+def test_call_with_retry_gives_up(monkeypatch: Any) -> None:
+    """Test that permanent errors, exhausted attempts and long hints raise."""
+    monkeypatch.setattr(retry_module.time, "sleep", lambda seconds: None)
+    stats = RetryStats()
+
+    def permanent() -> None:
+        raise ApiError("bad request", 400)
+
+    def transient() -> None:
+        raise ApiError("busy", 503)
+
+    def long_hint() -> None:
+        raise ApiError("retry in 900s", 429)
+
+    with pytest.raises(ApiError, match="bad request"):
+        call_with_retry(permanent, RetryPolicy(), CircuitBreaker(), stats)
+    with pytest.raises(ApiError, match="busy"):
+        call_with_retry(transient, RetryPolicy(max_attempts=3), CircuitBreaker(), stats)
+    with pytest.raises(ApiError, match="900"):
+        call_with_retry(long_hint, RetryPolicy(max_hint=60), CircuitBreaker(), stats)
+    assert stats.retries == 2
+    assert stats.failures == 2
+
+
+def test_circuit_breaker_opens_and_closes(monkeypatch: Any) -> None:
+    """Test that the breaker opens on a failure spike and closes after cooldown."""
+    now = [100.0]
+    monkeypatch.setattr(retry_module.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(window=4, min_calls=4, threshold=0.5, cooldown=10.0)
+
+    for success in (True, True, False):
+        breaker.record(success)
+    assert breaker.remaining() == 0.0
+
+    breaker.record(False)
+    assert breaker.opens == 1
+    assert breaker.remaining() == 10.0
+
+    now[0] += 4
+    assert breaker.remaining() == 6.0
+    now[0] += 6
+    assert breaker.remaining() == 0.0
+
+    # The window starts afresh once the breaker has opened
+    for success in (False, True, True, True):
+        breaker.record(success)
+    assert breaker.opens == 1
@@ -0,0 +1,56 @@
+"""Tests for size-based model routing and escalation."""
+
+from typing import Any, List
+
+from app.llm import gemini
+from app.llm.backends import SyntheticBackend
+from app.llm.routing import ESCALATION_REASON, RoutingLog, RoutingPolicy
+
+POLICY = RoutingPolicy(
+    small_model="small", large_model="large", small_tokens={"docgen": 100}
+)
+
+
+def test_route_by_size_and_complexity() -> None:
+    """Test that large or complex inputs go to the large model."""
+    assert POLICY.route("docgen", 100).model == "small"
+    assert POLICY.route("docgen", 101).model == "large"
+    assert POLICY.route("docgen", 10, complexity=11).model == "large"
+    # Tasks without a threshold stay on the small model
+    assert POLICY.route("summarize", 10_000).model == "small"
+
+
+def test_escalation_stops_at_the_large_model() -> None:
+    """Test that only small-model decisions can be escalated."""
+    escalation = POLICY.escalate(POLICY.route("docgen", 10))
+
+    assert escalation is not None
+    assert (escalation.model, escalation.escalated) == ("large", True)
+    assert POLICY.escalate(escalation) is None
+
+
+def test_invalid_output_escalates_to_the_large_model(
+    synthetic_backend: SyntheticBackend, monkeypatch: Any
+) -> None:
+    """Test that output failing validation is regenerated by the large model."""
+    log = RoutingLog()
+    monkeypatch.setattr(gemini, "_routing_log", log)
+    monkeypatch.setattr(gemini, "ROUTING_POLICY", POLICY)
+    answers: List[str] = []
+
+    def validate(text: str) -> bool:
+        answers.append(text)
+        return False
+
+    text, decisions = gemini.run_routed("docgen", "document me", validate)
+
+    assert [decision.model for decision in decisions] == ["small", "large"]
+    assert decisions[1].reason == ESCALATION_REASON
+    assert len(answers) == 1
+    assert text.startswith("Synthetic response")
+    assert log.counts() == {("docgen", "small"): 1, ("docgen", "large"): 1}
+    assert log.escalations() == 1
+    assert log.decisions == {
+        ("docgen", "small", "small input"): 1,
+        ("docgen", "large", ESCALATION_REASON): 1,
+    }
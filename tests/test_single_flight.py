@@ -0,0 +1,103 @@
+"""Tests for single-flight coalescing of identical prompts."""
+
+import asyncio
+from typing import Any, List
+
+import pytest
+
+from app.llm import gemini
+from app.llm.backends import SyntheticBackend
+from app.llm.gemini import GeminiClient, coalesced_calls
+
+
+@pytest.fixture
+def sent(synthetic_backend: SyntheticBackend, monkeypatch: Any) -> List[str]:
+    """Record the prompts that reach the backend, each taking a moment."""
+    prompts: List[str] = []
+    generate = synthetic_backend.generate_async
+
+    async def slow_generate(prompt: str) -> str:
+        prompts.append(prompt)
+        await asyncio.sleep(0.01)
+        return await generate(prompt)
+
+    monkeypatch.setattr(synthetic_backend, "generate_async", slow_generate)
+    monkeypatch.setattr(gemini, "_in_flight", {})
+    monkeypatch.setattr(gemini, "_coalesced", 0)
+    return prompts
+
+
+def test_identical_concurrent_prompts_share_one_request(sent: List[str]) -> None:
+    """Test that identical prompts in flight together are sent once."""
+
+    async def run() -> List[str]:
+        client = GeminiClient(max_concurrency=4)
+        return await asyncio.gather(
+            *(client.generate("same") for _ in range(5)),
+            client.generate("other"),
+        )
+
+    responses = asyncio.run(run())
+
+    assert sorted(sent) == ["other", "same"]
+    assert len(set(responses[:5])) == 1
+    assert responses[5] != responses[0]
+    assert coalesced_calls() == 4
+
+
+def test_prompts_are_sent_again_once_landed(sent: List[str]) -> None:
+    """Test that only requests still in flight are shared."""
+
+    async def run() -> None:
+        client = GeminiClient()
+        await client.generate("same")
+        await client.generate("same")
+
+    asyncio.run(run())
+
+    assert sent == ["same", "same"]
+    assert coalesced_calls() == 0
+
+
+def test_failures_are_shared(
+    synthetic_backend: SyntheticBackend, monkeypatch: Any
+) -> None:
+    """Test that every coalesced caller gets the exception of the request."""
+    calls: List[str] = []
+
+    async def failing_generate(prompt: str) -> str:
+        calls.append(prompt)
+        await asyncio.sleep(0.01)
+        raise ValueError("bad request")
+
+    monkeypatch.setattr(synthetic_backend, "generate_async", failing_generate)
+    monkeypatch.setattr(gemini, "_in_flight", {})
+
+    async def run() -> List[Any]:
+        client = GeminiClient()
+        return await asyncio.gather(
+            *(client.generate("same") for _ in range(3)), return_exceptions=True
+        )
+
+    errors = asyncio.run(run())
+
+    assert len(calls) == 1
+    assert len({id(error) for error in errors}) == 1
+    assert "bad request" in str(errors[0])
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_request(
+    sent: List[str],
+) -> None:
+    """Test that the request keeps running for the callers still waiting."""
+
+    async def run() -> str:
+        client = GeminiClient()
+        first = asyncio.ensure_future(client.generate("same"))
+        second = asyncio.ensure_future(client.generate("same"))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()).startswith("Synthetic response")
+    assert sent == ["same"]
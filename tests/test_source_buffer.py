@@ -0,0 +1,57 @@
+"""Tests for offset-based source slicing of extracted symbols."""
+
+import ast
+
+from app.agents.docgen_agent import SourceBuffer, extract_functions_and_classes
+
+
+def test_segment_handles_non_ascii_columns() -> None:
+    """Test that UTF-8 byte columns are mapped to string indices."""
+    code = 'label = "héllo"; value: Dict[str, "ü"] = {}\n'
+    buffer = SourceBuffer(code)
+    annotated = ast.parse(code).body[1]
+
+    assert isinstance(annotated, ast.AnnAssign)
+    assert buffer.segment(annotated.annotation) == 'Dict[str, "ü"]'
+
+
+def test_offsets_follow_every_line_break_style() -> None:
+    """Test that \\r\\n and lone \\r line breaks count as ast does."""
+    buffer = SourceBuffer("a = 1\r\nb = 2\rc = 3\n")
+
+    assert buffer.offset(2, 0) == 7
+    assert buffer.offset(3, 4) == 17
+    assert buffer.text[buffer.offset(3, 0):] == "c = 3\n"
+
+
+def test_block_dedents_without_touching_multiline_strings() -> None:
+    """Test that a nested block is dedented by its first line only."""
+    code = (
+        "class A:\n"
+        "    def f(self):\n"
+        '        text = """\n'
+        "first\n"
+        '        """\n'
+        "        return text  # kept\n"
+    )
+
+    assert SourceBuffer(code).block(2, 6) == (
+        "def f(self):\n"
+        '    text = """\n'
+        "first\n"
+        '    """\n'
+        "    return text  # kept"
+    )
+
+
+def test_records_slice_one_shared_buffer() -> None:
+    """Test that records share the module buffer and carry no __dict__."""
+    code = "def f():\n    return 1\n\n\nclass C:\n    def m(self):\n        pass\n"
+    info = extract_functions_and_classes(code)
+    (function,) = info["functions"]
+    (cls,) = info["classes"]
+
+    assert function.buffer is cls.buffer is cls.methods[0].buffer
+    assert function.source == "def f():\n    return 1"
+    assert cls.methods[0].source == "def m(self):\n    pass"
+    assert not hasattr(function, "__dict__")
@@ -0,0 +1,68 @@
+"""Tests for streaming model output."""
+
+from pathlib import Path
+from typing import List, Tuple
+
+from typer.testing import CliRunner
+
+from app.agents.refactor_agent import FILE_SCOPE, refactor_file
+from app.cli import app
+from app.llm.backends import SyntheticBackend
+from app.llm.gemini import stream_gemini
+
+
+def test_stream_yields_chunks_and_latencies(
+    synthetic_backend: SyntheticBackend,
+) -> None:
+    """Test that a stream yields the response in chunks and times them."""
+    stream = stream_gemini("Explain this module.")
+
+    chunks = list(stream)
+
+    assert len(chunks) > 1
+    assert "".join(chunks).strip() == stream.text
+    assert stream.text == synthetic_backend.generate("Explain this module.")
+    assert stream.time_to_first_token is not None
+    assert stream.total_time is not None
+    assert stream.time_to_first_token <= stream.total_time
+
+
+def test_streamed_refactoring_matches_the_blocking_result(
+    sample_python_file: Path, synthetic_backend: SyntheticBackend
+) -> None:
+    """Test that streaming passes every chunk on and changes nothing else."""
+    chunks: List[Tuple[str, str]] = []
+
+    streamed = refactor_file(
+        str(sample_python_file),
+        on_chunk=lambda stage, chunk: chunks.append((stage, chunk)),
+        scope=FILE_SCOPE,
+    )
+    blocking = refactor_file(str(sample_python_file), scope=FILE_SCOPE)
+
+    assert {stage for stage, _ in chunks} == {"combined"}
+    assert set(streamed["timings"]) == {"combined"}
+    assert "timings" not in blocking
+    for key in ("suggestions", "refactored_code", "routing"):
+        assert streamed[key] == blocking[key]
+
+
+def test_docgen_file_stream_writes_what_it_prints(
+    sample_python_file: Path,
+    synthetic_backend: SyntheticBackend,
+    cli_runner: CliRunner,
+    tmp_path: Path,
+) -> None:
+    """Test that docgen file --stream writes the streamed document."""
+    output = tmp_path / "sample.md"
+
+    result = cli_runner.invoke(
+        app,
+        ["docgen", "file", str(sample_python_file), "-o", str(output), "--stream"],
+    )
+
+    assert result.exit_code == 0, result.output
+    document = output.read_text()
+    assert document.startswith("Synthetic response")
+    assert document in result.output
+    assert "Time to first token" in result.output
@@ -0,0 +1,77 @@
+"""Tests for token budgets and prompt fitting."""
+
+from typing import Any
+
+from app.llm.tokens import (
+    MODEL_BUDGETS,
+    estimate_tokens,
+    fit_text,
+    get_budget,
+    split_text,
+)
+
+FUNCTIONS = "".join(
+    f"@decorator\ndef function_{index}(a, b):\n    return a + b\n\n\n"
+    for index in range(6)
+)
+
+
+def test_fit_text_keeps_text_within_budget() -> None:
+    """Test that text at exactly the budget is returned unchanged."""
+    text = "alpha beta\ngamma delta\n"
+    budget = estimate_tokens(text)
+
+    assert fit_text(text, budget) == text
+
+
+def test_fit_text_trims_at_line_boundaries() -> None:
+    """Test that text one token over budget is trimmed and marked."""
+    text = "".join(f"line number {index}\n" for index in range(40))
+    budget = estimate_tokens(text) - 1
+
+    fitted = fit_text(text, budget)
+
+    assert estimate_tokens(fitted) <= budget
+    kept, marker = fitted.split("\n... [")
+    assert text.startswith(kept)
+    dropped = 40 - kept.count("\n")
+    assert marker.startswith(f"{dropped} lines truncated")
+
+
+def test_split_text_within_budget_is_one_piece() -> None:
+    """Test that text at the budget is not split."""
+    assert split_text(FUNCTIONS, estimate_tokens(FUNCTIONS)) == [FUNCTIONS]
+
+
+def test_split_text_cuts_before_top_level_statements() -> None:
+    """Test that pieces fit, keep functions whole and rebuild the text."""
+    budget = estimate_tokens(FUNCTIONS) // 3
+
+    pieces = split_text(FUNCTIONS, budget)
+
+    assert len(pieces) > 1
+    assert "".join(pieces) == FUNCTIONS
+    for piece in pieces:
+        assert estimate_tokens(piece) <= budget
+        # Decorators stay with the function they decorate
+        assert piece.startswith("@decorator\ndef function_")
+
+
+def test_split_text_gives_an_oversized_line_its_own_piece() -> None:
+    """Test that a line longer than the budget becomes a piece of its own."""
+    long_line = "x = [" + ", ".join(["1"] * 50) + "]\n"
+    text = "a = 1\n" + long_line + "b = 2\n"
+
+    assert split_text(text, 10) == ["a = 1\n", long_line, "b = 2\n"]
+
+
+def test_budget_env_lowers_but_never_raises_limits(monkeypatch: Any) -> None:
+    """Test that the budget variables can only tighten the model limits."""
+    model = "models/gemini-1.5-flash"
+    monkeypatch.setenv("CODEXAGENT_MAX_INPUT_TOKENS", "1000")
+    monkeypatch.setenv("CODEXAGENT_MAX_OUTPUT_TOKENS", "10000000")
+
+    budget = get_budget(model)
+
+    assert budget.input_tokens == 1000
+    assert budget.output_tokens == MODEL_BUDGETS[model].output_tokens